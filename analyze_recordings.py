@@ -0,0 +1,210 @@
+# analyze_recordings.py
+"""
+Пакетный анализ архива записей настройки
+
+Обходит папку, определяет основной тон каждого WAV-файла в пуле процессов
+(отсчеты читаются через np.memmap) и записывает калибровки пакетами:
+    python analyze_recordings.py archive/                       # все .wav в папке и подпапках
+    python analyze_recordings.py archive/ --metadata meta.csv   # позиции, ноты, трубки по файлам
+    python analyze_recordings.py archive/ --dry-run             # только анализ, без записи
+
+Прогресс хранится в чекпоинте (по умолчанию archive/.pitch_checkpoint.json):
+файл отмечается сделанным только после коммита его строки, поэтому
+прерванный запуск продолжается с того же места. В CSV метаданных колонка
+file - путь относительно папки, остальные - поля калибровки (note, position, ...).
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Добавляем путь к корню проекта
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from app import create_app
+from core.audio import analyze_file
+from database.models import db, CalibrationData
+
+AUDIO_EXTENSIONS = ('.wav', '.wave')
+
+# Строк на одну транзакцию
+BATCH_SIZE = 500
+
+CHECKPOINT_NAME = '.pitch_checkpoint.json'
+
+# Поля калибровки, которые можно задать в CSV метаданных
+NUMERIC_FIELDS = ('position', 'diameter', 'tube_diameter', 'tube_length', 'mouthpiece_delta_m',
+                  'bell_delta_L', 'temperature', 'humidity', 'pressure')
+TEXT_FIELDS = ('note', 'tube_material', 'mouthpiece_type', 'source')
+
+
+def find_recordings(directory):
+    """Пути записей относительно папки, по алфавиту"""
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                found.append(os.path.relpath(os.path.join(root, name), directory))
+    return found
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_checkpoint(path):
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return {'done': {}, 'failed': {}}
+
+
+def save_checkpoint(path, state):
+    # Запись через временный файл: прерывание не оставит битый чекпоинт
+    temp = path + '.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(temp, path)
+
+
+def load_metadata(path):
+    """CSV -> {относительный путь: {поле: значение}}"""
+    metadata = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            values = {}
+            for field in NUMERIC_FIELDS:
+                if row.get(field):
+                    values[field] = float(row[field])
+            for field in TEXT_FIELDS:
+                if row.get(field):
+                    values[field] = row[field]
+            metadata[os.path.normpath(row['file'])] = values
+    return metadata
+
+
+def analyze_one(path):
+    """Задача рабочего процесса: (путь, анализ, ошибка)"""
+    try:
+        return path, analyze_file(path), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def calibration_row(relpath, analysis, meta, source):
+    # Все строки пакета - с одним набором ключей: executemany берет колонки из первой
+    row = dict.fromkeys(NUMERIC_FIELDS + TEXT_FIELDS)
+    row.update({
+        'note': analysis['note'],
+        'frequency': analysis['frequency'],
+        'position': None,
+        'diameter': 8.0,
+        'temperature': 20.0,
+        'source': source,
+        'confidence': analysis['confidence'],
+        'notes': f"Архив {relpath}: {analysis['voiced_frames']} из {analysis['frames']} окон со звуком",
+    })
+    row.update(meta)
+    return row
+
+
+def run(directory, workers, checkpoint_path, metadata=None, batch_size=BATCH_SIZE,
+        source='archive', dry_run=False, retry_failed=False):
+    state = load_checkpoint(checkpoint_path)
+    if retry_failed:
+        state['failed'] = {}
+    metadata = metadata or {}
+
+    todo = []
+    for relpath in find_recordings(directory):
+        stamp = file_stamp(os.path.join(directory, relpath))
+        if state['done'].get(relpath) == stamp or relpath in state['failed']:
+            continue
+        todo.append((relpath, stamp))
+    print(f"📂 Записей к анализу: {len(todo)} (уже сделано: {len(state['done'])}, "
+          f"с ошибкой: {len(state['failed'])})")
+
+    pending = []   # (relpath, stamp, строка)
+    stats = {'analyzed': 0, 'inserted': 0, 'failed': 0}
+    started = time.perf_counter()
+
+    def flush():
+        if not pending:
+            return
+        if not dry_run:
+            db.session.execute(CalibrationData.__table__.insert(), [row for _, _, row in pending])
+            db.session.commit()
+            stats['inserted'] += len(pending)
+            for relpath, stamp, _ in pending:
+                state['done'][relpath] = stamp
+            save_checkpoint(checkpoint_path, state)
+        pending.clear()
+        rate = stats['analyzed'] / max(time.perf_counter() - started, 1e-9)
+        print(f"💾 {stats['analyzed']}/{len(todo)} файлов, записано {stats['inserted']}, {rate:.1f} файл/с")
+
+    stamps = dict(todo)
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        futures = [executor.submit(analyze_one, os.path.join(directory, relpath)) for relpath, _ in todo]
+        for future in as_completed(futures):
+            path, analysis, error = future.result()
+            relpath = os.path.relpath(path, directory)
+            stats['analyzed'] += 1
+            if error:
+                stats['failed'] += 1
+                state['failed'][relpath] = error
+                print(f"⚠️  {relpath}: {error}")
+                continue
+            meta = metadata.get(os.path.normpath(relpath), {})
+            pending.append((relpath, stamps[relpath], calibration_row(relpath, analysis, meta, source)))
+            if len(pending) >= batch_size:
+                flush()
+    except KeyboardInterrupt:
+        print("⏹️  Прервано: сохраняю уже проанализированное")
+    finally:
+        flush()
+        if not dry_run:
+            save_checkpoint(checkpoint_path, state)
+        executor.shutdown(wait=False, cancel_futures=True)
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Анализ архива записей настройки')
+    parser.add_argument('directory')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument('--checkpoint', help=f'по умолчанию <папка>/{CHECKPOINT_NAME}')
+    parser.add_argument('--metadata', help='CSV с колонкой file и полями калибровки')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--source', default='archive')
+    parser.add_argument('--dry-run', action='store_true', help='только анализ, без записи и чекпоинта')
+    parser.add_argument('--retry-failed', action='store_true', help='повторить файлы с ошибками')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🎙️ АНАЛИЗ АРХИВА ЗАПИСЕЙ")
+    print("=" * 60)
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        stats = run(
+            args.directory,
+            args.workers,
+            args.checkpoint or os.path.join(args.directory, CHECKPOINT_NAME),
+            metadata=load_metadata(args.metadata) if args.metadata else None,
+            batch_size=args.batch_size,
+            source=args.source,
+            dry_run=args.dry_run,
+            retry_failed=args.retry_failed
+        )
+        print(f"✅ Проанализировано {stats['analyzed']}, записано {stats['inserted']}, "
+              f"ошибок {stats['failed']} за {time.perf_counter() - started:.1f} с")
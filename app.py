@@ -41,6 +41,31 @@ def create_app():
     app.config['SECRET_KEY'] = 'witg-dev-key-2024'
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(base_dir, 'flutes.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TEMPLATE_CACHE_DIR'] = os.path.join(base_dir, 'cache', 'templates')
+    app.config['AUDIO_CACHE_DIR'] = os.path.join(base_dir, 'cache', 'audio')
+    app.config['JOB_WORKERS'] = max(1, (os.cpu_count() or 2) - 1)  # процессы для фоновых расчетов
+    app.config['MAX_CONTENT_LENGTH'] = 512 * 1024 * 1024  # предел запроса (записи WAV), байт
+    
+    # Поиск похожих калибровок (core/similarity.py)
+    app.config['SIMILARITY_WEIGHTS'] = {}    # веса признаков поверх DEFAULT_WEIGHTS
+    app.config['SIMILARITY_MIN'] = 0.7       # похожесть, ниже которой калибровка не выдается
+    app.config['SIMILARITY_MATCH'] = 0.8     # похожесть, с которой позиция берется из калибровки
+    app.config['SIMILARITY_MAX_DIFFERENCE'] = {}  # пределы отличия размеров поверх MAX_DIFFERENCE
+    app.config['SIMILARITY_LIMIT'] = 20      # соседей в ответе /api/calculate/single
+    
+    # Диагностика SQL
+    app.config['SLOW_QUERY_THRESHOLD'] = 0.1      # с - запросы дольше пишутся в лог с EXPLAIN
+    app.config['SLOW_QUERY_LOG'] = os.path.join(base_dir, 'logs', 'slow_queries.log')
+    app.config['QUERY_COUNT_WARNING'] = 50        # предупреждение о N+1
+    app.config['QUERY_DEBUG_HEADERS'] = False     # X-DB-Queries / X-DB-Time-Ms в ответах
+    
+    # Профилирование запросов по заголовку X-Profile (cprofile | sample)
+    app.config['PROFILING_ENABLED'] = False
+    app.config['PROFILE_DIR'] = os.path.join(base_dir, 'logs', 'profiles')
+    app.config['PROFILE_SAMPLE_INTERVAL'] = 0.001  # с
+    app.config['ADMIN_TOKEN'] = None               # заголовок X-Admin-Token; без него профилирование недоступно
+    app.config['PROFILE_MAX_COUNT'] = 200          # хранится не больше профилей
+    app.config['PROFILE_MAX_BYTES'] = 100 * 1024 * 1024  # и не больше байт (старые удаляются)
     
     # Проверяем существование index.html
     index_path = os.path.join(template_dir, 'index.html')
@@ -64,6 +89,25 @@ def create_app():
         try:
             db.create_all()
             print("✅ Таблицы проверены/созданы")
+            
+            from database.db_init import (
+                upgrade_foreign_keys, add_missing_columns, create_missing_indexes, backfill_holes, backfill_acoustics
+            )
+            upgraded = upgrade_foreign_keys()
+            if upgraded:
+                print(f"✅ Внешние ключи обновлены: {', '.join(upgraded)}")
+            columns = add_missing_columns()
+            if columns:
+                print(f"✅ Добавлены колонки: {', '.join(columns)}")
+            indexes = create_missing_indexes()
+            if indexes:
+                print(f"✅ Созданы индексы: {', '.join(indexes)}")
+            moved = backfill_holes()
+            if moved:
+                print(f"✅ Отверстия перенесены из holes_data: {moved}")
+            filled = backfill_acoustics()
+            if filled:
+                print(f"✅ Акустические параметры рассчитаны: {filled} дудиксов")
         except Exception as e:
             print(f"⚠️  Ошибка при создании таблиц: {e}")
     
@@ -109,6 +153,18 @@ def create_app():
             </html>
             """
     
+    # Метрики запросов (/metrics)
+    try:
+        from web.metrics import init_metrics
+        init_metrics(app)
+        print("✅ Метрики подключены")
+    except ImportError as e:
+        print(f"⚠️  Ошибка подключения метрик: {e}")
+    
+    # Профилирование отдельных запросов (/admin/profiles)
+    from web.profiling import init_profiling
+    init_profiling(app)
+    
     print("=" * 50)
     return app
 
@@ -0,0 +1,70 @@
+# build_catalog.py
+"""
+Сборка каталога стандартных конструкций (таблица standard_designs)
+
+Запуск после изменения трубок или мундштуков:
+    python build_catalog.py            # весь каталог
+    python build_catalog.py 3 5        # только трубки с id 3 и 5
+"""
+
+import os
+import sys
+import time
+
+# Добавляем путь к корню проекта
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from app import create_app
+from calculator import get_calculator
+from core.catalog import design_rows
+from database.models import db, Mouthpiece, Tube, StandardDesign
+
+# Строк на один INSERT ... executemany
+BATCH_SIZE = 5000
+
+
+def build(tube_ids=None):
+    calculator = get_calculator()
+
+    query = db.select(Tube.id, Tube.length, Tube.d_in, Tube.material).where(
+        Tube.length.is_not(None), Tube.d_in.is_not(None))
+    if tube_ids:
+        query = query.where(Tube.id.in_(tube_ids))
+    tubes = [row._asdict() for row in db.session.execute(query)]
+    mouthpieces = [None] + [row._asdict() for row in db.session.execute(db.select(Mouthpiece.id, Mouthpiece.delta_m))]
+
+    delete = db.delete(StandardDesign)
+    if tube_ids:
+        delete = delete.where(StandardDesign.tube_id.in_(tube_ids))
+    db.session.execute(delete)
+
+    total = 0
+    batch = []
+    for tube in tubes:
+        for mouthpiece in mouthpieces:
+            for row in design_rows(calculator, tube, mouthpiece):
+                batch.append(row)
+                if len(batch) >= BATCH_SIZE:
+                    db.session.execute(StandardDesign.__table__.insert(), batch)
+                    total += len(batch)
+                    batch = []
+    if batch:
+        db.session.execute(StandardDesign.__table__.insert(), batch)
+        total += len(batch)
+
+    db.session.commit()
+    return len(tubes), len(mouthpieces), total
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("📚 СБОРКА КАТАЛОГА СТАНДАРТНЫХ КОНСТРУКЦИЙ")
+    print("=" * 60)
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        tube_count, mouthpiece_count, rows = build([int(a) for a in sys.argv[1:]])
+        print(f"Трубок: {tube_count}, вариантов мундштука: {mouthpiece_count}")
+        print(f"✅ Записано конструкций: {rows} за {time.perf_counter() - started:.1f} с")
@@ -8,12 +8,14 @@ import math
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
+from core.atmosphere import speed_ratio
+
 class DudexCalculator:
     """Калькулятор для расчета позиций отверстий дудикса"""
     
     def __init__(self):
         # Базовые константы для расчета
-        self.speed_of_sound = 343.0  # м/с при 20°C
+        self.speed_of_sound = 343.0  # м/с при 20°C, 50% влажности, 1013.25 гПа
         self.note_frequencies = self._generate_note_frequencies()
         
         # Коэффициенты для разных материалов
@@ -83,7 +85,9 @@ class DudexCalculator:
         tube_diameter: float,
         tube_material: str = "pvc",
         mouthpiece_end_correction: float = 15.0,
-        temperature: float = 20.0
+        temperature: float = 20.0,
+        humidity: Optional[float] = None,
+        pressure: Optional[float] = None
     ) -> Dict[str, Dict]:
         """
         Рассчитывает позиции отверстий для заданных нот
@@ -95,14 +99,17 @@ class DudexCalculator:
             tube_material: Материал трубки
             mouthpiece_end_correction: Энд-коррекция мундштука в мм
             temperature: Температура воздуха в °C
+            humidity: Относительная влажность в % (None - 50%)
+            pressure: Давление в гПа (None - 1013.25)
         
         Returns:
             Словарь с расчетами для каждой ноты
         """
         results = {}
         
-        # Корректировка скорости звука на температуру
-        speed_of_sound = self.speed_of_sound * math.sqrt(1 + (temperature - 20) / 273)
+        # Корректировка скорости звука на температуру, влажность и давление
+        condition_ratio = speed_ratio(temperature, humidity, pressure)
+        speed_of_sound = self.speed_of_sound * condition_ratio
         
         # Коэффициент материала
         material_coef = self.material_coefficients.get(tube_material, 1.0)
@@ -120,9 +127,9 @@ class DudexCalculator:
             )
             
             if calibrated_result:
-                # Используем проверенные данные
+                # Используем проверенные данные (сняты в опорных условиях)
                 results[note] = {
-                    "position": calibrated_result["position"],
+                    "position": round(calibrated_result["position"] * condition_ratio, 1),
                     "diameter": 8.0,  # стандартный диаметр отверстия
                     "source": "calibrated",
                     "confidence": 1.0,
@@ -167,6 +174,38 @@ class DudexCalculator:
         
         return sorted_results
     
+    def predict_frequency(
+        self,
+        position: float,
+        tube_diameter: float,
+        mouthpiece_end_correction: float = 15.0,
+        temperature: float = 20.0,
+        humidity: Optional[float] = None,
+        pressure: Optional[float] = None
+    ) -> Optional[float]:
+        """
+        Частота для отверстия в заданной позиции (обратная к calculate_hole_positions)
+
+        Args:
+            position: Позиция отверстия от мундштука в мм
+            tube_diameter: Диаметр трубки в мм
+            mouthpiece_end_correction: Энд-коррекция мундштука в мм
+            temperature: Температура воздуха в °C
+            humidity: Относительная влажность в %
+            pressure: Давление в гПа
+
+        Returns:
+            Частота в Гц или None, если позиция вне области формулы
+        """
+        speed_of_sound = self.speed_of_sound * speed_ratio(temperature, humidity, pressure)
+        diameter_factor = 1 - 0.1 * math.log(tube_diameter / 20.0)
+        if position <= 0 or diameter_factor <= 0:
+            return None
+
+        # position = (λ/2 - e) * diameter_factor  =>  λ = 2 * (position / diameter_factor + e)
+        half_wavelength = position / diameter_factor + mouthpiece_end_correction
+        return (speed_of_sound * 1000) / (2 * half_wavelength)
+
     def _find_calibrated_data(
         self,
         note: str,
@@ -290,7 +329,10 @@ def calculate_positions_api(
     tube_length: float,
     tube_diameter: float,
     tube_material: str = "pvc",
-    mouthpiece_end_correction: float = 15.0
+    mouthpiece_end_correction: float = 15.0,
+    temperature: float = 20.0,
+    humidity: Optional[float] = None,
+    pressure: Optional[float] = None
 ) -> Dict:
     """API функция для расчета позиций"""
     calculator = get_calculator()
@@ -299,7 +341,10 @@ def calculate_positions_api(
         tube_length=tube_length,
         tube_diameter=tube_diameter,
         tube_material=tube_material,
-        mouthpiece_end_correction=mouthpiece_end_correction
+        mouthpiece_end_correction=mouthpiece_end_correction,
+        temperature=temperature,
+        humidity=humidity,
+        pressure=pressure
     )
 
 
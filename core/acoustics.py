@@ -0,0 +1,46 @@
+"""
+Акустические параметры системы мундштук + трубка + раструб
+
+Формулы записаны только арифметикой, поэтому работают и с числами, и с
+массивами NumPy, и с колонками SQLAlchemy: одни и те же выражения
+используются в API и в UPDATE по таблице flutes.
+"""
+
+# Скорость звука по умолчанию (см/с, воздух при 20°C) - как Tube.v_air
+DEFAULT_SOUND_SPEED = 34300.0
+
+
+def effective_length(tube_length, delta_m=0.0, delta_L=0.0):
+    """L_eff_total = L_tube + 2*δ_m + ΔL_bell (мм)"""
+    return tube_length + 2 * delta_m + delta_L
+
+
+def base_frequency(total_effective_length, v_sound=DEFAULT_SOUND_SPEED):
+    """
+    f_base = v / (2 * L_eff_total), Гц
+
+    v_sound в см/с, длина в мм: множитель 10 переводит см/с в мм/с.
+    """
+    return v_sound * 10 / (2 * total_effective_length)
+
+
+def frequency_grid(tube_lengths, v_sounds, deltas_m, deltas_L):
+    """
+    Эффективная длина и базовая частота для всех сочетаний компонентов
+
+    tube_lengths и v_sounds - по трубкам (T), deltas_m - по мундштукам (M),
+    deltas_L - по раструбам (B). Возвращает два массива формы (M, T, B);
+    при неположительной длине частота - NaN.
+    """
+    import numpy as np
+
+    delta_m = np.asarray(deltas_m, dtype=np.float64)[:, None, None]
+    length = np.asarray(tube_lengths, dtype=np.float64)[None, :, None]
+    v_sound = np.asarray(v_sounds, dtype=np.float64)[None, :, None]
+    delta_L = np.asarray(deltas_L, dtype=np.float64)[None, None, :]
+
+    total = effective_length(length, delta_m, delta_L)
+    positive = total > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frequency = np.where(positive, base_frequency(np.where(positive, total, 1.0), v_sound), np.nan)
+    return total, frequency
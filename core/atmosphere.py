@@ -0,0 +1,185 @@
+"""
+Скорость звука во влажном воздухе: температура, влажность, давление
+
+Точная формула - Cramer (1993, J. Acoust. Soc. Am. 93, 2510). Она
+считается один раз при импорте на сетке (T, RH, p) в таблицу
+SPEED_TABLE; дальше скорость для любых условий - векторная трилинейная
+интерполяция, поэтому массивы условий (диапазоны в пакетных расчетах)
+обрабатываются одним вызовом.
+
+Опорное состояние - 20°C, 50 %, 1013.25 гПа: для него заданы
+DEFAULT_SOUND_SPEED и скорость в калькуляторе, поэтому поправка - это
+отношение speed_ratio к опорной скорости. Не заданные условия (None,
+NaN) считаются опорными; значения вне сетки прижимаются к ее краям.
+"""
+
+from typing import Dict
+
+import numpy as np
+
+REFERENCE_TEMPERATURE = 20.0   # °C
+REFERENCE_HUMIDITY = 50.0      # %
+REFERENCE_PRESSURE = 1013.25   # гПа
+
+# Мольная доля CO2 в воздухе
+CO2_FRACTION = 0.0004
+
+# Узлы таблицы
+TEMPERATURES = np.arange(-20.0, 50.0 + 0.5, 1.0)   # °C
+HUMIDITIES = np.arange(0.0, 100.0 + 0.5, 5.0)      # %
+PRESSURES = np.arange(800.0, 1100.0 + 0.5, 10.0)   # гПа
+
+# Не больше сочетаний условий в одном пакетном запросе
+MAX_CONDITIONS = 10000
+
+# Коэффициенты a0..a15 формулы Cramer
+_CRAMER = (
+    331.5024, 0.603055, -0.000528,
+    51.471935, 0.1495874, -0.000782,
+    -1.82e-7, 3.73e-8, -2.93e-10,
+    -85.20931, -0.228525, 5.91e-5,
+    -2.835149, -2.15e-13, 29.179762, 0.000486,
+)
+
+
+def cramer_speed(temperature, humidity, pressure):
+    """Скорость звука (м/с) по формуле Cramer; T в °C, RH в %, p в гПа"""
+    a = _CRAMER
+    t = np.asarray(temperature, dtype=np.float64)
+    p = np.asarray(pressure, dtype=np.float64) * 100.0   # Па
+    kelvin = t + 273.15
+
+    # Давление насыщенного пара и поправочный множитель -> мольная доля воды
+    saturation = np.exp(1.2378847e-5 * kelvin ** 2 - 1.9121316e-2 * kelvin + 33.93711047 - 6.3431645e3 / kelvin)
+    enhancement = 1.00062 + 3.14e-8 * p + 5.6e-7 * t ** 2
+    xw = np.asarray(humidity, dtype=np.float64) / 100.0 * enhancement * saturation / p
+    xc = CO2_FRACTION
+
+    return (
+        a[0] + a[1] * t + a[2] * t ** 2
+        + (a[3] + a[4] * t + a[5] * t ** 2) * xw
+        + (a[6] + a[7] * t + a[8] * t ** 2) * p
+        + (a[9] + a[10] * t + a[11] * t ** 2) * xc
+        + a[12] * xw ** 2 + a[13] * p ** 2 + a[14] * xc ** 2 + a[15] * xw * p * xc
+    )
+
+
+def _build_table() -> np.ndarray:
+    table = cramer_speed(
+        TEMPERATURES[:, None, None], HUMIDITIES[None, :, None], PRESSURES[None, None, :])
+    table.setflags(write=False)
+    return table
+
+
+# [T][RH][p] -> м/с
+SPEED_TABLE = _build_table()
+_TABLE_ROWS = SPEED_TABLE.tolist()
+
+
+def _axis_position(values: np.ndarray, nodes: np.ndarray):
+    """Индекс левого узла и доля отрезка для равномерной сетки"""
+    step = nodes[1] - nodes[0]
+    scaled = np.clip((values - nodes[0]) / step, 0.0, len(nodes) - 1)
+    index = np.minimum(scaled.astype(np.intp), len(nodes) - 2)
+    return index, scaled - index
+
+
+def _condition(values, default: float) -> np.ndarray:
+    values = np.asarray(values if values is not None else np.nan, dtype=np.float64)
+    return np.where(np.isnan(values), default, values)
+
+
+def _scalar_position(value: float, nodes: np.ndarray):
+    step = float(nodes[1] - nodes[0])
+    scaled = min(max((value - float(nodes[0])) / step, 0.0), len(nodes) - 1)
+    index = min(int(scaled), len(nodes) - 2)
+    return index, scaled - index
+
+
+def _scalar_speed(t: float, h: float, p: float) -> float:
+    """То же для одного набора условий без NumPy (вызывается на каждый расчет калькулятора)"""
+    i, ft = _scalar_position(t, TEMPERATURES)
+    j, fh = _scalar_position(h, HUMIDITIES)
+    k, fp = _scalar_position(p, PRESSURES)
+    speed = 0.0
+    for di, wt in ((0, 1 - ft), (1, ft)):
+        for dj, wh in ((0, 1 - fh), (1, fh)):
+            row = _TABLE_ROWS[i + di][j + dj]
+            speed += wt * wh * (row[k] * (1 - fp) + row[k + 1] * fp)
+    return speed
+
+
+def speed_of_sound(temperature=None, humidity=None, pressure=None):
+    """Скорость звука (м/с) из таблицы; аргументы - числа или массивы"""
+    if all(v is None or isinstance(v, (int, float)) for v in (temperature, humidity, pressure)):
+        return _scalar_speed(
+            REFERENCE_TEMPERATURE if temperature is None or temperature != temperature else float(temperature),
+            REFERENCE_HUMIDITY if humidity is None or humidity != humidity else float(humidity),
+            REFERENCE_PRESSURE if pressure is None or pressure != pressure else float(pressure),
+        )
+
+    t, h, p = np.broadcast_arrays(
+        _condition(temperature, REFERENCE_TEMPERATURE),
+        _condition(humidity, REFERENCE_HUMIDITY),
+        _condition(pressure, REFERENCE_PRESSURE),
+    )
+    i, ft = _axis_position(t, TEMPERATURES)
+    j, fh = _axis_position(h, HUMIDITIES)
+    k, fp = _axis_position(p, PRESSURES)
+
+    # Трилинейная интерполяция: по давлению, затем по влажности и температуре
+    def along_pressure(ti, hj):
+        return SPEED_TABLE[ti, hj, k] * (1 - fp) + SPEED_TABLE[ti, hj, k + 1] * fp
+
+    def along_humidity(ti):
+        return along_pressure(ti, j) * (1 - fh) + along_pressure(ti, j + 1) * fh
+
+    speed = along_humidity(i) * (1 - ft) + along_humidity(i + 1) * ft
+    return float(speed) if speed.ndim == 0 else speed
+
+
+# Скорость в опорном состоянии (из той же таблицы, чтобы отношение в нем было ровно 1)
+REFERENCE_SPEED = speed_of_sound()
+
+
+def speed_ratio(temperature=None, humidity=None, pressure=None):
+    """Во сколько раз скорость звука при условиях больше опорной"""
+    return speed_of_sound(temperature, humidity, pressure) / REFERENCE_SPEED
+
+
+def to_reference(frequency, temperature=None, humidity=None, pressure=None):
+    """
+    Частота, измеренная при условиях, пересчитанная к опорному состоянию
+
+    При неизменной геометрии частота пропорциональна скорости звука.
+    """
+    return np.asarray(frequency, dtype=np.float64) / speed_ratio(temperature, humidity, pressure)
+
+
+def _values(spec, default: float) -> np.ndarray:
+    """Число, список или {start, stop, step} -> массив значений"""
+    if spec is None:
+        return np.array([default])
+    if isinstance(spec, dict):
+        start, stop = float(spec['start']), float(spec['stop'])
+        step = float(spec.get('step', 1.0))
+        if step <= 0:
+            raise ValueError('Шаг диапазона должен быть положительным')
+        return start + step * np.arange(int(np.floor((stop - start) / step + 1e-9)) + 1)
+    return np.atleast_1d(np.asarray(spec, dtype=np.float64))
+
+
+def condition_grid(spec: Dict) -> Dict[str, np.ndarray]:
+    """
+    Все сочетания условий: {temperature, humidity, pressure} -> три
+    плоских массива одной длины (температура меняется медленнее всего)
+    """
+    t, h, p = np.meshgrid(
+        _values(spec.get('temperature'), REFERENCE_TEMPERATURE),
+        _values(spec.get('humidity'), REFERENCE_HUMIDITY),
+        _values(spec.get('pressure'), REFERENCE_PRESSURE),
+        indexing='ij'
+    )
+    if t.size > MAX_CONDITIONS:
+        raise ValueError(f'Слишком много сочетаний условий (более {MAX_CONDITIONS})')
+    return {'temperature': t.ravel(), 'humidity': h.ravel(), 'pressure': p.ravel()}
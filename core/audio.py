@@ -0,0 +1,198 @@
+"""
+Анализ записей: основной тон WAV-файла (PCM 8/16/24/32 бит)
+
+Файл читается кусками по CHUNK_SECONDS и целиком в память не
+загружается: из потока - модулем wave, с диска - через np.memmap. Кусок режется на перекрывающиеся окна (вид без
+копирования), автокорреляция всех окон считается одним FFT по оси окон:
+r = IFFT(|FFT(x)|^2). Период - первый пик автокорреляции не ниже
+PEAK_RATIO от наибольшего (так не путаются октавы), уточненный по
+параболе. Частота записи - медиана по звучащим окнам.
+"""
+
+import math
+import os
+import wave
+from typing import Dict, Iterable, Iterator, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .scales import frequency_note
+
+FRAME_SIZE = 4096       # отсчетов в окне анализа
+HOP_SIZE = 1024         # шаг окон
+CHUNK_SECONDS = 1.0     # читается из файла за раз
+
+MIN_FREQUENCY = 50.0    # Гц
+MAX_FREQUENCY = 2000.0
+
+PEAK_RATIO = 0.9          # первый пик не ниже этой доли наибольшего
+CLARITY_THRESHOLD = 0.6   # нормированная автокорреляция звучащего окна
+SILENCE_RMS = 0.01        # окна тише считаются паузой
+STABLE_CENTS = 50.0       # окна ближе к медиане считаются устойчивыми
+
+# Автокорреляция окна Ханна - на нее делится автокорреляция сигнала
+_WINDOW = np.hanning(FRAME_SIZE)
+_WINDOW_ACF = np.fft.irfft(np.abs(np.fft.rfft(_WINDOW, 2 * FRAME_SIZE)) ** 2)[:FRAME_SIZE]
+_WINDOW_ACF /= _WINDOW_ACF[0]
+
+
+def _decode(raw, width: int, channels: int) -> np.ndarray:
+    """Байты PCM (bytes или массив uint8) -> моно float64 в [-1, 1]"""
+    if width == 1:
+        samples = (np.frombuffer(raw, np.uint8).astype(np.float64) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(raw, '<i2') / 32768.0
+    elif width == 3:
+        b = np.frombuffer(raw, np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = (((b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8) >> 8) / 8388608.0
+    elif width == 4:
+        samples = np.frombuffer(raw, '<i4') / 2147483648.0
+    else:
+        raise ValueError(f'Неподдерживаемая разрядность: {8 * width} бит')
+    return samples.reshape(-1, channels).mean(axis=1)
+
+
+def read_chunks(reader: wave.Wave_read, chunk_frames: int) -> Iterator[np.ndarray]:
+    """Отсчеты файла по кускам"""
+    width, channels = reader.getsampwidth(), reader.getnchannels()
+    while True:
+        raw = reader.readframes(chunk_frames)
+        if not raw:
+            return
+        yield _decode(raw, width, channels)
+
+
+def frame_pitches(samples: np.ndarray, sample_rate: int, min_frequency: float = MIN_FREQUENCY,
+                  max_frequency: float = MAX_FREQUENCY) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Частота, четкость (0..1) и громкость каждого окна (шаг HOP_SIZE)
+
+    Для незвучащих окон частота - NaN.
+    """
+    windows = sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE]
+    rms = np.sqrt(np.mean(windows ** 2, axis=1))
+
+    x = (windows - windows.mean(axis=1, keepdims=True)) * _WINDOW
+    acf = np.fft.irfft(np.abs(np.fft.rfft(x, 2 * FRAME_SIZE, axis=1)) ** 2, axis=1)[:, :FRAME_SIZE]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = acf / _WINDOW_ACF / acf[:, :1]
+    r = np.nan_to_num(r)
+
+    lo = max(int(sample_rate / max_frequency), 2)
+    hi = min(int(math.ceil(sample_rate / min_frequency)), FRAME_SIZE // 2)
+    if hi <= lo + 2:
+        raise ValueError('Диапазон частот не помещается в окно анализа')
+    segment = r[:, lo - 1:hi + 1]
+    middle = segment[:, 1:-1]
+    peaks = (middle > segment[:, :-2]) & (middle >= segment[:, 2:])
+    strong = peaks & (middle >= PEAK_RATIO * middle.max(axis=1, keepdims=True))
+    found = strong.any(axis=1)
+    lag = lo + strong.argmax(axis=1)
+
+    # Уточнение вершины по параболе через три соседние точки
+    rows = np.arange(len(r))
+    y0, y1, y2 = r[rows, lag - 1], r[rows, lag], r[rows, lag + 1]
+    curvature = y0 - 2 * y1 + y2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shift = np.where(curvature != 0, 0.5 * (y0 - y2) / curvature, 0.0)
+    clarity = np.clip(y1, 0.0, 1.0)
+
+    voiced = found & (rms >= SILENCE_RMS) & (clarity >= CLARITY_THRESHOLD)
+    frequency = np.where(voiced, sample_rate / (lag + np.clip(shift, -0.5, 0.5)), np.nan)
+    return frequency, clarity, rms
+
+
+def _open(fileobj) -> wave.Wave_read:
+    try:
+        return wave.open(fileobj, 'rb')
+    except (wave.Error, EOFError) as e:
+        raise ValueError('Файл не распознан как WAV PCM' + (f' ({e})' if str(e) else ''))
+
+
+def _chunk_frames(sample_rate: int) -> int:
+    return max(int(sample_rate * CHUNK_SECONDS), FRAME_SIZE)
+
+
+def analyze(fileobj, min_frequency: float = MIN_FREQUENCY, max_frequency: float = MAX_FREQUENCY) -> Dict:
+    """Основной тон записи из потока (загруженный файл)"""
+    with _open(fileobj) as reader:
+        sample_rate = reader.getframerate()
+        return _summarize(read_chunks(reader, _chunk_frames(sample_rate)), sample_rate,
+                          min_frequency, max_frequency)
+
+
+def analyze_file(path: str, min_frequency: float = MIN_FREQUENCY, max_frequency: float = MAX_FREQUENCY) -> Dict:
+    """
+    Основной тон WAV-файла на диске
+
+    Заголовок разбирает wave, отсчеты читаются из np.memmap по блоку
+    данных: в память попадает только текущий кусок.
+    """
+    with open(path, 'rb') as f:
+        with _open(f) as reader:
+            sample_rate = reader.getframerate()
+            width, channels = reader.getsampwidth(), reader.getnchannels()
+            frames = reader.getnframes()
+            # wave останавливается на начале блока data
+            offset = f.tell()
+
+    block = width * channels
+    frames = min(frames, (os.path.getsize(path) - offset) // block)
+    if frames <= 0:
+        raise ValueError('В файле нет отсчетов')
+    data = np.memmap(path, dtype=np.uint8, mode='r', offset=offset, shape=(frames * block,))
+    step = _chunk_frames(sample_rate) * block
+    chunks = (_decode(data[start:start + step], width, channels) for start in range(0, len(data), step))
+    try:
+        return _summarize(chunks, sample_rate, min_frequency, max_frequency)
+    finally:
+        del data
+
+
+def _summarize(chunks: Iterable[np.ndarray], sample_rate: int, min_frequency: float,
+               max_frequency: float) -> Dict:
+    """
+    Частота, уверенность (0..1) и ближайшая нота по кускам отсчетов
+
+    Уверенность - средняя четкость звучащих окон, умноженная на долю
+    окон в пределах STABLE_CENTS от медианы.
+    """
+    frequencies, clarities = [], []
+    tail = np.zeros(0)
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        buffer = np.concatenate([tail, chunk])
+        count = (len(buffer) - FRAME_SIZE) // HOP_SIZE + 1
+        if count <= 0:
+            tail = buffer
+            continue
+        frequency, clarity, _ = frame_pitches(buffer, sample_rate, min_frequency, max_frequency)
+        frequencies.append(frequency)
+        clarities.append(clarity)
+        # Окна следующего куска продолжают ту же сетку с шагом HOP_SIZE
+        tail = buffer[count * HOP_SIZE:]
+
+    if not frequencies:
+        raise ValueError(f'Запись короче окна анализа ({FRAME_SIZE} отсчетов)')
+    frequency = np.concatenate(frequencies)
+    clarity = np.concatenate(clarities)
+    voiced = ~np.isnan(frequency)
+    if not voiced.any():
+        raise ValueError('Основной тон не найден')
+
+    median = float(np.median(frequency[voiced]))
+    stable = np.abs(1200 * np.log2(frequency[voiced] / median)) <= STABLE_CENTS
+    confidence = float(clarity[voiced].mean()) * float(stable.mean())
+    note, cents = frequency_note(median)
+    return {
+        'frequency': round(median, 2),
+        'confidence': round(confidence, 3),
+        'note': note,
+        'cents': cents,
+        'duration': round(total / sample_rate, 3),
+        'sample_rate': sample_rate,
+        'frames': int(len(frequency)),
+        'voiced_frames': int(voiced.sum()),
+    }
@@ -0,0 +1,154 @@
+"""
+Профиль канала раструба (Bell.profile)
+
+Профиль - свободный текст с измерениями диаметра по длине, например
+"0мм: 28мм, 50мм: 54мм, 100мм: 72мм" или по строке на точку "0 28".
+Если указаны только диаметры ("28, 35, 52"), точки считаются равномерно
+распределенными по длине раструба. Единицы - миллиметры.
+
+Разобранный и пересэмплированный профиль кэшируется по (id, version)
+раструба: изменение раструба увеличивает version, и старая запись
+больше не используется.
+"""
+
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+# Шаг равномерной сетки по умолчанию (мм)
+DEFAULT_STEP = 1.0
+
+# Максимум узлов сетки на один профиль
+MAX_POINTS = 10000
+
+# Записей в кэше профилей
+CACHE_SIZE = 256
+
+# Прямая образующая: отклонение от линии между концами не больше этой доли диаметра
+CONICAL_TOLERANCE = 0.02
+
+_NUMBER = re.compile(r'-?\d+(?:[.,]\d+)?')
+
+
+class BoreProfile(NamedTuple):
+    """Профиль: измеренные точки и равномерная сетка (массивы только для чтения)"""
+    points: np.ndarray   # (n, 2): x, d по измерениям
+    x: np.ndarray        # узлы сетки (мм)
+    d: np.ndarray        # диаметры в узлах (мм)
+
+
+def _numbers(entry: str, decimal_comma: bool):
+    values = _NUMBER.findall(entry)
+    return [float(v.replace(',', '.') if decimal_comma else v) for v in values]
+
+
+def parse_profile(text: str, length: Optional[float] = None) -> np.ndarray:
+    """
+    Текст профиля -> массив (n, 2) точек (x, d), отсортированный по x
+
+    Точки разделяются ';' или переводом строки (тогда в числах допустима
+    десятичная запятая), иначе запятой.
+    """
+    if not text or not text.strip():
+        raise ValueError('Профиль пуст')
+
+    multi = ';' in text or '\n' in text
+    entries = [e for e in re.split(r'[;\n]' if multi else r',', text) if e.strip()]
+    rows = [_numbers(e, decimal_comma=multi) for e in entries]
+
+    sizes = {len(row) for row in rows}
+    if sizes == {2}:
+        points = np.array(rows, dtype=np.float64)
+    elif sizes == {1}:
+        if not length or length <= 0 or len(rows) < 2:
+            raise ValueError('Для профиля из одних диаметров нужна длина раструба и хотя бы 2 точки')
+        points = np.column_stack([np.linspace(0.0, length, len(rows)), [r[0] for r in rows]])
+    else:
+        raise ValueError('Каждая точка профиля - "x: d" или только диаметр, без смешивания')
+
+    points = points[np.argsort(points[:, 0], kind='stable')]
+    if len(points) < 2:
+        raise ValueError('В профиле меньше 2 точек')
+    if np.any(np.diff(points[:, 0]) <= 0):
+        raise ValueError('Повторяющиеся позиции в профиле')
+    if np.any(points[:, 1] <= 0):
+        raise ValueError('Диаметры профиля должны быть положительными')
+    return points
+
+
+def resample(points: np.ndarray, step: float = DEFAULT_STEP):
+    """Линейная интерполяция профиля на равномерную сетку с шагом step"""
+    if step <= 0:
+        raise ValueError('Шаг сетки должен быть положительным')
+    start, stop = points[0, 0], points[-1, 0]
+    count = int(math.floor((stop - start) / step + 1e-9)) + 1
+    if count > MAX_POINTS:
+        raise ValueError(f'Слишком мелкий шаг: более {MAX_POINTS} узлов')
+    x = start + step * np.arange(count)
+    if x[-1] < stop:
+        x = np.append(x, stop)
+    return x, np.interp(x, points[:, 0], points[:, 1])
+
+
+def build_profile(text: str, length: Optional[float] = None, step: float = DEFAULT_STEP) -> BoreProfile:
+    points = parse_profile(text, length)
+    x, d = resample(points, step)
+    for array in (points, x, d):
+        array.setflags(write=False)
+    return BoreProfile(points, x, d)
+
+
+def describe(profile: BoreProfile) -> dict:
+    """Сводка: диаметры концов, расширение, угол раскрытия, форма"""
+    x, d = profile.points[:, 0], profile.points[:, 1]
+    length = float(x[-1] - x[0])
+    # Полуугол конуса по каждому участку между измерениями
+    angles = np.degrees(np.arctan(np.diff(d) / 2 / np.diff(x)))
+    line = d[0] + (d[-1] - d[0]) * (x - x[0]) / length
+    conical = bool(np.all(np.abs(d - line) <= CONICAL_TOLERANCE * d))
+    return {
+        'length': round(length, 2),
+        'start_diameter': round(float(d[0]), 2),
+        'end_diameter': round(float(d[-1]), 2),
+        'expansion_ratio': round(float(d[-1] / d[0]), 3),
+        'flare_angle': round(float(np.degrees(np.arctan((d[-1] - d[0]) / 2 / length))), 2),
+        'segment_angles': [round(float(a), 2) for a in angles],
+        'shape': 'conical' if conical else 'flared',
+    }
+
+
+class ProfileCache:
+    """LRU-кэш разобранных профилей по (bell_id, version, step)"""
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, bell_id: int, version: int, text: str, length: Optional[float] = None,
+            step: float = DEFAULT_STEP) -> BoreProfile:
+        key = (bell_id, version, step)
+        with self._lock:
+            profile = self._items.get(key)
+            if profile is not None:
+                self._items.move_to_end(key)
+                return profile
+
+        profile = build_profile(text, length, step)
+        with self._lock:
+            self._items[key] = profile
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+        return profile
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+# Кэш процесса
+profile_cache = ProfileCache()
@@ -0,0 +1,138 @@
+"""
+Калибровка компонентов по измерениям
+
+Из измеренных частот выводятся акустические параметры (все длины в мм,
+скорости в см/с, как в моделях):
+
+    трубка:   f_tube при длине L_total          -> v_eff   = 2 * L_total * f_tube / 10
+    мундштук: f_meas на трубке L_calib при T    -> delta_m = (v(T) * 10 / (2 * f_meas) - L_calib) / 2
+    раструб:  f_no_bell и f_with_bell при v     -> delta_L = v * 10 / 2 * (1 / f_with_bell - 1 / f_no_bell)
+
+Формулы - обращение f = v / (2 * L_eff) из core.acoustics. Все
+компоненты одного типа считаются одним векторным проходом. Компонентам
+без измерений значение подбирается линейной регрессией (наименьшие
+квадраты) по геометрии измеренных компонентов.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .acoustics import DEFAULT_SOUND_SPEED
+from .atmosphere import REFERENCE_TEMPERATURE, speed_ratio
+
+# Признаки регрессии для мундштуков без измерений
+MOUTHPIECE_FEATURES = ('d_out', 'L_m')
+
+
+def sound_speed(temperature):
+    """Скорость звука в воздухе (см/с) при температуре (°C), массивно"""
+    return DEFAULT_SOUND_SPEED * speed_ratio(np.asarray(temperature, dtype=np.float64))
+
+
+def _column(rows: Sequence[Dict], field: str) -> np.ndarray:
+    """Поле словарей как массив float, None -> NaN"""
+    return np.array([np.nan if row.get(field) is None else row[field] for row in rows], dtype=np.float64)
+
+
+def _positive(*arrays) -> np.ndarray:
+    mask = np.ones(arrays[0].shape, dtype=bool)
+    for array in arrays:
+        mask &= np.isfinite(array) & (array > 0)
+    return mask
+
+
+def _fill_by_regression(values: np.ndarray, measured: np.ndarray, features: np.ndarray) -> Dict:
+    """
+    Дозаполнить values для строк без измерений: values ~ [1, features] @ coef
+
+    Возвращает коэффициенты, СКО остатков и маску заполненных строк.
+    """
+    design = np.column_stack([np.ones(len(values)), features])
+    usable = np.all(np.isfinite(design), axis=1)
+    train = measured & usable
+    target = ~measured & usable
+    result = {'coefficients': None, 'rms': None, 'filled': np.zeros(len(values), dtype=bool)}
+
+    # Нужно больше измерений, чем параметров модели
+    if train.sum() <= design.shape[1] or not target.any():
+        return result
+
+    coef, *_ = np.linalg.lstsq(design[train], values[train], rcond=None)
+    residuals = design[train] @ coef - values[train]
+    values[target] = design[target] @ coef
+    result.update(coefficients=coef.tolist(), rms=float(np.sqrt(np.mean(residuals ** 2))), filled=target)
+    return result
+
+
+def fit_tubes(tubes: List[Dict]) -> Dict:
+    """v_eff трубок: {'ids', 'values', 'measured', 'filled', ...}"""
+    f = _column(tubes, 'f_tube')
+    length = _column(tubes, 'L_total')
+    measured = _positive(f, length)
+
+    values = np.full(len(tubes), np.nan)
+    values[measured] = 2 * length[measured] * f[measured] / 10
+
+    # Потери на стенках растут с уменьшением диаметра: v_eff ~ a + b / d_in
+    d_in = _column(tubes, 'd_in')
+    with np.errstate(divide='ignore'):
+        features = np.column_stack([1.0 / d_in])
+    return _finish(tubes, values, measured, features)
+
+
+def fit_mouthpieces(mouthpieces: List[Dict]) -> Dict:
+    """delta_m мундштуков"""
+    f = _column(mouthpieces, 'f_meas')
+    length = _column(mouthpieces, 'L_calib')
+    temperature = _column(mouthpieces, 'temperature')
+    temperature = np.where(np.isfinite(temperature), temperature, REFERENCE_TEMPERATURE)
+    measured = _positive(f, length)
+
+    values = np.full(len(mouthpieces), np.nan)
+    v = sound_speed(temperature[measured])
+    values[measured] = (v * 10 / (2 * f[measured]) - length[measured]) / 2
+
+    features = np.column_stack([_column(mouthpieces, field) for field in MOUTHPIECE_FEATURES])
+    return _finish(mouthpieces, values, measured, features)
+
+
+def fit_bells(bells: List[Dict]) -> Dict:
+    """delta_L раструбов"""
+    f_no = _column(bells, 'f_no_bell')
+    f_with = _column(bells, 'f_with_bell')
+    v = _column(bells, 'v_sound')
+    v = np.where(np.isfinite(v) & (v > 0), v, DEFAULT_SOUND_SPEED)
+    measured = _positive(f_no, f_with)
+
+    values = np.full(len(bells), np.nan)
+    values[measured] = v[measured] * 10 / 2 * (1 / f_with[measured] - 1 / f_no[measured])
+
+    # Добавленная длина ~ длина раструба и степень расширения
+    length = _column(bells, 'length')
+    ratio = _column(bells, 'expansion_ratio')
+    start, end = _column(bells, 'start_diameter'), _column(bells, 'end_diameter')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(np.isfinite(ratio), ratio, end / start)
+    return _finish(bells, values, measured, np.column_stack([length, ratio]))
+
+
+def _finish(rows: List[Dict], values: np.ndarray, measured: np.ndarray, features: np.ndarray) -> Dict:
+    regression = _fill_by_regression(values, measured, features)
+    return {
+        'ids': [row['id'] for row in rows],
+        'values': values,
+        'measured': measured,
+        'filled': regression['filled'],
+        'coefficients': regression['coefficients'],
+        'rms': regression['rms'],
+    }
+
+
+def changes(fit: Dict, current: Sequence[Optional[float]], tolerance: float = 1e-6) -> List[Dict]:
+    """Строки, где подобранное значение отличается от текущего: [{'id', 'value'}]"""
+    old = np.array([np.nan if v is None else v for v in current], dtype=np.float64)
+    # Записываются округленные значения - с ними и сравниваем
+    new = np.round(fit['values'], 4)
+    differ = np.isfinite(new) & ~(np.abs(new - old) <= tolerance)
+    return [{'id': fit['ids'][i], 'value': float(new[i])} for i in np.flatnonzero(differ)]
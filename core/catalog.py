@@ -0,0 +1,66 @@
+"""
+Каталог стандартных конструкций
+
+Калькулятор заранее прогоняется по всем тональностям, ладам и числам
+отверстий для каждой трубки каталога (с каждым мундштуком и без него).
+Строки сохраняются в таблицу standard_designs, и /api/calculate отвечает
+на стандартные запросы одной выборкой по индексу.
+"""
+
+import json
+from typing import Dict, Iterator, Optional
+
+from .scales import NOTE_NAMES, SCALES, scale_notes
+
+CATALOG_HOLE_COUNTS = range(4, 9)
+
+# Энд-коррекция по умолчанию, как в calculate_hole_positions (мм)
+DEFAULT_END_CORRECTION = 15.0
+
+# Поля компонентов, от которых зависит расчет: их изменение делает строки устаревшими
+CATALOG_INPUTS = {
+    'tubes': ('length', 'd_in', 'material'),
+    'mouthpieces': ('delta_m',),
+}
+
+
+def design_rows(calculator, tube: Dict, mouthpiece: Optional[Dict] = None) -> Iterator[Dict]:
+    """
+    Строки standard_designs для пары трубка + мундштук
+
+    Ноты при меньшем числе отверстий - начало того же списка, поэтому
+    калькулятор вызывается один раз на тональность и лад.
+    """
+    correction = DEFAULT_END_CORRECTION
+    if mouthpiece is not None and mouthpiece.get('delta_m') is not None:
+        correction = mouthpiece['delta_m']
+
+    for key in NOTE_NAMES:
+        for scale in SCALES:
+            notes = scale_notes(key, scale, max(CATALOG_HOLE_COUNTS))
+            results = calculator.calculate_hole_positions(
+                notes=notes,
+                tube_length=tube['length'],
+                tube_diameter=tube['d_in'],
+                tube_material=tube.get('material') or 'pvc',
+                mouthpiece_end_correction=correction
+            )
+            for count in CATALOG_HOLE_COUNTS:
+                holes = [
+                    {
+                        'note': note,
+                        'position': results[note]['position'],
+                        'diameter': results[note].get('diameter', 8.0),
+                        'source': results[note]['source'],
+                    }
+                    for note in notes[:count] if note in results
+                ]
+                yield {
+                    'tube_id': tube['id'],
+                    'mouthpiece_id': mouthpiece['id'] if mouthpiece is not None else None,
+                    'key': key,
+                    'scale': scale,
+                    'hole_count': count,
+                    'tube_length': tube['length'],
+                    'holes': json.dumps(holes, ensure_ascii=False),
+                }
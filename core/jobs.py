@@ -0,0 +1,320 @@
+"""
+Фоновые задачи WITG: длительные расчеты в пуле процессов
+
+Состояние задач хранится в таблице jobs той же SQLite-базы. Веб-процесс
+создает строку задачи и отправляет ее в пул; рабочий процесс сам
+обновляет статус, прогресс и результат через sqlite3, поэтому
+обработчики Flask не ждут окончания расчета.
+"""
+
+import atexit
+import json
+import math
+import multiprocessing
+import sqlite3
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+# Не чаще одного обновления прогресса в БД за этот интервал (с)
+PROGRESS_INTERVAL = 0.25
+
+# Зарегистрированные типы задач: имя -> функция(params, report) -> результат
+JOB_KINDS: Dict[str, Callable] = {}
+
+# Поле результата с числовым массивом (отдается и бинарно): имя -> поле
+JOB_ARRAYS: Dict[str, str] = {}
+
+
+def job_kind(name: str, array: Optional[str] = None):
+    """Декоратор регистрации типа задачи; array - поле результата с числовым массивом"""
+    def decorator(func):
+        JOB_KINDS[name] = func
+        if array:
+            JOB_ARRAYS[name] = array
+        return func
+    return decorator
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    return conn
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat(sep=' ')
+
+
+def mark_failed(db_path: str, job_id: str, error: str) -> None:
+    """Перевести задачу в статус failed"""
+    with _connect(db_path) as conn:
+        conn.execute(
+            "UPDATE jobs SET status='failed', error=?, finished_at=? WHERE id=? AND status IN ('queued', 'running')",
+            (error, _now(), job_id)
+        )
+
+
+def recover_interrupted(db_path: str) -> int:
+    """Задачи, оставшиеся от остановленного сервера, помечаются как прерванные"""
+    with _connect(db_path) as conn:
+        cursor = conn.execute(
+            "UPDATE jobs SET status='failed', error='Прервано перезапуском сервера', finished_at=? "
+            "WHERE status IN ('queued', 'running')",
+            (_now(),)
+        )
+        return cursor.rowcount
+
+
+def _run_job(db_path: str, job_id: str, kind: str, params: Dict) -> None:
+    """Выполнение задачи в рабочем процессе"""
+    conn = _connect(db_path)
+    try:
+        conn.execute("UPDATE jobs SET status='running', started_at=? WHERE id=?", (_now(), job_id))
+        conn.commit()
+
+        last_report = [0.0]
+
+        def report(fraction: float, message: Optional[str] = None) -> None:
+            now = time.monotonic()
+            if fraction < 1.0 and now - last_report[0] < PROGRESS_INTERVAL:
+                return
+            last_report[0] = now
+            conn.execute(
+                'UPDATE jobs SET progress=?, message=COALESCE(?, message) WHERE id=?',
+                (round(min(max(fraction, 0.0), 1.0), 4), message, job_id)
+            )
+            conn.commit()
+
+        result = JOB_KINDS[kind](params, report)
+
+        conn.execute(
+            "UPDATE jobs SET status='done', progress=1.0, result=?, finished_at=? WHERE id=?",
+            (json.dumps(result, ensure_ascii=False), _now(), job_id)
+        )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        conn.execute(
+            "UPDATE jobs SET status='failed', error=?, finished_at=? WHERE id=?",
+            (f'{e}\n{traceback.format_exc(limit=5)}', _now(), job_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class JobQueue:
+    """Пул рабочих процессов для фоновых задач"""
+
+    def __init__(self, db_path: str, max_workers: int = 2):
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn - одинаково на Linux и Windows, не копирует состояние Flask
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            atexit.register(self.shutdown)
+        return self._executor
+
+    def submit(self, job_id: str, kind: str, params: Dict) -> None:
+        """Отправить уже созданную в БД задачу в пул"""
+        validate_params(kind, params)
+        future = self._get_executor().submit(_run_job, self.db_path, job_id, kind, params)
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+
+    def _on_done(self, job_id: str, future) -> None:
+        # Ошибки внутри задачи пишет сам рабочий процесс; здесь - падение процесса
+        error = future.exception() if not future.cancelled() else None
+        if future.cancelled() or error is not None:
+            mark_failed(self.db_path, job_id, str(error or 'Задача отменена'))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# ========== ТИПЫ ЗАДАЧ ==========
+
+def _notes(params: Dict):
+    """Ноты задачи: notes (список названий) или key + scale + hole_count"""
+    from core.scales import scale_notes, note_frequency
+    if 'notes' not in params:
+        return scale_notes(params['key'], params.get('scale', 'major'), int(params.get('hole_count', 6)))
+
+    notes = params['notes']
+    if not isinstance(notes, list) or not notes:
+        raise ValueError('notes должен быть непустым списком нот')
+    invalid = [note for note in notes if not isinstance(note, str) or note_frequency(note) is None]
+    if invalid:
+        raise ValueError(f'Неизвестные ноты: {", ".join(map(str, invalid))}')
+    return notes
+
+
+def validate_params(kind: str, params) -> None:
+    """Проверка параметров до постановки в очередь (ошибка - ValueError)"""
+    if kind not in JOB_KINDS:
+        raise ValueError(f'Неизвестный тип задачи: {kind}')
+    if not isinstance(params, dict):
+        raise ValueError('params должен быть объектом')
+    try:
+        _notes(params)
+    except KeyError as e:
+        raise ValueError(f'Не заданы notes или key ({e})') from e
+
+
+def _value_range(spec, default):
+    """Список значений из числа, списка или {start, stop, step}"""
+    if spec is None:
+        return [float(default)]
+    if isinstance(spec, dict):
+        start, stop = float(spec['start']), float(spec['stop'])
+        step = float(spec.get('step', 1.0))
+        if step <= 0:
+            raise ValueError('Шаг диапазона должен быть положительным')
+        count = int(math.floor((stop - start) / step + 1e-9)) + 1
+        return [round(start + i * step, 6) for i in range(max(count, 0))]
+    if isinstance(spec, (list, tuple)):
+        return [float(v) for v in spec]
+    return [float(spec)]
+
+
+@job_kind('sweep', array='positions')
+def sweep_job(params: Dict, report: Callable) -> Dict:
+    """
+    Перебор параметров трубки: позиции отверстий на сетке длина x диаметр
+
+    params: notes (или key, scale, hole_count), tube_lengths, tube_diameters (число, список или
+    {start, stop, step}), tube_material, mouthpiece_end_correction, temperature;
+    conditions: {temperature, humidity, pressure} (так же числа, списки или диапазоны) -
+    добавляет ось условий: positions[длина][диаметр][условия][нота]
+    """
+    from calculator import get_calculator
+    from core.atmosphere import condition_grid
+
+    calculator = get_calculator()
+    notes = _notes(params)
+    lengths = _value_range(params.get('tube_lengths'), 450.0)
+    diameters = _value_range(params.get('tube_diameters'), 20.0)
+    spec = params.get('conditions')
+    grid = condition_grid(spec) if spec else {
+        'temperature': [float(params.get('temperature', 20.0))], 'humidity': [None], 'pressure': [None]}
+    conditions = list(zip(*(list(values) for values in grid.values())))
+    total = len(lengths) * len(diameters) * len(conditions)
+    if total > 100000:
+        raise ValueError('Слишком большая сетка (более 100000 точек)')
+
+    positions = []
+    done = 0
+    for length in lengths:
+        row = []
+        for diameter in diameters:
+            cell = []
+            for temperature, humidity, pressure in conditions:
+                results = calculator.calculate_hole_positions(
+                    notes=notes,
+                    tube_length=length,
+                    tube_diameter=diameter,
+                    tube_material=params.get('tube_material', 'pvc'),
+                    mouthpiece_end_correction=float(params.get('mouthpiece_end_correction', 15.0)),
+                    temperature=temperature,
+                    humidity=humidity,
+                    pressure=pressure
+                )
+                cell.append([results[n]['position'] if n in results else None for n in notes])
+                done += 1
+                report(done / total)
+            row.append(cell if spec else cell[0])
+        positions.append(row)
+
+    result = {
+        'notes': notes,
+        'tube_lengths': lengths,
+        'tube_diameters': diameters,
+        'positions': positions  # [длина][диаметр]([условия])[нота]
+    }
+    if spec:
+        result['conditions'] = {name: values.tolist() for name, values in grid.items()}
+    return result
+
+
+@job_kind('monte_carlo', array='positions')
+def monte_carlo_job(params: Dict, report: Callable) -> Dict:
+    """
+    Допуски: разброс позиций отверстий при случайных отклонениях параметров
+
+    params: notes (или key, scale, hole_count), tube_length, tube_diameter, temperature, humidity,
+    pressure, samples, seed,
+    sigma: {tube_length, tube_diameter, temperature, humidity, pressure, mouthpiece_end_correction},
+    return_samples - добавить в результат все позиции [выборка][нота]
+    """
+    import numpy as np
+    from calculator import get_calculator
+
+    calculator = get_calculator()
+    notes = _notes(params)
+    samples = int(params.get('samples', 1000))
+    if not 1 <= samples <= 200000:
+        raise ValueError('samples должно быть от 1 до 200000')
+
+    rng = np.random.default_rng(params.get('seed'))
+    sigma = params.get('sigma', {})
+    base = {
+        'tube_length': float(params.get('tube_length', 450.0)),
+        'tube_diameter': float(params.get('tube_diameter', 20.0)),
+        'temperature': float(params.get('temperature', 20.0)),
+        'humidity': float(params.get('humidity', 50.0)),
+        'pressure': float(params.get('pressure', 1013.25)),
+        'mouthpiece_end_correction': float(params.get('mouthpiece_end_correction', 15.0)),
+    }
+    draws = {
+        name: rng.normal(value, float(sigma.get(name, 0.0)), samples)
+        for name, value in base.items()
+    }
+
+    positions = np.full((samples, len(notes)), np.nan)
+    for i in range(samples):
+        results = calculator.calculate_hole_positions(
+            notes=notes,
+            tube_length=float(draws['tube_length'][i]),
+            tube_diameter=float(draws['tube_diameter'][i]),
+            tube_material=params.get('tube_material', 'pvc'),
+            mouthpiece_end_correction=float(draws['mouthpiece_end_correction'][i]),
+            temperature=float(draws['temperature'][i]),
+            humidity=float(draws['humidity'][i]),
+            pressure=float(draws['pressure'][i])
+        )
+        for j, note in enumerate(notes):
+            if note in results:
+                positions[i, j] = results[note]['position']
+        report((i + 1) / samples)
+
+    def column_stats(values):
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return None
+        p5, p50, p95 = np.percentile(values, [5, 50, 95])
+        return {
+            'mean': round(float(values.mean()), 3),
+            'std': round(float(values.std()), 3),
+            'p5': round(float(p5), 3),
+            'median': round(float(p50), 3),
+            'p95': round(float(p95), 3),
+        }
+
+    result = {
+        'notes': notes,
+        'samples': samples,
+        'statistics': {note: column_stats(positions[:, j]) for j, note in enumerate(notes)}
+    }
+    if params.get('return_samples'):
+        result['positions'] = np.where(np.isnan(positions), None, np.round(positions, 3)).tolist()
+    return result
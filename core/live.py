@@ -0,0 +1,237 @@
+"""
+Живой пересчет для редактора отверстий
+
+Сессия хранит на сервере параметры трубки и отверстия вместе с уже
+посчитанными прогнозами. Клиент присылает только изменения ("отверстие 3
+в 187.5 мм"), пересчитываются только затронутые отверстия, а изменения
+прогнозов уходят подписчикам сессии (Server-Sent Events).
+
+Сессии живут в памяти процесса и удаляются после SESSION_TTL без
+обращений.
+"""
+
+import math
+import queue
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from .scales import frequency_note
+
+# Время жизни сессии без обращений (с)
+SESSION_TTL = 30 * 60
+
+# Параметры трубки; их изменение пересчитывает все отверстия
+SESSION_PARAMS = {
+    'tube_length': 450.0,
+    'tube_diameter': 20.0,
+    'tube_material': 'pvc',
+    'mouthpiece_end_correction': 15.0,
+    'temperature': 20.0,
+    'humidity': 50.0,
+    'pressure': 1013.25,
+}
+
+# Поля отверстия, которые можно менять дельтой
+HOLE_FIELDS = ('note', 'position', 'diameter')
+
+
+class LiveSession:
+    """Состояние одного редактора: параметры, отверстия и их прогнозы"""
+
+    def __init__(self, calculator, params: Dict, holes: List[Dict]):
+        self.id = uuid.uuid4().hex
+        self.calculator = calculator
+        self.params = dict(SESSION_PARAMS)
+        self.holes: List[Dict] = []
+        self.predictions: List[Dict] = []
+        self.version = 0
+        self.touched = time.monotonic()
+        self._lock = threading.Lock()
+        self._subscribers: List[queue.Queue] = []
+
+        self.params = self._merged_params(self.params, params)
+        for hole in holes:
+            self.holes.append(self._clean_hole(hole, {'diameter': 8.0}))
+        self.predictions = [self._predict(i, hole, self.params) for i, hole in enumerate(self.holes)]
+
+    @staticmethod
+    def _merged_params(current: Dict, updates: Dict) -> Dict:
+        """Новые параметры трубки (текущие не меняются)"""
+        params = dict(current)
+        for name, value in updates.items():
+            if name not in SESSION_PARAMS:
+                raise ValueError(f'Неизвестный параметр: {name}')
+            params[name] = value if name == 'tube_material' else float(value)
+        if params['tube_length'] <= 0 or params['tube_diameter'] <= 0:
+            raise ValueError('Длина и диаметр трубки должны быть положительными')
+        return params
+
+    @staticmethod
+    def _clean_hole(hole: Dict, base: Dict) -> Dict:
+        cleaned = dict(base)
+        for field in HOLE_FIELDS:
+            if field in hole:
+                cleaned[field] = hole[field] if field == 'note' else float(hole[field])
+        if cleaned.get('position') is None:
+            raise ValueError('У отверстия нет позиции')
+        return cleaned
+
+    def _predict(self, index: int, hole: Dict, params: Dict) -> Dict:
+        """Прогноз звучания одного отверстия"""
+        frequency = self.calculator.predict_frequency(
+            hole['position'],
+            params['tube_diameter'],
+            params['mouthpiece_end_correction'],
+            params['temperature'],
+            params['humidity'],
+            params['pressure']
+        )
+        nearest, cents = frequency_note(frequency)
+
+        prediction = {
+            'hole': index,
+            'note': hole.get('note'),
+            'position': hole['position'],
+            'diameter': hole['diameter'],
+            'frequency': round(frequency, 2) if frequency else None,
+            'nearest_note': nearest,
+            'cents_from_nearest': cents,
+            'cents_from_target': None,
+        }
+        target = self.calculator.note_frequencies.get(hole.get('note'))
+        if frequency and target:
+            prediction['cents_from_target'] = round(1200 * math.log2(frequency / target), 1)
+        return prediction
+
+    def apply(self, delta: Dict) -> Dict:
+        """
+        Применить изменения и вернуть событие с изменившимися прогнозами
+
+        delta: {hole, position|note|diameter} для одного отверстия,
+        {changes: [...]} для нескольких, {params: {...}} для трубки,
+        {add: {...}} / {remove: index} для состава отверстий.
+
+        Дельта целиком применяется к копиям состояния и проверяется; сессия
+        меняется только если ошибок нет.
+        """
+        with self._lock:
+            self.touched = time.monotonic()
+            params, holes, predictions = self.params, list(self.holes), list(self.predictions)
+            dirty = set()
+            removed = None
+
+            if delta.get('params'):
+                params = self._merged_params(self.params, delta['params'])
+                if params != self.params:
+                    dirty.update(range(len(holes)))
+
+            for change in delta.get('changes', [delta] if 'hole' in delta else []):
+                index = int(change['hole'])
+                if not 0 <= index < len(holes):
+                    raise ValueError(f'Нет отверстия {index}')
+                updated = self._clean_hole(change, holes[index])
+                if updated != holes[index]:
+                    holes[index] = updated
+                    dirty.add(index)
+
+            if delta.get('add'):
+                holes.append(self._clean_hole(delta['add'], {'diameter': 8.0}))
+                predictions.append(None)
+                dirty.add(len(holes) - 1)
+
+            if delta.get('remove') is not None:
+                removed = int(delta['remove'])
+                if not 0 <= removed < len(holes):
+                    raise ValueError(f'Нет отверстия {removed}')
+                del holes[removed]
+                del predictions[removed]
+                # Номера последующих отверстий сдвигаются
+                dirty = {i - 1 if i > removed else i for i in dirty if i != removed}
+                dirty.update(range(removed, len(holes)))
+
+            changed = []
+            for index in sorted(dirty):
+                prediction = self._predict(index, holes[index], params)
+                if prediction != predictions[index]:
+                    predictions[index] = prediction
+                    changed.append(prediction)
+
+            self.params, self.holes, self.predictions = params, holes, predictions
+            if changed or removed is not None:
+                self.version += 1
+            event = {
+                'version': self.version,
+                'hole_count': len(self.holes),
+                'removed': removed,
+                'changed': changed,
+            }
+            subscribers = list(self._subscribers)
+
+        if changed or removed is not None:
+            for subscriber in subscribers:
+                subscriber.put(event)
+        return event
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'session_id': self.id,
+                'version': self.version,
+                'params': dict(self.params),
+                'predictions': list(self.predictions),
+            }
+
+    def subscribe(self) -> queue.Queue:
+        subscriber = queue.Queue()
+        with self._lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue) -> None:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def close(self) -> None:
+        """Завершить потоки подписчиков"""
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, []
+        for subscriber in subscribers:
+            subscriber.put(None)
+
+
+class SessionStore:
+    """Сессии процесса с удалением устаревших"""
+
+    def __init__(self, ttl: float = SESSION_TTL):
+        self.ttl = ttl
+        self._sessions: Dict[str, LiveSession] = {}
+        self._lock = threading.Lock()
+
+    def create(self, calculator, params: Dict, holes: List[Dict]) -> LiveSession:
+        session = LiveSession(calculator, params, holes)
+        with self._lock:
+            self._expire()
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[LiveSession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is not None:
+            session.touched = time.monotonic()
+        return session
+
+    def remove(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+        return session is not None
+
+    def _expire(self) -> None:
+        deadline = time.monotonic() - self.ttl
+        for session_id in [s.id for s in self._sessions.values() if s.touched < deadline]:
+            self._sessions.pop(session_id).close()
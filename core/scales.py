@@ -0,0 +1,123 @@
+"""
+Ноты строя: тоника + лад -> список нот отверстий
+
+Первое отверстие звучит тоникой в 4-й октаве, следующие идут по ступеням
+лада вверх (как в таблице нот /api/calculate).
+
+Все сочетания тональность x лад x число отверстий считаются один раз при
+импорте в неизменяемую таблицу SCALE_TABLE; запрос - поиск по ключу.
+"""
+
+import math
+import re
+from types import MappingProxyType
+from typing import List, NamedTuple, Optional, Tuple
+
+NOTE_NAMES = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+
+# Бемоли -> диезы (калькулятор знает только диезы)
+FLAT_NAMES = {'Db': 'C#', 'Eb': 'D#', 'Gb': 'F#', 'Ab': 'G#', 'Bb': 'A#'}
+
+# Интервалы ладов в полутонах от тоники
+SCALES = MappingProxyType({
+    'major': (0, 2, 4, 5, 7, 9, 11),
+    'minor': (0, 2, 3, 5, 7, 8, 10),
+    'harmonic_minor': (0, 2, 3, 5, 7, 8, 11),
+    'melodic_minor': (0, 2, 3, 5, 7, 9, 11),
+    'dorian': (0, 2, 3, 5, 7, 9, 10),
+    'phrygian': (0, 1, 3, 5, 7, 8, 10),
+    'lydian': (0, 2, 4, 6, 7, 9, 11),
+    'mixolydian': (0, 2, 4, 5, 7, 9, 10),
+    'locrian': (0, 1, 3, 5, 6, 8, 10),
+    'major_pentatonic': (0, 2, 4, 7, 9),
+    'minor_pentatonic': (0, 3, 5, 7, 10),
+    'blues': (0, 3, 5, 6, 7, 10),
+})
+
+BASE_OCTAVE = 4
+MAX_HOLES = 12
+
+# Строй: A4 = 440 Гц (как в калькуляторе)
+A4_FREQUENCY = 440.0
+A4_SEMITONE = 9 + 12 * 4
+
+_NOTE = re.compile(r'^([A-G][#b]?)(-?\d)$')
+
+
+class ScaleEntry(NamedTuple):
+    """Ноты отверстий и их частоты (Гц)"""
+    notes: Tuple[str, ...]
+    frequencies: Tuple[float, ...]
+
+
+def _note(semitone: int) -> str:
+    return f'{NOTE_NAMES[semitone % 12]}{semitone // 12}'
+
+
+def _frequency(semitone: int) -> float:
+    return round(A4_FREQUENCY * 2 ** ((semitone - A4_SEMITONE) / 12), 2)
+
+
+def _build_table():
+    table = {}
+    for tonic_index, key in enumerate(NOTE_NAMES):
+        tonic = tonic_index + 12 * BASE_OCTAVE
+        for scale, intervals in SCALES.items():
+            semitones = [
+                tonic + 12 * (degree // len(intervals)) + intervals[degree % len(intervals)]
+                for degree in range(MAX_HOLES)
+            ]
+            for count in range(1, MAX_HOLES + 1):
+                table[key, scale, count] = ScaleEntry(
+                    tuple(_note(s) for s in semitones[:count]),
+                    tuple(_frequency(s) for s in semitones[:count])
+                )
+    return MappingProxyType(table)
+
+
+# (тональность, лад, число отверстий) -> ScaleEntry
+SCALE_TABLE = _build_table()
+
+
+def normalize_key(key: str) -> str:
+    """Тоника в записи калькулятора: 'Bb' -> 'A#'"""
+    key = FLAT_NAMES.get(key, key)
+    if key not in NOTE_NAMES:
+        raise ValueError(f'Неизвестная тональность: {key}')
+    return key
+
+
+def scale_entry(key: str, scale: str, hole_count: int) -> ScaleEntry:
+    """Ноты и частоты строя из таблицы"""
+    entry = SCALE_TABLE.get((FLAT_NAMES.get(key, key), scale, hole_count))
+    if entry is None:
+        normalize_key(key)
+        if scale not in SCALES:
+            raise ValueError(f'Неизвестный лад: {scale}')
+        raise ValueError(f'Число отверстий должно быть от 1 до {MAX_HOLES}')
+    return entry
+
+
+def note_frequency(note: str) -> Optional[float]:
+    """Частота ноты вида 'F#4' или 'Bb3' (Гц); неизвестная запись - None"""
+    match = _NOTE.match(note or '')
+    if not match:
+        return None
+    name = FLAT_NAMES.get(match.group(1), match.group(1))
+    if name not in NOTE_NAMES:
+        return None
+    return _frequency(NOTE_NAMES.index(name) + 12 * int(match.group(2)))
+
+
+def frequency_note(frequency: float) -> Tuple[Optional[str], float]:
+    """Ближайшая нота к частоте и отклонение от нее в центах"""
+    if not frequency or frequency <= 0:
+        return None, 0.0
+    semitone = round(A4_SEMITONE + 12 * math.log2(frequency / A4_FREQUENCY))
+    cents = 1200 * math.log2(frequency / (A4_FREQUENCY * 2 ** ((semitone - A4_SEMITONE) / 12)))
+    return _note(semitone), round(cents, 1) + 0.0
+
+
+def scale_notes(key: str, scale: str, hole_count: int) -> List[str]:
+    """Ноты отверстий: ['D4', 'E4', 'F#4', ...]"""
+    return list(scale_entry(key, scale, hole_count).notes)
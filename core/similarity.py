@@ -0,0 +1,200 @@
+"""
+Поиск похожих калибровок: взвешенные k ближайших соседей
+
+Каждая калибровка - строка матрицы признаков, приведенных к одной шкале:
+размеры (диаметр и длина трубки, δ_m мундштука, диаметр отверстия) - в
+логарифме, поэтому разность - относительное отличие; ΔL раструба и
+температура - в долях SCALES; тип мундштука - код категории (отличие 0
+или 1). Расстояние - взвешенное среднеквадратичное по признакам, заданным
+в запросе; похожесть = 1 - расстояние. Среднее не дает одному большому
+отличию раствориться в остальных только в пределах MAX_DIFFERENCE:
+калибровка, у которой признак отличается сильнее (или не задан), не
+подходит при любой похожести.
+
+Матрица строится один раз и живет в памяти (CalibrationIndex); строки
+каждой ноты собраны заранее, запрос - одна операция над массивом строк.
+"""
+
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .atmosphere import speed_ratio
+
+# Признак -> способ приведения
+FEATURES = {
+    'tube_diameter': 'log',
+    'tube_length': 'log',
+    'mouthpiece_delta_m': 'log',
+    'diameter': 'log',
+    'bell_delta_L': 'linear',
+    'temperature': 'linear',
+    'mouthpiece_type': 'category',
+}
+FEATURE_NAMES = tuple(FEATURES)
+
+# Отличие линейных признаков, равное относительному отличию 1.0 (мм, °C)
+SCALES = {
+    'bell_delta_L': 20.0,
+    'temperature': 30.0,
+}
+
+DEFAULT_WEIGHTS = {
+    'tube_diameter': 1.0,
+    'tube_length': 1.0,
+    'mouthpiece_delta_m': 0.5,
+    'mouthpiece_type': 0.5,
+    'bell_delta_L': 0.25,
+    'diameter': 0.25,
+    'temperature': 0.1,
+}
+
+# Отличие по признаку, не заданному у калибровки (но заданному в запросе)
+MISSING_DISTANCE = 0.5
+
+# Жесткий предел относительного отличия |x - q| / q (для log-признаков)
+MAX_DIFFERENCE = {
+    'tube_diameter': 0.2,
+    'tube_length': 0.2,
+}
+
+_CATEGORY = np.array([FEATURES[name] == 'category' for name in FEATURE_NAMES])
+
+
+def feature_weights(weights: Optional[Mapping[str, float]] = None) -> np.ndarray:
+    """Веса в порядке FEATURE_NAMES: DEFAULT_WEIGHTS, поверх - заданные"""
+    merged = dict(DEFAULT_WEIGHTS)
+    for name, value in (weights or {}).items():
+        if name not in FEATURES:
+            raise ValueError(f'Неизвестный признак: {name}')
+        value = float(value)
+        if value < 0:
+            raise ValueError(f'Вес признака {name} не может быть отрицательным')
+        merged[name] = value
+    return np.array([merged.get(name, 0.0) for name in FEATURE_NAMES])
+
+
+def difference_limits(limits: Optional[Mapping[str, float]] = None) -> np.ndarray:
+    """Пределы в порядке FEATURE_NAMES: MAX_DIFFERENCE, поверх - заданные; NaN - без предела"""
+    merged = dict(MAX_DIFFERENCE)
+    for name, value in (limits or {}).items():
+        if FEATURES.get(name) != 'log':
+            raise ValueError(f'Предел отличия задается только для размеров, не для {name}')
+        merged[name] = float(value) if value is not None else None
+    return np.array([merged[name] if merged.get(name) is not None else np.nan for name in FEATURE_NAMES])
+
+
+def parse_weights(spec) -> Dict[str, float]:
+    """Веса из словаря или строки 'tube_diameter:2,temperature:0'"""
+    if not spec:
+        return {}
+    if isinstance(spec, dict):
+        return {name: float(value) for name, value in spec.items()}
+    weights = {}
+    for item in str(spec).split(','):
+        name, _, value = item.partition(':')
+        weights[name.strip()] = float(value)
+    return weights
+
+
+class CalibrationIndex:
+    """Матрица признаков калибровок и k-NN по ней"""
+
+    def __init__(self, rows: Sequence[Dict]):
+        """rows - словари с id, note, position, frequency, условиями и признаками"""
+        self.ids = np.array([row['id'] for row in rows], dtype=np.int64)
+        self.categories = {}
+        self.features = np.empty((len(rows), len(FEATURE_NAMES)))
+        for j, name in enumerate(FEATURE_NAMES):
+            self.features[:, j] = [self._encode(name, row.get(name), add=True) for row in rows]
+
+        # Позиции и частоты, приведенные к опорным условиям
+        def column(name):
+            return np.array([row.get(name) for row in rows], dtype=np.float64)
+
+        ratio = speed_ratio(column('temperature'), column('humidity'), column('pressure'))
+        self.position = column('position') / ratio
+        self.frequency = column('frequency') / ratio
+
+        groups = {}
+        for i, row in enumerate(rows):
+            groups.setdefault(row['note'], []).append(i)
+        self.by_note = {note: np.array(found, dtype=np.intp) for note, found in groups.items()}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _encode(self, name: str, value, add: bool = False) -> float:
+        """Значение признака на общей шкале; не задан - NaN"""
+        if value is None or value == '':
+            return np.nan
+        kind = FEATURES[name]
+        if kind == 'category':
+            key = str(value).lower()
+            if key not in self.categories:
+                if not add:
+                    return -1.0   # тип, которого нет в калибровках, отличается от всех
+                self.categories[key] = float(len(self.categories))
+            return self.categories[key]
+        value = float(value)
+        if kind == 'log':
+            return float(np.log(value)) if value > 0 else np.nan
+        return value / SCALES[name]
+
+    def encode(self, query: Mapping) -> np.ndarray:
+        """Запрос {признак: значение} -> вектор признаков (NaN - не задан)"""
+        return np.array([self._encode(name, query.get(name)) for name in FEATURE_NAMES])
+
+    def _score(self, query: Mapping, rows: Optional[np.ndarray], weights: Optional[Mapping[str, float]],
+               limits: Optional[Mapping[str, float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Похожесть строк и маска строк в пределах MAX_DIFFERENCE"""
+        q = self.encode(query)
+        w = np.where(np.isnan(q), 0.0, feature_weights(weights))
+        if w.sum() <= 0:
+            raise ValueError('В запросе нет ни одного признака с ненулевым весом')
+        x = self.features if rows is None else self.features[rows]
+
+        diff = np.where(_CATEGORY, (x != q).astype(np.float64), np.abs(x - q))
+        diff = np.where(np.isnan(x), MISSING_DISTANCE, diff)
+        distance = np.sqrt(np.nansum(diff ** 2 * w, axis=1) / w.sum())
+
+        # Пределы - только по признакам запроса; у log-признаков x - q = ln(a / b)
+        limit = difference_limits(limits)
+        checked = ~np.isnan(q) & ~np.isnan(limit)
+        relative = np.abs(np.expm1(x[:, checked] - q[checked]))
+        within = ~(np.isnan(relative) | (relative > limit[checked] + 1e-12)).any(axis=1)
+        return np.clip(1.0 - distance, 0.0, 1.0), within
+
+    def similarity(self, query: Mapping, rows: Optional[np.ndarray] = None,
+                   weights: Optional[Mapping[str, float]] = None,
+                   limits: Optional[Mapping[str, float]] = None) -> np.ndarray:
+        """Похожесть запроса на строки rows (по умолчанию все), от 0 до 1; вне пределов - 0"""
+        score, within = self._score(query, rows, weights, limits)
+        return np.where(within, score, 0.0)
+
+    def nearest(self, query: Mapping, note: Optional[str] = None, k: Optional[int] = None,
+                min_similarity: float = 0.0, weights: Optional[Mapping[str, float]] = None,
+                limits: Optional[Mapping[str, float]] = None) -> List[Tuple[int, float]]:
+        """
+        k самых похожих калибровок (ноты note, если задана): [(строка, похожесть)]
+
+        Калибровки вне пределов отличия не выдаются. Порядок - по убыванию
+        похожести, при равной - по id.
+        """
+        rows = self.by_note.get(note, np.empty(0, dtype=np.intp)) if note is not None \
+            else np.arange(len(self.ids))
+        if not len(rows):
+            return []
+        score, within = self._score(query, rows, weights, limits)
+        keep = within & (score >= min_similarity)
+        rows, score = rows[keep], score[keep]
+        order = np.lexsort((self.ids[rows], -score))
+        if k is not None:
+            order = order[:k]
+        return [(int(rows[i]), float(score[i])) for i in order]
+
+    def normalized(self, rows: Sequence[int], conditions: Mapping) -> Tuple[np.ndarray, np.ndarray]:
+        """Позиции и частоты строк, пересчитанные к условиям (не заданы - опорные)"""
+        rows = np.asarray(rows, dtype=np.intp)
+        factor = speed_ratio(**conditions)
+        return self.position[rows] * factor, self.frequency[rows] * factor
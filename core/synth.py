@@ -0,0 +1,95 @@
+"""
+Звуковое превью строя: ноты отверстий по очереди в WAV (16 бит, моно)
+
+Тон - сумма гармоник основной частоты с огибающей атака/затухание. Набор
+гармоник зависит от типа возбуждения: открытая труба (флейтовый
+мундштук) звучит всеми гармониками, трость на цилиндре (кларнетный
+мундштук) - в основном нечетными. Все ноты синтезируются сразу,
+массивом ноты x отсчеты (по гармонике за шаг - без массива на все
+гармоники).
+"""
+
+import io
+import wave
+from typing import Optional, Sequence
+
+import numpy as np
+
+SAMPLE_RATE = 22050
+NOTE_SECONDS = 0.6
+GAP_SECONDS = 0.08
+ATTACK_SECONDS = 0.03
+RELEASE_SECONDS = 0.12
+HARMONICS = 10
+PEAK = 0.8
+
+MAX_NOTES = 64
+MAX_SECONDS = 60.0
+
+# Тип мундштука -> тембр
+REED_TYPES = ('clarinet', 'reed', 'saxophone', 'sax')
+
+# Доля четных гармоник в тембре 'reed'
+REED_EVEN_LEVEL = 0.15
+
+
+def timbre_for(mouthpiece_type: Optional[str]) -> str:
+    return 'reed' if (mouthpiece_type or '').lower() in REED_TYPES else 'open'
+
+
+def partials(timbre: str, count: int = HARMONICS) -> np.ndarray:
+    """Амплитуды гармоник 1..count"""
+    n = np.arange(1, count + 1)
+    if timbre == 'reed':
+        return np.where(n % 2 == 1, 1.0 / n, REED_EVEN_LEVEL / n ** 2)
+    if timbre == 'open':
+        return 1.0 / n ** 1.5
+    raise ValueError(f'Неизвестный тембр: {timbre}')
+
+
+def render(frequencies: Sequence[Optional[float]], timbre: str = 'open', note_seconds: float = NOTE_SECONDS,
+           gap_seconds: float = GAP_SECONDS, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Отсчеты int16 всех нот подряд; None/NaN - пауза на месте ноты
+
+    Гармоники выше частоты Найквиста отбрасываются.
+    """
+    f = np.array([np.nan if v is None else v for v in frequencies], dtype=np.float64)
+    if not 0 < len(f) <= MAX_NOTES:
+        raise ValueError(f'Нужно от 1 до {MAX_NOTES} нот')
+    if not 0.05 <= note_seconds <= 5.0:
+        raise ValueError('Длительность ноты - от 0.05 до 5 с')
+    if len(f) * (note_seconds + gap_seconds) > MAX_SECONDS:
+        raise ValueError(f'Превью длиннее {MAX_SECONDS:g} с')
+
+    t = np.arange(int(note_seconds * sample_rate)) / sample_rate
+    amplitudes = partials(timbre)
+    harmonic = np.arange(1, len(amplitudes) + 1)
+
+    # Частоты и веса гармоник (ноты, гармоники)
+    partial_f = np.nan_to_num(f)[:, None] * harmonic[None, :]
+    weights = np.where((partial_f > 0) & (partial_f < sample_rate / 2), amplitudes[None, :], 0.0)
+    phase = 2 * np.pi * t[None, :]
+    tones = np.zeros((len(f), len(t)))
+    for k in range(len(harmonic)):
+        tones += weights[:, k, None] * np.sin(partial_f[:, k, None] * phase)
+
+    envelope = np.minimum(1.0, np.minimum(t / ATTACK_SECONDS, (note_seconds - t) / RELEASE_SECONDS))
+    tones *= np.clip(envelope, 0.0, 1.0)
+
+    peak = np.abs(tones).max()
+    if peak > 0:
+        tones *= PEAK / peak
+    gap = np.zeros((len(f), int(gap_seconds * sample_rate)))
+    samples = np.concatenate([tones, gap], axis=1).ravel()
+    return (samples * 32767).astype('<i2')
+
+
+def wav_bytes(samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(sample_rate)
+        writer.writeframes(samples.tobytes())
+    return buffer.getvalue()
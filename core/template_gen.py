@@ -1 +1,237 @@
- 
+"""
+Генерация шаблонов для сверления отверстий (SVG, масштаб 1:1)
+
+Шаблон - развертка трубки: по горизонтали длина от торца мундштука,
+по вертикали окружность трубки (угол отверстия 0° - центральная линия).
+Распечатанную полосу оборачивают вокруг трубки и сверлят по перекрестьям.
+
+Геометрия флейты сначала превращается в список примитивов (layout) в
+миллиметрах; из него рисуют и SVG, и постраничный экспорт. Кэшируется
+только постоянная часть (контур, углы, отверстия) - десятки примитивов;
+линейка (штрих на каждый мм) генерируется лениво при каждом проходе,
+поэтому длинная трубка не держится в памяти целиком.
+"""
+
+import itertools
+import json
+import math
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import svgwrite
+
+from utils.cache import content_hash
+
+# Поля и отступы шаблона (мм)
+MARGIN = 10.0
+LABEL_WIDTH = 18.0     # слева: подписи углов
+HEADER_HEIGHT = 22.0   # сверху: название и параметры
+RULER_HEIGHT = 16.0    # снизу: линейка
+
+DEFAULT_TUBE_D_OUT = 22.0
+ANGLE_MARKS = (-90, 0, 90, 180)
+
+# Сколько элементов SVG отдавать одним чанком при потоковой генерации
+STREAM_CHUNK_ELEMENTS = 256
+
+SVG_STYLE = (
+    '.outline{stroke:#000;stroke-width:0.35;fill:none}'
+    '.thin{stroke:#000;stroke-width:0.15;fill:none}'
+    '.dash{stroke:#666;stroke-width:0.15;stroke-dasharray:2,1;fill:none}'
+    '.mark{stroke:#c00;stroke-width:0.2;fill:none}'
+    'text{font-family:Arial,sans-serif;fill:#000}'
+)
+
+# Примитив: ('line', x1, y1, x2, y2, style) | ('circle', cx, cy, r, style)
+#           | ('text', x, y, text, size, anchor)
+Primitive = Tuple
+
+
+def flute_geometry(flute, holes) -> Dict:
+    """
+    Геометрия шаблона из Flute и его отверстий
+
+    holes - строки Hole (или словари с теми же полями); если их нет,
+    используется holes_data флейты.
+    """
+    if holes:
+        hole_list = [
+            {'note': h.note, 'position': h.position, 'diameter': h.diameter, 'angle': h.angle}
+            for h in holes
+        ]
+    else:
+        hole_list = json.loads(flute.holes_data) if flute.holes_data else []
+
+    d_out = None
+    if flute.tube is not None:
+        d_out = flute.tube.d_out or (flute.tube.d_in + 2.0 if flute.tube.d_in else None)
+
+    return {
+        'name': flute.name,
+        'key': flute.key,
+        'tube_length': float(flute.tube_length or 0.0),
+        'tube_d_out': float(d_out or DEFAULT_TUBE_D_OUT),
+        'holes': sorted(
+            (
+                {
+                    'note': h.get('note'),
+                    'position': float(h['position']),
+                    'diameter': float(h.get('diameter') or 8.0),
+                    'angle': float(h.get('angle') or 0.0),
+                }
+                for h in hole_list if h.get('position') is not None
+            ),
+            key=lambda h: h['position']
+        ),
+    }
+
+
+def geometry_hash(geometry: Dict) -> str:
+    """Ключ кэша шаблона: хэш геометрии"""
+    return content_hash(geometry)
+
+
+def page_size(geometry: Dict) -> Tuple[float, float]:
+    """Полный размер шаблона (ширина, высота) в мм"""
+    circumference = math.pi * geometry['tube_d_out']
+    width = MARGIN * 2 + LABEL_WIDTH + geometry['tube_length']
+    height = MARGIN * 2 + HEADER_HEIGHT + circumference + RULER_HEIGHT
+    return round(width, 3), round(height, 3)
+
+
+def build_layout(geometry: Dict) -> Iterator[Primitive]:
+    """Примитивы шаблона в мм: постоянная часть из кэша, линейка - лениво"""
+    x0 = MARGIN + LABEL_WIDTH
+    ruler_y = MARGIN + HEADER_HEIGHT + math.pi * geometry['tube_d_out'] + 1.0
+    return itertools.chain(
+        _cached_layout(json.dumps(geometry, sort_keys=True)),
+        _ruler(geometry['tube_length'], x0, ruler_y),
+    )
+
+
+@lru_cache(maxsize=128)
+def _cached_layout(geometry_json: str) -> Tuple[Primitive, ...]:
+    """Все примитивы, кроме штрихов линейки (их число не зависит от длины)"""
+    geometry = json.loads(geometry_json)
+    length = geometry['tube_length']
+    circumference = math.pi * geometry['tube_d_out']
+
+    x0 = MARGIN + LABEL_WIDTH          # торец мундштука
+    top = MARGIN + HEADER_HEIGHT       # верх развертки
+    center = top + circumference / 2   # линия угла 0°
+    bottom = top + circumference
+
+    items: List[Primitive] = []
+
+    # Заголовок
+    items.append(('text', MARGIN, MARGIN + 5, f"{geometry['name']}", 5.0, 'start'))
+    items.append(('text', MARGIN, MARGIN + 11,
+                  f"Тональность: {geometry['key'] or '-'}   Длина: {length:g} мм   "
+                  f"Ø трубки: {geometry['tube_d_out']:g} мм   Масштаб 1:1", 3.0, 'start'))
+    # Контрольный квадрат 10x10 мм для проверки масштаба печати
+    sq_x = MARGIN + LABEL_WIDTH + max(length, 60.0) - 10.0
+    items.append(('line', sq_x, MARGIN, sq_x + 10, MARGIN, 'outline'))
+    items.append(('line', sq_x + 10, MARGIN, sq_x + 10, MARGIN + 10, 'outline'))
+    items.append(('line', sq_x + 10, MARGIN + 10, sq_x, MARGIN + 10, 'outline'))
+    items.append(('line', sq_x, MARGIN + 10, sq_x, MARGIN, 'outline'))
+    items.append(('text', sq_x - 1, MARGIN + 7, '10 мм', 2.5, 'end'))
+
+    # Контур развертки трубки
+    items.append(('line', x0, top, x0 + length, top, 'outline'))
+    items.append(('line', x0 + length, top, x0 + length, bottom, 'outline'))
+    items.append(('line', x0 + length, bottom, x0, bottom, 'outline'))
+    items.append(('line', x0, bottom, x0, top, 'outline'))
+    items.append(('text', x0 + 1, top - 1.5, 'мундштук', 2.5, 'start'))
+
+    # Линии углов
+    for angle in ANGLE_MARKS:
+        y = _angle_y(angle, center, circumference)
+        items.append(('line', x0, y, x0 + length, y, 'dash'))
+        items.append(('text', x0 - 2, y + 1, f'{angle}°', 2.5, 'end'))
+
+    # Отверстия: перекрестье, окружность, подпись
+    for hole in geometry['holes']:
+        cx = x0 + hole['position']
+        cy = _angle_y(hole['angle'], center, circumference)
+        r = hole['diameter'] / 2
+        arm = r + 2.0
+        items.append(('circle', cx, cy, r, 'outline'))
+        items.append(('line', cx - arm, cy, cx + arm, cy, 'mark'))
+        items.append(('line', cx, cy - arm, cx, cy + arm, 'mark'))
+        items.append(('line', cx, top, cx, bottom, 'thin'))
+        items.append(('text', cx, top - 6.5, hole['note'] or '', 3.0, 'middle'))
+        items.append(('text', cx, top - 1.5,
+                      f"{hole['position']:g} / Ø{hole['diameter']:g}", 2.2, 'middle'))
+
+    items.append(('text', x0 - 2, bottom + 10.5, 'см', 2.5, 'end'))
+
+    return tuple(_round_primitive(item) for item in items)
+
+
+def _ruler(length: float, x0: float, ruler_y: float) -> Iterator[Primitive]:
+    """Штрихи линейки: 1 мм, 5 мм, 10 мм"""
+    for mm in range(int(math.floor(length)) + 1):
+        x = x0 + mm
+        if mm % 10 == 0:
+            yield _round_primitive(('line', x, ruler_y, x, ruler_y + 6, 'thin'))
+            yield _round_primitive(('text', x, ruler_y + 9.5, f'{mm // 10}', 2.5, 'middle'))
+        elif mm % 5 == 0:
+            yield _round_primitive(('line', x, ruler_y, x, ruler_y + 4, 'thin'))
+        else:
+            yield _round_primitive(('line', x, ruler_y, x, ruler_y + 2, 'thin'))
+
+
+def _angle_y(angle: float, center: float, circumference: float) -> float:
+    """Вертикальная координата угла на развертке (угол приводится к [-180, 180))"""
+    wrapped = (angle + 180.0) % 360.0 - 180.0
+    return center + wrapped / 360.0 * circumference
+
+
+def _round_primitive(item: Primitive) -> Primitive:
+    return tuple(round(v, 3) if isinstance(v, float) else v for v in item)
+
+
+def _svg_element(item: Primitive):
+    kind = item[0]
+    if kind == 'line':
+        _, x1, y1, x2, y2, style = item
+        return svgwrite.shapes.Line((x1, y1), (x2, y2), class_=style, debug=False)
+    if kind == 'circle':
+        _, cx, cy, r, style = item
+        return svgwrite.shapes.Circle((cx, cy), r, class_=style, debug=False)
+    _, x, y, text, size, anchor = item
+    return svgwrite.text.Text(text, insert=(x, y), font_size=size, text_anchor=anchor, debug=False)
+
+
+def render_svg_chunks(geometry: Dict, chunk_elements: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Потоковая генерация SVG
+
+    Документ отдается частями по chunk_elements элементов, поэтому
+    шаблон длинной трубки не собирается в памяти целиком.
+    """
+    chunk_elements = chunk_elements or STREAM_CHUNK_ELEMENTS
+    width, height = page_size(geometry)
+
+    drawing = svgwrite.Drawing(
+        size=(f'{width}mm', f'{height}mm'),
+        viewBox=f'0 0 {width} {height}',
+        debug=False
+    )
+    drawing.add(drawing.style(SVG_STYLE))
+    head, tail = drawing.tostring().rsplit('</svg>', 1)
+    yield ('<?xml version="1.0" encoding="utf-8" ?>\n' + head).encode('utf-8')
+
+    layout = build_layout(geometry)
+    while True:
+        chunk = ''.join(_svg_element(item).tostring() for item in itertools.islice(layout, chunk_elements))
+        if not chunk:
+            break
+        yield chunk.encode('utf-8')
+
+    yield ('</svg>' + tail).encode('utf-8')
+
+
+def render_svg(geometry: Dict) -> bytes:
+    """SVG-шаблон целиком"""
+    return b''.join(render_svg_chunks(geometry))
@@ -0,0 +1,264 @@
+"""
+Постраничный PDF-экспорт шаблонов (A4 / Letter, масштаб 1:1)
+
+Шаблон длинной флейты режется на листы с перекрытием. В полосе
+перекрытия рисуются метки совмещения: на соседних листах они находятся
+в одной и той же точке шаблона, по ним листы совмещают и склеивают.
+
+Используется тот же кэшированный layout, что и для SVG: примитивы один
+раз раскладываются по листам, затем листы пишутся в PDF. Несколько
+флейт можно выгрузить в один документ.
+"""
+
+import itertools
+import math
+import zlib
+from io import BytesIO
+from typing import Dict, List, Sequence, Tuple
+
+from core.template_gen import build_layout, page_size
+
+MM_TO_PT = 72.0 / 25.4
+
+# Размеры бумаги в мм (портрет)
+PAPER_SIZES = {
+    'a4': (210.0, 297.0),
+    'letter': (215.9, 279.4),
+}
+
+PAGE_MARGIN = 10.0     # поля листа (мм)
+OVERLAP = 12.0         # перекрытие соседних листов (мм)
+MARK_INSET = 15.0      # отступ меток совмещения от края листа (мм)
+MARK_SIZE = 5.0
+
+# Стиль -> (толщина линии мм, цвет RGB, штрих)
+PDF_STYLES = {
+    'outline': (0.35, (0, 0, 0), None),
+    'thin': (0.15, (0, 0, 0), None),
+    'dash': (0.15, (0.4, 0.4, 0.4), (2, 1)),
+    'mark': (0.2, (0.8, 0, 0), None),
+}
+
+# Средняя ширина символа Helvetica в долях кегля (для выравнивания подписей)
+CHAR_WIDTH = 0.55
+
+# Базовые шрифты PDF не содержат кириллицу - подписи транслитерируются
+_TRANSLIT = dict(zip(
+    'абвгдеёжзийклмнопрстуфхцчшщъыьэюя',
+    ['a', 'b', 'v', 'g', 'd', 'e', 'e', 'zh', 'z', 'i', 'y', 'k', 'l', 'm', 'n', 'o',
+     'p', 'r', 's', 't', 'u', 'f', 'kh', 'ts', 'ch', 'sh', 'shch', '', 'y', '', 'e', 'yu', 'ya']
+))
+
+
+def _pdf_text(text: str) -> bytes:
+    """Строка PDF в кодировке WinAnsi (кириллица транслитерируется)"""
+    out = []
+    for ch in text:
+        low = ch.lower()
+        if low in _TRANSLIT:
+            latin = _TRANSLIT[low]
+            out.append(latin.capitalize() if ch != low else latin)
+        else:
+            out.append(ch)
+    raw = ''.join(out).encode('cp1252', errors='replace')
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def _fmt(value: float) -> bytes:
+    return (f'{value:.3f}'.rstrip('0').rstrip('.') or '0').encode('ascii')
+
+
+class TileGrid:
+    """Разбиение шаблона на листы"""
+
+    def __init__(self, width: float, height: float, paper: str, orientation: str):
+        paper_w, paper_h = PAPER_SIZES[paper]
+        if orientation == 'landscape':
+            paper_w, paper_h = paper_h, paper_w
+        self.paper_w, self.paper_h = paper_w, paper_h
+
+        # Рабочая область листа и шаг с учетом перекрытия
+        self.area_w = paper_w - 2 * PAGE_MARGIN
+        self.area_h = paper_h - 2 * PAGE_MARGIN
+        self.step_x = self.area_w - OVERLAP
+        self.step_y = self.area_h - OVERLAP
+
+        self.cols = max(1, math.ceil((width - OVERLAP) / self.step_x))
+        self.rows = max(1, math.ceil((height - OVERLAP) / self.step_y))
+        self.width, self.height = width, height
+
+    def tiles_for(self, x_min, y_min, x_max, y_max) -> List[Tuple[int, int]]:
+        """Листы (ряд, колонка), которые пересекает прямоугольник"""
+        c0 = max(0, math.ceil((x_min - self.area_w) / self.step_x))
+        c1 = min(self.cols - 1, math.floor(x_max / self.step_x))
+        r0 = max(0, math.ceil((y_min - self.area_h) / self.step_y))
+        r1 = min(self.rows - 1, math.floor(y_max / self.step_y))
+        return [(r, c) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)]
+
+    def registration_marks(self) -> List[Tuple]:
+        """Метки совмещения в середине полос перекрытия"""
+        marks = []
+        for seam in range(1, self.cols):
+            x = seam * self.step_x + OVERLAP / 2
+            for row in range(self.rows):
+                for y in self._inset_positions(row * self.step_y, self.area_h, self.height):
+                    marks.extend(_cross(x, y))
+        for seam in range(1, self.rows):
+            y = seam * self.step_y + OVERLAP / 2
+            for col in range(self.cols):
+                for x in self._inset_positions(col * self.step_x, self.area_w, self.width):
+                    marks.extend(_cross(x, y))
+        return marks
+
+    @staticmethod
+    def _inset_positions(start, size, limit):
+        end = min(start + size, limit)
+        if end - start <= 2 * MARK_INSET:
+            return [(start + end) / 2]
+        return [start + MARK_INSET, end - MARK_INSET]
+
+
+def _cross(x: float, y: float) -> List[Tuple]:
+    half = MARK_SIZE
+    return [
+        ('circle', x, y, half / 2, 'mark'),
+        ('line', x - half, y, x + half, y, 'mark'),
+        ('line', x, y - half, x, y + half, 'mark'),
+    ]
+
+
+def _bbox(item) -> Tuple[float, float, float, float]:
+    kind = item[0]
+    if kind == 'line':
+        _, x1, y1, x2, y2, _ = item
+        return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+    if kind == 'circle':
+        _, cx, cy, r, _ = item
+        return cx - r, cy - r, cx + r, cy + r
+    _, x, y, text, size, anchor = item
+    width = len(text) * size * CHAR_WIDTH
+    left = x - width if anchor == 'end' else x - width / 2 if anchor == 'middle' else x
+    return left, y - size, left + width, y
+
+
+def _draw(item, out: List[bytes]) -> None:
+    """Команды PDF для примитива (координаты шаблона в мм)"""
+    kind = item[0]
+    if kind == 'text':
+        _, x, y, text, size, anchor = item
+        width = len(text) * size * CHAR_WIDTH
+        if anchor == 'end':
+            x -= width
+        elif anchor == 'middle':
+            x -= width / 2
+        # CTM отражен по y - текстовую матрицу отражаем обратно
+        out.append(b'BT /F1 %s Tf 1 0 0 -1 %s %s Tm (%s) Tj ET' % (
+            _fmt(size), _fmt(x), _fmt(y), _pdf_text(text)))
+        return
+
+    style = item[-1]
+    line_width, color, dash = PDF_STYLES.get(style, PDF_STYLES['thin'])
+    out.append(b'%s w %s %s %s RG %s d' % (
+        _fmt(line_width), _fmt(color[0]), _fmt(color[1]), _fmt(color[2]),
+        b'[%s %s] 0' % (_fmt(dash[0]), _fmt(dash[1])) if dash else b'[] 0'))
+
+    if kind == 'line':
+        _, x1, y1, x2, y2, _ = item
+        out.append(b'%s %s m %s %s l S' % (_fmt(x1), _fmt(y1), _fmt(x2), _fmt(y2)))
+    else:
+        _, cx, cy, r, _ = item
+        k = 0.5523 * r
+        out.append(
+            b'%s %s m ' % (_fmt(cx + r), _fmt(cy)) +
+            b'%s %s %s %s %s %s c ' % (_fmt(cx + r), _fmt(cy + k), _fmt(cx + k), _fmt(cy + r), _fmt(cx), _fmt(cy + r)) +
+            b'%s %s %s %s %s %s c ' % (_fmt(cx - k), _fmt(cy + r), _fmt(cx - r), _fmt(cy + k), _fmt(cx - r), _fmt(cy)) +
+            b'%s %s %s %s %s %s c ' % (_fmt(cx - r), _fmt(cy - k), _fmt(cx - k), _fmt(cy - r), _fmt(cx), _fmt(cy - r)) +
+            b'%s %s %s %s %s %s c S' % (_fmt(cx + k), _fmt(cy - r), _fmt(cx + r), _fmt(cy - k), _fmt(cx + r), _fmt(cy))
+        )
+
+
+def _tile_pages(geometry: Dict, paper: str, orientation: str) -> List[Tuple[Tuple[float, float], bytes]]:
+    """Содержимое листов одного шаблона: [(размер листа в pt, поток команд)]"""
+    width, height = page_size(geometry)
+    grid = TileGrid(width, height, paper, orientation)
+
+    # Один проход по примитивам: каждый попадает в списки своих листов
+    buckets: Dict[Tuple[int, int], List[bytes]] = {}
+    for item in itertools.chain(build_layout(geometry), grid.registration_marks()):
+        commands: List[bytes] = []
+        for tile in grid.tiles_for(*_bbox(item)):
+            if not commands:
+                _draw(item, commands)
+            buckets.setdefault(tile, []).extend(commands)
+
+    page_w_pt = grid.paper_w * MM_TO_PT
+    page_h_pt = grid.paper_h * MM_TO_PT
+    total = grid.rows * grid.cols
+    pages = []
+    for row in range(grid.rows):
+        for col in range(grid.cols):
+            tx, ty = col * grid.step_x, row * grid.step_y
+            number = row * grid.cols + col + 1
+            label = (f"{geometry['name']}  |  лист {number}/{total}  "
+                     f"(ряд {row + 1}, колонка {col + 1})  |  масштаб 1:1")
+
+            stream = [
+                # Подпись листа в нижнем поле (в pt, без преобразования)
+                b'BT /F1 8 Tf %s %s Td (%s) Tj ET' % (
+                    _fmt(PAGE_MARGIN * MM_TO_PT), _fmt(PAGE_MARGIN / 2 * MM_TO_PT), _pdf_text(label)),
+                b'q',
+                # Обрезка по рабочей области
+                b'%s %s %s %s re W n' % (
+                    _fmt(PAGE_MARGIN * MM_TO_PT), _fmt(PAGE_MARGIN * MM_TO_PT),
+                    _fmt(grid.area_w * MM_TO_PT), _fmt(grid.area_h * MM_TO_PT)),
+                # мм шаблона -> pt листа, ось y вниз
+                b'%s 0 0 %s %s %s cm' % (
+                    _fmt(MM_TO_PT), _fmt(-MM_TO_PT),
+                    _fmt((PAGE_MARGIN - tx) * MM_TO_PT),
+                    _fmt(page_h_pt - (PAGE_MARGIN - ty) * MM_TO_PT)),
+                b'1 J 1 j',
+            ]
+            stream.extend(buckets.get((row, col), []))
+            stream.append(b'Q')
+            pages.append(((page_w_pt, page_h_pt), b'\n'.join(stream)))
+    return pages
+
+
+def render_tiled_pdf(geometries: Sequence[Dict], paper: str = 'a4', orientation: str = 'landscape') -> bytes:
+    """PDF со всеми листами всех шаблонов"""
+    if paper not in PAPER_SIZES:
+        raise ValueError(f'Неизвестный формат бумаги: {paper}')
+    if orientation not in ('portrait', 'landscape'):
+        raise ValueError(f'Неизвестная ориентация: {orientation}')
+
+    pages = []
+    for geometry in geometries:
+        pages.extend(_tile_pages(geometry, paper, orientation))
+
+    # Объекты: 1 - каталог, 2 - дерево страниц, 3 - шрифт, далее пары страница/поток
+    objects: List[bytes] = [b'', b'', b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>']
+    page_refs = []
+    for (width, height), content in pages:
+        data = zlib.compress(content)
+        page_id = len(objects) + 1
+        page_refs.append(page_id)
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %s %s] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (_fmt(width), _fmt(height), page_id + 1))
+        objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(data), data))
+    objects[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % ref for ref in page_refs), len(page_refs))
+
+    buffer = BytesIO()
+    buffer.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(buffer.tell())
+        buffer.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+    xref = buffer.tell()
+    buffer.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for offset in offsets:
+        buffer.write(b'%010d 00000 n \n' % offset)
+    buffer.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+    return buffer.getvalue()
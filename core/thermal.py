@@ -0,0 +1,86 @@
+"""
+Уход строя с температурой
+
+Частота отверстия f ~ c(T) / L, где L - акустическая длина: расстояние
+по трубке (позиция отверстия или длина трубки) плюс энд-коррекции. С
+температурой меняются скорость звука (core.atmosphere) и длина трубки:
+расстояния по ней растут как 1 + α * (T - T0), энд-коррекции мундштука
+и раструба считаются постоянными.
+
+Весь расчет - одна операция над массивом температуры x отверстия.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from .atmosphere import speed_ratio
+
+# Диапазон по умолчанию для игры на улице (°C)
+DEFAULT_MIN_TEMPERATURE = 5.0
+DEFAULT_MAX_TEMPERATURE = 35.0
+
+# Не больше точек по температуре
+MAX_TEMPERATURES = 1000
+
+# Коэффициенты линейного расширения материалов трубок (1/°C)
+EXPANSION_COEFFICIENTS = {
+    'aluminum': 23e-6,
+    'steel': 12e-6,
+    'bronze': 18e-6,
+    'brass': 19e-6,
+    'copper': 17e-6,
+    'pp': 100e-6,
+    'petg': 60e-6,
+    'pvc': 52e-6,
+    'acrylic': 70e-6,
+    'rubber': 150e-6,
+    'glass': 9e-6,
+    'wood': 5e-6,      # вдоль волокон
+    'bamboo': 4e-6,
+    'carbon': 1e-6,
+}
+
+
+def expansion_coefficient(thermal_coeff: Optional[float], length: Optional[float],
+                          material: Optional[str]) -> float:
+    """
+    α трубки (1/°C)
+
+    Tube.thermal_coeff - удлинение трубки стандартной длины (мм/°C), отсюда
+    α = thermal_coeff / length; если не задан - табличное значение материала.
+    """
+    if thermal_coeff is not None and length:
+        return thermal_coeff / length
+    return EXPANSION_COEFFICIENTS.get((material or '').lower(), 0.0)
+
+
+def temperature_range(start: float = DEFAULT_MIN_TEMPERATURE, stop: float = DEFAULT_MAX_TEMPERATURE,
+                      step: float = 1.0) -> np.ndarray:
+    if step <= 0 or stop < start:
+        raise ValueError('Нужны min_temperature <= max_temperature и положительный шаг')
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    if count > MAX_TEMPERATURES:
+        raise ValueError(f'Слишком много точек по температуре (более {MAX_TEMPERATURES})')
+    return start + step * np.arange(count)
+
+
+def drift_ratio(temperatures, expanding, fixed, alpha: float, reference_temperature: float = 20.0,
+                humidity: Optional[float] = None, pressure: Optional[float] = None) -> np.ndarray:
+    """
+    f(T) / f(T0) для каждой температуры и каждой акустической длины: (N, H)
+
+    expanding - часть длины по трубке (мм), fixed - энд-коррекции (мм).
+    """
+    t = np.asarray(temperatures, dtype=np.float64)[:, None]
+    expanding = np.asarray(expanding, dtype=np.float64)[None, :]
+    fixed = np.asarray(fixed, dtype=np.float64)[None, :]
+
+    air = speed_ratio(t, humidity, pressure) / speed_ratio(reference_temperature, humidity, pressure)
+    stretch = 1 + alpha * (t - reference_temperature)
+    return air * (expanding + fixed) / (expanding * stretch + fixed)
+
+
+def cents(ratio) -> np.ndarray:
+    """Отношение частот в центах"""
+    return 1200 * np.log2(ratio)
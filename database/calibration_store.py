@@ -0,0 +1,86 @@
+"""
+Перекалибровка компонентов в базе
+
+Читает измерения всех компонентов колоночными запросами, подбирает
+параметры через core.calibration и записывает изменившиеся значения
+пакетно (UPDATE ... executemany на тип компонента). Затем одним UPDATE
+пересчитываются акустические колонки флейт. Всё - одна транзакция.
+"""
+
+from typing import Dict
+
+from sqlalchemy import bindparam
+
+from core.calibration import fit_tubes, fit_mouthpieces, fit_bells, changes
+from .models import db, Mouthpiece, Tube, Bell, StandardDesign
+from .flute_store import recompute_acoustics
+
+# Тип -> (модель, подбираемое поле, нужные колонки, функция подбора)
+FIT_TARGETS = {
+    'tubes': (Tube, 'v_eff', ('id', 'f_tube', 'L_total', 'd_in', 'v_eff'), fit_tubes),
+    'mouthpieces': (
+        Mouthpiece, 'delta_m',
+        ('id', 'f_meas', 'L_calib', 'temperature', 'd_out', 'L_m', 'delta_m'), fit_mouthpieces
+    ),
+    'bells': (
+        Bell, 'delta_L',
+        ('id', 'f_no_bell', 'f_with_bell', 'v_sound', 'length', 'expansion_ratio',
+         'start_diameter', 'end_diameter', 'delta_L'), fit_bells
+    ),
+}
+
+
+def _write(model, field, rows) -> None:
+    """UPDATE по id одним executemany; version раструбов растет через onupdate колонки"""
+    table = model.__table__
+    stmt = table.update().where(table.c.id == bindparam('row_id')).values({field: bindparam('value')})
+    db.session.execute(stmt, [{'row_id': row['id'], 'value': row['value']} for row in rows])
+
+
+def recalibrate(dry_run: bool = False, overwrite: bool = False) -> Dict:
+    """
+    Подобрать v_eff, delta_m и delta_L по измерениям всех компонентов
+
+    Значения по регрессии записываются только туда, где параметр пуст
+    (overwrite=True - всегда). dry_run - только отчет, без записи.
+    """
+    report = {}
+    try:
+        for name, (model, field, columns, fit) in FIT_TARGETS.items():
+            rows = [row._asdict() for row in db.session.execute(
+                db.select(*[getattr(model, c) for c in columns]).order_by(model.id))]
+            result = fit(rows)
+
+            current = [row[field] for row in rows]
+            updates = changes(result, current)
+            if not overwrite:
+                estimated = {result['ids'][i] for i, f in enumerate(result['filled']) if f}
+                empty = {row['id'] for row in rows if row[field] is None}
+                updates = [u for u in updates if u['id'] not in estimated or u['id'] in empty]
+
+            if updates and not dry_run:
+                _write(model, field, updates)
+                # Каталог зависит от delta_m - строки с измененными мундштуками устарели
+                if model is Mouthpiece:
+                    db.session.execute(db.delete(StandardDesign).where(
+                        StandardDesign.mouthpiece_id.in_([u['id'] for u in updates])))
+
+            report[name] = {
+                'field': field,
+                'total': len(rows),
+                'measured': int(result['measured'].sum()),
+                'estimated': int(result['filled'].sum()),
+                'updated': len(updates),
+                'regression': {'coefficients': result['coefficients'], 'rms': result['rms']},
+                'changes': updates,
+            }
+
+        if dry_run:
+            db.session.rollback()
+        else:
+            report['flutes_recomputed'] = recompute_acoustics()
+            db.session.commit()
+        return report
+    except Exception:
+        db.session.rollback()
+        raise
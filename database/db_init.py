@@ -2,6 +2,8 @@
 Инициализация базы данных
 """
 
+import re
+
 from .models import db
 
 def init_database(app):
@@ -36,4 +38,185 @@ def init_database(app):
             return True
         except Exception as e:
             print(f"❌ Ошибка инициализации БД: {e}")
-            return False
\ No newline at end of file
+            return False
+
+_NAME = r'["`\[]?{}["`\]]?'
+_ON_ACTIONS = r'(?:\s+ON\s+(?:DELETE|UPDATE)\s+(?:SET\s+NULL|SET\s+DEFAULT|CASCADE|RESTRICT|NO\s+ACTION))*'
+
+
+def _rewrite_foreign_keys(sql, table):
+    """
+    DDL таблицы из sqlite_master с ON DELETE внешних ключей как в модели
+
+    Остальное (AUTOINCREMENT, DEFAULT, лишние колонки) сохраняется как было.
+    """
+    for fk in table.foreign_keys:
+        column = re.escape(fk.parent.name)
+        target = f'{fk.column.table.name}({fk.column.name})'
+        action = f' ON DELETE {fk.ondelete.upper()}' if fk.ondelete else ''
+
+        # FOREIGN KEY (col) REFERENCES t(id) [ON ...]
+        table_level = re.compile(
+            r'FOREIGN\s+KEY\s*\(\s*' + _NAME.format(column) + r'\s*\)\s*REFERENCES\s+[^\s(]+\s*\([^)]*\)'
+            + _ON_ACTIONS, re.IGNORECASE)
+        # col INTEGER ... REFERENCES t(id) [ON ...]
+        column_level = re.compile(
+            r'((?:^|[(,])\s*' + _NAME.format(column) + r'\s[^,()]*?)REFERENCES\s+[^\s(]+\s*\([^)]*\)'
+            + _ON_ACTIONS, re.IGNORECASE)
+
+        if table_level.search(sql):
+            sql = table_level.sub(lambda m: f'FOREIGN KEY ({fk.parent.name}) REFERENCES {target}{action}', sql, 1)
+        elif column_level.search(sql):
+            sql = column_level.sub(lambda m: f'{m.group(1)}REFERENCES {target}{action}', sql, 1)
+        else:
+            end = sql.rindex(')')
+            sql = f'{sql[:end].rstrip()},\n    FOREIGN KEY ({fk.parent.name}) REFERENCES {target}{action}\n{sql[end:]}'
+    return sql
+
+
+def upgrade_foreign_keys():
+    """
+    Привести ON DELETE внешних ключей старой базы к моделям
+
+    SQLite не умеет менять внешние ключи через ALTER TABLE, поэтому
+    таблица пересоздается: новая таблица -> копирование -> удаление
+    старой -> переименование. DDL новой таблицы - исходный из
+    sqlite_master с замененными внешними ключами (AUTOINCREMENT и
+    прочее не теряются); счетчик AUTOINCREMENT, индексы и триггеры
+    переносятся. Вызывать внутри app_context.
+    """
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return []
+
+    upgraded = []
+    with engine.connect() as conn:
+        # PRAGMA foreign_keys действует только вне транзакции
+        conn.exec_driver_sql('PRAGMA foreign_keys=OFF')
+        conn.commit()
+        try:
+            for table in db.metadata.sorted_tables:
+                expected = {
+                    (fk.parent.name, (fk.ondelete or 'NO ACTION').upper())
+                    for fk in table.foreign_keys
+                }
+                if not expected:
+                    continue
+                actual = {
+                    (row[3], row[6].upper())
+                    for row in conn.exec_driver_sql(f'PRAGMA foreign_key_list("{table.name}")')
+                }
+                if not actual or actual == expected:
+                    continue
+
+                original = conn.exec_driver_sql(
+                    "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)).scalar()
+                extras = [row[0] for row in conn.exec_driver_sql(
+                    "SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = ? "
+                    "AND sql IS NOT NULL", (table.name,))]
+                has_sequence = conn.exec_driver_sql(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").scalar()
+                sequence = conn.exec_driver_sql(
+                    'SELECT seq FROM sqlite_sequence WHERE name = ?', (table.name,)).scalar() \
+                    if has_sequence else None
+
+                new_name = f'{table.name}__new'
+                ddl = re.sub(r'^\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?' + _NAME.format(re.escape(table.name)),
+                             f'CREATE TABLE "{new_name}"', _rewrite_foreign_keys(original, table),
+                             count=1, flags=re.IGNORECASE)
+                columns = ', '.join(
+                    f'"{row[1]}"' for row in conn.exec_driver_sql(f'PRAGMA table_info("{table.name}")'))
+                conn.commit()
+
+                with conn.begin():
+                    conn.exec_driver_sql(ddl)
+                    conn.exec_driver_sql(
+                        f'INSERT INTO "{new_name}" ({columns}) SELECT {columns} FROM "{table.name}"')
+                    conn.exec_driver_sql(f'DROP TABLE "{table.name}"')
+                    conn.exec_driver_sql(f'ALTER TABLE "{new_name}" RENAME TO "{table.name}"')
+                    # Удаленные id не должны выдаваться снова
+                    if sequence is not None:
+                        conn.exec_driver_sql(
+                            'UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (sequence, table.name))
+                    for sql in extras:
+                        conn.exec_driver_sql(sql)
+                    for index in table.indexes:
+                        index.create(conn, checkfirst=True)
+                upgraded.append(table.name)
+            conn.commit()
+        finally:
+            conn.exec_driver_sql('PRAGMA foreign_keys=ON')
+            conn.commit()
+    return upgraded
+
+
+def add_missing_columns():
+    """
+    Добавить в таблицы старой базы колонки, появившиеся в моделях
+
+    Новые колонки должны допускать NULL или иметь server_default.
+    """
+    from sqlalchemy.schema import CreateColumn
+
+    added = []
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table.name}")')}
+            if not existing:
+                continue
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+                    conn.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN {ddl}')
+                    added.append(f'{table.name}.{column.name}')
+    return added
+
+
+def create_missing_indexes():
+    """Создать индексы моделей, которых нет в существующей базе"""
+    created = []
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {row[1] for row in conn.exec_driver_sql(f'PRAGMA index_list("{table.name}")')}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+                    created.append(index.name)
+    return created
+
+
+def backfill_holes():
+    """
+    Перенести отверстия из holes_data в таблицу holes
+
+    Для флейт, созданных до перехода на таблицу holes: у них есть JSON,
+    но нет строк. Вызывать внутри app_context.
+    """
+    from .models import Flute, Hole
+    from .flute_store import parse_holes, hole_rows, insert_holes
+
+    has_rows = db.select(Hole.id).where(Hole.flute_id == Flute.id).exists()
+    pending = db.session.execute(
+        db.select(Flute.id, Flute.holes_data)
+        .where(Flute.holes_data.is_not(None), Flute.holes_data != '[]', ~has_rows)
+    ).all()
+
+    rows = []
+    for flute_id, holes_data in pending:
+        try:
+            rows.extend(hole_rows(flute_id, parse_holes(holes_data)))
+        except (ValueError, TypeError) as e:
+            print(f"⚠️  Дудикс {flute_id}: holes_data не разобран ({e})")
+    insert_holes(rows)
+    db.session.commit()
+    return len(rows)
+
+
+def backfill_acoustics():
+    """Рассчитать акустические колонки флейт, где они еще не заполнены"""
+    from .models import Flute
+    from .flute_store import recompute_acoustics
+
+    count = recompute_acoustics(Flute.total_effective_length.is_(None), Flute.tube_length.is_not(None))
+    db.session.commit()
+    return count
@@ -0,0 +1,396 @@
+"""
+Запись флейт и отверстий в базу
+
+Каждая операция - одна транзакция: флейта получает id через flush,
+отверстия вставляются одним INSERT ... executemany, commit один раз.
+При ошибке транзакция откатывается целиком.
+
+Акустические колонки флейты (total_effective_length, base_frequency)
+пересчитываются в той же транзакции одним UPDATE - и при записи флейты,
+и при изменении или удалении ее компонентов.
+"""
+
+import json
+from typing import Dict, List
+
+from sqlalchemy.exc import IntegrityError
+
+from core.acoustics import DEFAULT_SOUND_SPEED, effective_length, base_frequency
+from core.catalog import CATALOG_INPUTS
+from .models import db, Flute, Hole, Mouthpiece, Tube, Bell, StandardDesign
+
+# Поля отверстия и значения по умолчанию
+HOLE_DEFAULTS = {
+    'note': None,
+    'position': None,
+    'diameter': 8.0,
+    'angle': 0,
+    'is_calibrated': False,
+    'acoustic_length_correction': None,
+    'is_under_cut': False,
+    'chimney_height': None,
+}
+
+
+# Числовые поля флейты: тип и может ли значение быть пустым
+FLUTE_NUMBERS = {
+    'tube_length': (float, False),
+    'hole_count': (int, False),
+    'temperature': (float, True),
+    'tube_id': (int, False),
+    'mouthpiece_id': (int, True),
+    'bell_id': (int, True),
+}
+
+
+def _number(field: str, value, kind: type, nullable: bool):
+    """Значение поля запроса, приведенное к числу kind; ошибка - ValueError"""
+    if value is None or value == '':
+        if not nullable:
+            raise ValueError(f'Не задано поле {field}')
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f'Поле {field} должно быть числом')
+    try:
+        number = float(value)
+        if kind is int:
+            if not number.is_integer():
+                raise ValueError
+            number = int(number)
+    except (TypeError, ValueError):
+        raise ValueError(f'Поле {field} должно быть {"целым " if kind is int else ""}числом: {value!r}')
+    return number
+
+
+def clean_numbers(data: Dict) -> Dict:
+    """Числовые поля флейты из данных запроса, приведенные к типам; ошибка - ValueError"""
+    cleaned = {}
+    for field, (kind, nullable) in FLUTE_NUMBERS.items():
+        if field not in data:
+            continue
+        number = _number(field, data[field], kind, nullable)
+        if field == 'tube_length' and number is not None and number <= 0:
+            raise ValueError('Длина трубки должна быть положительной')
+        if field == 'hole_count' and number is not None and number < 0:
+            raise ValueError('Число отверстий не может быть отрицательным')
+        cleaned[field] = number
+    return cleaned
+
+
+# Ссылки флейты на компоненты: поле -> (модель, сообщение об отсутствии)
+FLUTE_REFERENCES = {
+    'tube_id': (Tube, 'Трубка не найдена'),
+    'mouthpiece_id': (Mouthpiece, 'Мундштук не найден'),
+    'bell_id': (Bell, 'Раструб не найден'),
+}
+
+
+def check_references(flutes: List[Flute]) -> None:
+    """Все компоненты, на которые ссылаются флейты, существуют (по запросу на модель)"""
+    for field, (model, message) in FLUTE_REFERENCES.items():
+        ids = {getattr(flute, field) for flute in flutes} - {None}
+        if not ids:
+            continue
+        # Без autoflush: измененная флейта не должна уйти в базу до проверки
+        with db.session.no_autoflush:
+            found = set(db.session.execute(db.select(model.id).where(model.id.in_(ids))).scalars())
+        missing = sorted(ids - found)
+        if missing:
+            raise ValueError(f'{message}: id {", ".join(map(str, missing))}')
+
+
+def parse_holes(holes_data) -> List[Dict]:
+    """Список отверстий из JSON-строки или списка"""
+    if not holes_data:
+        return []
+    holes = json.loads(holes_data) if isinstance(holes_data, str) else holes_data
+    if not isinstance(holes, list):
+        raise ValueError('holes_data должен быть списком отверстий')
+    return holes
+
+
+def hole_rows(flute_id: int, holes: List[Dict]) -> List[Dict]:
+    """Строки таблицы holes для вставки"""
+    rows = []
+    for hole in holes:
+        row = {field: hole.get(field, default) for field, default in HOLE_DEFAULTS.items()}
+        if row['diameter'] is None:
+            row['diameter'] = HOLE_DEFAULTS['diameter']
+        row['flute_id'] = flute_id
+        rows.append(row)
+    return rows
+
+
+def insert_holes(rows: List[Dict]) -> None:
+    """Вставить отверстия одним executemany"""
+    if rows:
+        db.session.execute(Hole.__table__.insert(), rows)
+
+
+def build_flute(data: Dict) -> Flute:
+    """Флейта из данных запроса (без сохранения)"""
+    if not isinstance(data, dict):
+        raise ValueError('Ожидается JSON-объект дудикса')
+    if 'name' not in data:
+        raise ValueError('Отсутствует название дудикса')
+    if 'tube_id' not in data:
+        raise ValueError('Не выбрана трубка')
+
+    numbers = {'tube_length': 450.0, 'hole_count': 6, 'temperature': 20.0, **clean_numbers(data)}
+    holes_data = data.get('holes_data', '[]')
+    custom_notes = data.get('custom_notes', '[]')
+    return Flute(
+        name=data.get('name', 'Новый дудикс'),
+        key=data.get('key', 'D'),
+        scale=data.get('scale', 'minor'),
+        tube_length=numbers['tube_length'],
+        hole_count=numbers['hole_count'],
+        mouthpiece_id=numbers.get('mouthpiece_id'),
+        tube_id=numbers['tube_id'],
+        bell_id=numbers.get('bell_id'),
+        custom_notes=custom_notes if isinstance(custom_notes, str) else json.dumps(custom_notes, ensure_ascii=False),
+        holes_data=holes_data if isinstance(holes_data, str) else json.dumps(holes_data, ensure_ascii=False),
+        is_verified=data.get('is_verified', False),
+        temperature=numbers['temperature']
+    )
+
+
+def create_flute(data: Dict) -> Flute:
+    """Создать флейту с отверстиями в одной транзакции"""
+    flute = build_flute(data)
+    holes = parse_holes(data.get('holes_data'))
+    return _save_flutes([(flute, holes)])[0]
+
+
+def create_flutes(items: List[Dict]) -> List[Flute]:
+    """
+    Создать набор флейт (импорт каталога) в одной транзакции
+
+    Ошибка в любой записи отменяет весь набор; ValueError содержит
+    номер записи.
+    """
+    pairs = []
+    for index, data in enumerate(items):
+        try:
+            pairs.append((build_flute(data), parse_holes(data.get('holes_data'))))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f'Запись {index}: {e}') from e
+    return _save_flutes(pairs)
+
+
+def _save_flutes(pairs) -> List[Flute]:
+    """Сохранить флейты и их отверстия: flush для id, один INSERT отверстий, один commit"""
+    flutes = [flute for flute, _ in pairs]
+    check_references(flutes)
+    try:
+        db.session.add_all(flutes)
+        db.session.flush()
+        recompute_acoustics(Flute.id.in_([flute.id for flute in flutes]))
+
+        rows = []
+        for flute, holes in pairs:
+            rows.extend(hole_rows(flute.id, holes))
+        insert_holes(rows)
+
+        db.session.commit()
+        return flutes
+    except IntegrityError as e:
+        db.session.rollback()
+        raise ValueError(f'Нарушена целостность данных: {e.orig}') from e
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+# Поля флейты, которые можно менять через PUT
+FLUTE_UPDATABLE = (
+    'name', 'key', 'scale', 'tube_length', 'hole_count', 'is_verified', 'temperature',
+    'mouthpiece_id', 'tube_id', 'bell_id',
+)
+
+
+def update_flute(flute: Flute, data: Dict) -> Dict:
+    """
+    Обновить флейту; отверстия синхронизируются по разнице
+
+    Возвращает статистику синхронизации отверстий.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Ожидается JSON-объект дудикса')
+    numbers = clean_numbers(data)
+    try:
+        for field in FLUTE_UPDATABLE:
+            if field in data:
+                setattr(flute, field, numbers.get(field, data[field]))
+        if 'custom_notes' in data:
+            notes = data['custom_notes']
+            flute.custom_notes = notes if isinstance(notes, str) else json.dumps(notes, ensure_ascii=False)
+        check_references([flute])
+
+        stats = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+        if 'holes_data' in data:
+            holes = parse_holes(data['holes_data'])
+            stats = sync_holes(flute.id, holes)
+            flute.holes_data = json.dumps(holes, ensure_ascii=False)
+
+        db.session.flush()
+        recompute_acoustics(Flute.id == flute.id)
+        db.session.commit()
+        return stats
+    except IntegrityError as e:
+        db.session.rollback()
+        raise ValueError(f'Нарушена целостность данных: {e.orig}') from e
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def sync_holes(flute_id: int, holes: List[Dict]) -> Dict:
+    """
+    Привести строки holes флейты к новому списку минимальным числом записей
+
+    Отверстие сопоставляется со старым по id, иначе по ноте. Изменения
+    пишутся пакетно: UPDATE только измененных строк, один INSERT, один DELETE.
+    """
+    existing = {h.id: h for h in Hole.query.filter_by(flute_id=flute_id)}
+    unmatched = dict(existing)
+    by_note = {}
+    for hole in existing.values():
+        by_note.setdefault(hole.note, []).append(hole.id)
+
+    updates, inserts, unchanged = [], [], 0
+    for new in holes:
+        old = None
+        if new.get('id') in unmatched:
+            old = unmatched.pop(new['id'])
+        else:
+            for hole_id in by_note.get(new.get('note'), []):
+                if hole_id in unmatched:
+                    old = unmatched.pop(hole_id)
+                    break
+
+        if old is None:
+            inserts.append(new)
+            continue
+
+        changes = {
+            field: new[field] for field in HOLE_DEFAULTS
+            if field in new and new[field] != getattr(old, field)
+        }
+        if changes:
+            updates.append({'id': old.id, **changes})
+        else:
+            unchanged += 1
+
+    # UPDATE по первичному ключу: строки с одинаковым набором полей идут одним executemany
+    if updates:
+        db.session.execute(db.update(Hole), updates)
+    insert_holes(hole_rows(flute_id, inserts))
+    if unmatched:
+        db.session.execute(db.delete(Hole).where(Hole.id.in_(list(unmatched))))
+
+    return {'inserted': len(inserts), 'updated': len(updates), 'deleted': len(unmatched), 'unchanged': unchanged}
+
+
+# ========== АКУСТИЧЕСКИЕ КОЛОНКИ ==========
+
+# Ссылка флейты на компонент и поля компонента, от которых зависит акустика
+COMPONENT_LINKS = {
+    Mouthpiece: ('mouthpiece_id', ('delta_m',)),
+    Tube: ('tube_id', ('v_eff', 'v_air')),
+    Bell: ('bell_id', ('delta_L',)),
+}
+
+
+def acoustics_values() -> Dict:
+    """Выражения для UPDATE flutes: параметры компонентов коррелированными подзапросами"""
+    delta_m = db.select(Mouthpiece.delta_m).where(Mouthpiece.id == Flute.mouthpiece_id).scalar_subquery()
+    delta_L = db.select(Bell.delta_L).where(Bell.id == Flute.bell_id).scalar_subquery()
+    v_sound = db.select(db.func.coalesce(Tube.v_eff, Tube.v_air)).where(Tube.id == Flute.tube_id).scalar_subquery()
+
+    length = effective_length(Flute.tube_length, db.func.coalesce(delta_m, 0.0), db.func.coalesce(delta_L, 0.0))
+    return {
+        'total_effective_length': length,
+        'base_frequency': base_frequency(length, db.func.coalesce(v_sound, DEFAULT_SOUND_SPEED)),
+    }
+
+
+def recompute_acoustics(*criteria) -> int:
+    """Пересчитать акустические колонки флейт одним UPDATE (без commit)"""
+    stmt = db.update(Flute).values(**acoustics_values()).execution_options(synchronize_session=False)
+    if criteria:
+        stmt = stmt.where(*criteria)
+    return db.session.execute(stmt).rowcount
+
+
+# Поля компонента, которые клиент не задает
+COMPONENT_READONLY = ('id', 'created_at', 'version')
+
+
+def update_component(component, data: Dict) -> int:
+    """
+    Обновить мундштук, трубку или раструб
+
+    Если изменились акустические поля, флейты с этим компонентом
+    пересчитываются в той же транзакции, а его строки каталога
+    standard_designs удаляются. Возвращает число пересчитанных флейт.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Ожидается JSON-объект')
+    column, acoustic_fields = COMPONENT_LINKS[type(component)]
+    editable = [c for c in component.__table__.columns if c.name not in COMPONENT_READONLY]
+
+    # Числовые колонки - по типу колонки, как clean_numbers для флейт
+    values = {}
+    for col in editable:
+        if col.name not in data:
+            continue
+        value = data[col.name]
+        if isinstance(col.type, (db.Integer, db.Float)):
+            kind = int if isinstance(col.type, db.Integer) else float
+            value = _number(col.name, value, kind, col.nullable)
+        elif value is None or value == '':
+            if not col.nullable:
+                raise ValueError(f'Не задано поле {col.name}')
+        elif not isinstance(value, str):
+            raise ValueError(f'Поле {col.name} должно быть строкой')
+        values[col.name] = value
+
+    try:
+        changed = set()
+        for field, value in values.items():
+            if value != getattr(component, field):
+                setattr(component, field, value)
+                changed.add(field)
+
+        recomputed = 0
+        if changed & set(acoustic_fields):
+            db.session.flush()
+            recomputed = recompute_acoustics(getattr(Flute, column) == component.id)
+
+        # Готовые конструкции с этим компонентом устарели (пересобираются build_catalog.py)
+        if changed & set(CATALOG_INPUTS.get(component.__tablename__, ())):
+            db.session.execute(db.delete(StandardDesign).where(getattr(StandardDesign, column) == component.id))
+        db.session.commit()
+        return recomputed
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def delete_component(component) -> int:
+    """Удалить компонент; флейты, ссылавшиеся на него, пересчитываются"""
+    column, _ = COMPONENT_LINKS[type(component)]
+    try:
+        flute_ids = db.session.scalars(
+            db.select(Flute.id).where(getattr(Flute, column) == component.id)
+        ).all()
+        db.session.delete(component)
+        db.session.flush()
+        if flute_ids:
+            recompute_acoustics(Flute.id.in_(flute_ids))
+        db.session.commit()
+        return len(flute_ids)
+    except Exception:
+        db.session.rollback()
+        raise
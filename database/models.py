@@ -3,12 +3,24 @@
 """
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from datetime import datetime
 import json
+import sqlite3
 
 db = SQLAlchemy()
 
 
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite по умолчанию не проверяет внешние ключи и не выполняет ON DELETE"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
 class Mouthpiece(db.Model):
     """Мундштук с акустическими параметрами"""
     __tablename__ = 'mouthpieces'
@@ -159,6 +171,10 @@ class Bell(db.Model):
     f_with_bell = db.Column(db.Float)    # Частота с раструбом (f_with_bell)
     v_sound = db.Column(db.Float, default=34300.0)  # Скорость звука при калибровке (см/с)
     
+    # Версия строки: +1 при каждом UPDATE, без блокировки (ключ кэша разобранного профиля)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1',
+                        onupdate=db.text('version + 1'))
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -207,22 +223,25 @@ class Flute(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Компоненты
-    mouthpiece_id = db.Column(db.Integer, db.ForeignKey('mouthpieces.id'))
-    tube_id = db.Column(db.Integer, db.ForeignKey('tubes.id'))
-    bell_id = db.Column(db.Integer, db.ForeignKey('bells.id'))
+    mouthpiece_id = db.Column(db.Integer, db.ForeignKey('mouthpieces.id', ondelete='SET NULL'))
+    tube_id = db.Column(db.Integer, db.ForeignKey('tubes.id', ondelete='SET NULL'))
+    bell_id = db.Column(db.Integer, db.ForeignKey('bells.id', ondelete='SET NULL'))
     
-    # Калибровочные данные отверстий (JSON)
+    # Копия отверстий в JSON (пишется вместе с таблицей holes; источник данных - holes)
     holes_data = db.Column(db.Text, default='[]')
     
     # Акустические параметры всей системы
+    # Считаются при записи флейты и ее компонентов (database/flute_store.py)
     total_effective_length = db.Column(db.Float)  # L_eff_total = L_tube + 2*δ_m + ΔL_bell
-    base_frequency = db.Column(db.Float)  # f_base = v / (2 * L_eff_total)
+    base_frequency = db.Column(db.Float, index=True)  # f_base = v / (2 * L_eff_total)
     temperature = db.Column(db.Float, default=20.0)  # Температура при создании
     
     # Связи
     mouthpiece = db.relationship('Mouthpiece', backref='flutes')
     tube = db.relationship('Tube', backref='flutes')
     bell = db.relationship('Bell', backref='flutes')
+    # Отверстия удаляются базой (ON DELETE CASCADE), без загрузки в сессию
+    holes = db.relationship('Hole', backref='flute', passive_deletes=True, order_by='Hole.position')
     
     def to_dict(self):
         return {
@@ -242,7 +261,7 @@ class Flute(db.Model):
             'bell': self.bell.to_dict() if self.bell else None,
             
             # Отверстия
-            'holes': json.loads(self.holes_data) if self.holes_data else [],
+            'holes': [hole.to_dict() for hole in self.holes],
             
             # Акустические параметры
             'total_effective_length': self.total_effective_length,
@@ -252,11 +271,15 @@ class Flute(db.Model):
 
 
 class Hole(db.Model):
-    """Отдельное отверстие (для сложных конфигураций)"""
+    """Отверстие флейты"""
     __tablename__ = 'holes'
+    __table_args__ = (
+        # Выборки по всем флейтам: "все отверстия E4 диаметром больше 9 мм"
+        db.Index('ix_holes_note_diameter', 'note', 'diameter'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    flute_id = db.Column(db.Integer, db.ForeignKey('flutes.id'), nullable=False)
+    flute_id = db.Column(db.Integer, db.ForeignKey('flutes.id', ondelete='CASCADE'), nullable=False, index=True)
     note = db.Column(db.String(10))        # D4, E4, F4, etc.
     position = db.Column(db.Float)         # позиция от мундштука (мм)
     diameter = db.Column(db.Float)         # диаметр отверстия (мм)
@@ -314,6 +337,11 @@ class CalibrationData(db.Model):
     source = db.Column(db.String(100))  # Кто/что измерил
     confidence = db.Column(db.Float, default=1.0)  # Достоверность (0-1)
     notes = db.Column(db.Text)
+    
+    # Версия строки: +1 при каждом UPDATE, без блокировки (подпись индекса похожести)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1',
+                        onupdate=db.text('version + 1'))
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -341,4 +369,55 @@ class CalibrationData(db.Model):
             'confidence': self.confidence,
             'notes': self.notes,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+        }
+
+class StandardDesign(db.Model):
+    """Готовый расчет стандартной конструкции (строится build_catalog.py)"""
+    __tablename__ = 'standard_designs'
+    __table_args__ = (
+        # Ответ /api/calculate - одна выборка по этому индексу
+        db.Index('ix_standard_designs_lookup', 'tube_id', 'mouthpiece_id', 'key', 'scale', 'hole_count', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    tube_id = db.Column(db.Integer, db.ForeignKey('tubes.id', ondelete='CASCADE'), nullable=False)
+    mouthpiece_id = db.Column(db.Integer, db.ForeignKey('mouthpieces.id', ondelete='CASCADE'))  # NULL - без мундштука
+    key = db.Column(db.String(10), nullable=False)
+    scale = db.Column(db.String(50), nullable=False)
+    hole_count = db.Column(db.Integer, nullable=False)
+    tube_length = db.Column(db.Float)  # длина трубки, для которой сделан расчет (мм)
+    holes = db.Column(db.Text)         # JSON: [{note, position, diameter, source}]
+    built_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class Job(db.Model):
+    """Фоновая задача (длительный расчет)"""
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)     # sweep, monte_carlo, ...
+    status = db.Column(db.String(20), default='queued', index=True)  # queued, running, done, failed
+    progress = db.Column(db.Float, default=0.0)         # 0..1
+    message = db.Column(db.String(200))
+    
+    params = db.Column(db.Text)   # JSON параметров
+    result = db.Column(db.Text)   # JSON результата
+    error = db.Column(db.Text)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'params': json.loads(self.params) if self.params else {},
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,45 @@
+# recalibrate.py
+"""
+Перекалибровка всех компонентов по их измерениям
+
+Подбирает v_eff трубок, delta_m мундштуков и delta_L раструбов, пакетно
+записывает изменения и пересчитывает акустику флейт:
+    python recalibrate.py              # записать
+    python recalibrate.py --dry-run    # только показать изменения
+    python recalibrate.py --overwrite  # заменить и заданные вручную значения оценкой
+"""
+
+import os
+import sys
+import time
+
+# Добавляем путь к корню проекта
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from app import create_app
+from database.calibration_store import recalibrate
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("🎯 ПЕРЕКАЛИБРОВКА КОМПОНЕНТОВ")
+    print("=" * 60)
+
+    dry_run = '--dry-run' in sys.argv
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        report = recalibrate(dry_run=dry_run, overwrite='--overwrite' in sys.argv)
+        for name in ('tubes', 'mouthpieces', 'bells'):
+            item = report[name]
+            rms = item['regression']['rms']
+            print(f"{name}: {item['total']} всего, {item['measured']} по измерениям, "
+                  f"{item['estimated']} по регрессии"
+                  + (f" (СКО {rms:.3f})" if rms is not None else "")
+                  + f", изменено {item['updated']} ({item['field']})")
+        if dry_run:
+            print("ℹ️ Пробный запуск: изменения не записаны")
+        else:
+            print(f"🔄 Пересчитано флейт: {report['flutes_recomputed']}")
+        print(f"✅ Готово за {time.perf_counter() - started:.2f} с")
@@ -13,9 +13,11 @@ def open_browser():
     time.sleep(1.5)
     webbrowser.open('http://localhost:5000')
 
-app = create_app()
-
 if __name__ == '__main__':
+    # Только при запуске скрипта: рабочие процессы очереди задач (spawn)
+    # импортируют этот модуль заново и не должны создавать приложение
+    app = create_app()
+    
     print("=" * 60)
     print("🎵 WIND INSTRUMENT TEMPLATE GENERATOR")
     print("=" * 60)
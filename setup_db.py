@@ -94,6 +94,7 @@ CREATE TABLE IF NOT EXISTS bells (
     f_no_bell REAL,
     f_with_bell REAL,
     v_sound REAL DEFAULT 34300.0,
+    version INTEGER NOT NULL DEFAULT 1,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 )
 ''')
@@ -117,9 +118,9 @@ CREATE TABLE IF NOT EXISTS flutes (
     total_effective_length REAL,
     base_frequency REAL,
     temperature REAL DEFAULT 20.0,
-    FOREIGN KEY (mouthpiece_id) REFERENCES mouthpieces(id),
-    FOREIGN KEY (tube_id) REFERENCES tubes(id),
-    FOREIGN KEY (bell_id) REFERENCES bells(id)
+    FOREIGN KEY (mouthpiece_id) REFERENCES mouthpieces(id) ON DELETE SET NULL,
+    FOREIGN KEY (tube_id) REFERENCES tubes(id) ON DELETE SET NULL,
+    FOREIGN KEY (bell_id) REFERENCES bells(id) ON DELETE SET NULL
 )
 ''')
 
@@ -136,9 +137,12 @@ CREATE TABLE IF NOT EXISTS holes (
     acoustic_length_correction REAL,
     is_under_cut BOOLEAN DEFAULT FALSE,
     chimney_height REAL,
-    FOREIGN KEY (flute_id) REFERENCES flutes(id)
+    FOREIGN KEY (flute_id) REFERENCES flutes(id) ON DELETE CASCADE
 )
 ''')
+cursor.execute('CREATE INDEX IF NOT EXISTS ix_flutes_base_frequency ON flutes (base_frequency)')
+cursor.execute('CREATE INDEX IF NOT EXISTS ix_holes_flute_id ON holes (flute_id)')
+cursor.execute('CREATE INDEX IF NOT EXISTS ix_holes_note_diameter ON holes (note, diameter)')
 
 # Создаем таблицу calibration_data
 cursor.execute('''
@@ -164,6 +168,45 @@ CREATE TABLE IF NOT EXISTS calibration_data (
 )
 ''')
 
+# Создаем таблицу jobs (фоновые задачи)
+cursor.execute('''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT DEFAULT 'queued',
+    progress REAL DEFAULT 0.0,
+    message TEXT,
+    params TEXT,
+    result TEXT,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+)
+''')
+cursor.execute('CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status)')
+
+# Создаем таблицу standard_designs (каталог, заполняется build_catalog.py)
+cursor.execute('''
+CREATE TABLE IF NOT EXISTS standard_designs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tube_id INTEGER NOT NULL,
+    mouthpiece_id INTEGER,
+    key TEXT NOT NULL,
+    scale TEXT NOT NULL,
+    hole_count INTEGER NOT NULL,
+    tube_length REAL,
+    holes TEXT,
+    built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (tube_id) REFERENCES tubes(id) ON DELETE CASCADE,
+    FOREIGN KEY (mouthpiece_id) REFERENCES mouthpieces(id) ON DELETE CASCADE
+)
+''')
+cursor.execute('''
+CREATE UNIQUE INDEX IF NOT EXISTS ix_standard_designs_lookup
+    ON standard_designs (tube_id, mouthpiece_id, key, scale, hole_count)
+''')
+
 print("✅ Таблицы созданы")
 
 # Добавляем тестовые данные
@@ -0,0 +1,58 @@
+"""
+Файловый кэш с адресацией по содержимому
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from typing import Iterable, Iterator, Optional
+
+
+def content_hash(data) -> str:
+    """SHA-256 от канонического JSON-представления данных"""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ContentCache:
+    """Кэш файлов в папке: имя файла = хэш содержимого + расширение"""
+
+    def __init__(self, directory: str, suffix: str):
+        self.directory = directory
+        self.suffix = suffix
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}{self.suffix}')
+
+    def get(self, key: str) -> Optional[str]:
+        """Путь к закэшированному файлу или None"""
+        path = self.path(key)
+        return path if os.path.exists(path) else None
+
+    def put(self, key: str, data: bytes) -> str:
+        """Сохранить данные атомарно (через временный файл)"""
+        for _ in self.tee(key, [data]):
+            pass
+        return self.path(key)
+
+    def tee(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Отдать чанки дальше и одновременно записать их в кэш
+
+        Файл появляется в кэше только если генератор дочитан до конца;
+        при обрыве (например, клиент закрыл соединение) запись удаляется.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f'{self.path(key)}.{uuid.uuid4().hex}.tmp'
+        completed = False
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            os.replace(tmp_path, self.path(key))
+            completed = True
+        finally:
+            if not completed and os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,248 @@
+"""
+Метрики запросов WITG в формате Prometheus
+
+Для каждого маршрута собираются гистограммы длительности, размера
+ответа, времени и числа SQL-запросов, времени в калькуляторе, а также
+счетчик кодов ответа. Данные хранятся в памяти процесса и отдаются на
+/metrics. Медленные запросы пишутся в лог вместе с EXPLAIN QUERY PLAN.
+"""
+
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+slow_query_log = logging.getLogger('witg.slow_query')
+query_log = logging.getLogger('witg.queries')
+
+# Настройки из конфигурации приложения (заполняются в init_metrics)
+_settings = {
+    'slow_query_threshold': 0.1,   # с
+    'query_count_warning': 50,     # запросов за один HTTP-запрос
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Потокобезопасное хранилище метрик процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help[name] = (kind, help_text)
+
+    def observe(self, name: str, labels: Labels, value: float, buckets=LATENCY_BUCKETS) -> None:
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, labels: Labels, amount: float = 1.0) -> None:
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0.0) + amount
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (exposition format 0.0.4)"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                self._header(lines, name, 'counter')
+                for labels, value in sorted(series.items()):
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+
+            for name, series in sorted(self._histograms.items()):
+                self._header(lines, name, 'histogram')
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_labels(labels + (("le", _number(bound)),))} {cumulative}')
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+                    lines.append(f'{name}_sum{_labels(labels)} {_number(histogram.sum)}')
+                    lines.append(f'{name}_count{_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, lines, name, kind):
+        kind, help_text = self._help.get(name, (kind, name))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+# Реестр процесса
+metrics = MetricsRegistry()
+metrics.describe('witg_http_requests_total', 'counter', 'HTTP requests by endpoint, method and status')
+metrics.describe('witg_http_request_duration_seconds', 'histogram', 'HTTP request latency')
+metrics.describe('witg_http_response_size_bytes', 'histogram', 'HTTP response body size')
+metrics.describe('witg_db_time_seconds', 'histogram', 'Time spent in database queries per request')
+metrics.describe('witg_calculator_time_seconds', 'histogram', 'Time spent in the hole calculator per request')
+metrics.describe('witg_db_queries_per_request', 'histogram', 'SQL queries executed per request')
+metrics.describe('witg_db_slow_queries_total', 'counter', 'SQL queries slower than the slow-query threshold')
+
+
+@contextmanager
+def measure(section: str):
+    """
+    Учесть время блока в метриках текущего запроса
+
+    section: 'calculator' (или любое имя из g._timings)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context() and hasattr(g, '_timings'):
+            g._timings[section] = g._timings.get(section, 0.0) + time.perf_counter() - start
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+
+    in_request = has_request_context() and hasattr(g, '_timings')
+    if in_request:
+        g._timings['db'] = g._timings.get('db', 0.0) + elapsed
+        g._query_count += 1
+
+    if elapsed >= _settings['slow_query_threshold']:
+        endpoint = (request.endpoint or 'unmatched') if in_request else '-'
+        metrics.inc('witg_db_slow_queries_total', (('endpoint', endpoint),))
+        plan = _explain(conn, statement, parameters, executemany)
+        slow_query_log.warning(
+            '%.1f ms [%s] %s | params=%r%s',
+            elapsed * 1000, endpoint, ' '.join(statement.split()), parameters,
+            '\n  QUERY PLAN:\n    ' + '\n    '.join(plan) if plan else ''
+        )
+
+
+def _explain(conn, statement, parameters, executemany):
+    """EXPLAIN QUERY PLAN для SQLite (через DBAPI, мимо событий SQLAlchemy)"""
+    if conn.dialect.name != 'sqlite' or executemany:
+        return []
+    if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'WITH')):
+        return []
+    try:
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters or ())
+            return [str(row[-1]) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    except Exception as e:
+        return [f'(EXPLAIN не выполнен: {e})']
+
+
+def init_metrics(app):
+    """Подключить сбор метрик и маршрут /metrics"""
+
+    _settings['slow_query_threshold'] = app.config.get('SLOW_QUERY_THRESHOLD', 0.1)
+    _settings['query_count_warning'] = app.config.get('QUERY_COUNT_WARNING', 50)
+
+    log_path = app.config.get('SLOW_QUERY_LOG')
+    if log_path and not slow_query_log.handlers:
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        handler = logging.FileHandler(log_path, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+        slow_query_log.addHandler(handler)
+        query_log.addHandler(handler)
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_request_metrics():
+        g._request_start = time.perf_counter()
+        g._timings = {}
+        g._query_count = 0
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.pop('_request_start', None)
+        if start is None:
+            return response
+
+        endpoint = request.endpoint or 'unmatched'
+        labels = (('endpoint', endpoint), ('method', request.method))
+        metrics.inc('witg_http_requests_total', labels + (('status', str(response.status_code)),))
+        metrics.observe('witg_http_request_duration_seconds', labels, time.perf_counter() - start)
+
+        # У потоковых ответов размер заранее неизвестен
+        if not response.is_streamed and response.content_length is not None:
+            metrics.observe('witg_http_response_size_bytes', labels, response.content_length, SIZE_BUCKETS)
+
+        timings = g.get('_timings', {})
+        query_count = g.get('_query_count', 0)
+        metrics.observe('witg_db_time_seconds', labels, timings.get('db', 0.0))
+        metrics.observe('witg_db_queries_per_request', labels, query_count, QUERY_COUNT_BUCKETS)
+        if 'calculator' in timings:
+            metrics.observe('witg_calculator_time_seconds', labels, timings['calculator'])
+
+        # Много запросов на один HTTP-запрос - признак N+1
+        if query_count >= _settings['query_count_warning']:
+            query_log.warning('%d SQL-запросов в %s %s', query_count, request.method, request.path)
+
+        if app.config.get('QUERY_DEBUG_HEADERS'):
+            response.headers['X-DB-Queries'] = str(query_count)
+            response.headers['X-DB-Time-Ms'] = f"{timings.get('db', 0.0) * 1000:.2f}"
+        return response
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
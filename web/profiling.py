@@ -0,0 +1,218 @@
+"""
+Профилирование отдельных запросов по требованию
+
+Включается конфигурацией PROFILING_ENABLED, а для конкретного запроса -
+заголовком X-Profile или параметром ?_profile=. Режимы:
+
+    cprofile - детерминированный cProfile, сохраняется как .pstats
+    sample   - сэмплирующий профайлер потока запроса, сохраняется как
+               collapsed stacks (формат flamegraph.pl / speedscope)
+
+Профили доступны по id (заголовок ответа X-Profile-Id) через /admin/profiles.
+И профилирование, и /admin/profiles требуют заголовка X-Admin-Token, равного
+ADMIN_TOKEN; без заданного токена они недоступны. Хранится не больше
+PROFILE_MAX_COUNT профилей общим размером до PROFILE_MAX_BYTES - старые
+удаляются.
+"""
+
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from flask import g, jsonify, request, send_file
+
+PROFILE_ID_RE = re.compile(r'^[0-9a-f]{8,40}$')
+PROFILE_MODES = ('cprofile', 'sample')
+
+
+class StackSampler:
+    """Сэмплирование стека одного потока из фонового потока"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='witg-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def _requested_mode():
+    """Режим профилирования из заголовка или параметра запроса"""
+    value = request.headers.get('X-Profile') or request.args.get('_profile')
+    if not value:
+        return None
+    value = value.lower()
+    if value in ('1', 'true', 'yes'):
+        return 'cprofile'
+    return value if value in PROFILE_MODES else None
+
+
+def init_profiling(app):
+    """Подключить профилирование запросов и /admin/profiles"""
+
+    profile_dir = app.config['PROFILE_DIR']
+    if app.config.get('PROFILING_ENABLED') and not app.config.get('ADMIN_TOKEN'):
+        print("⚠️  PROFILING_ENABLED без ADMIN_TOKEN: профилирование недоступно")
+
+    def admin_allowed():
+        token = app.config.get('ADMIN_TOKEN')
+        if not app.config.get('PROFILING_ENABLED') or not token:
+            return False
+        given = request.headers.get('X-Admin-Token', '')
+        return hmac.compare_digest(given.encode('utf-8'), str(token).encode('utf-8'))
+
+    def prune_profiles():
+        """Удалить старые профили сверх PROFILE_MAX_COUNT и PROFILE_MAX_BYTES"""
+        groups = {}
+        for name in os.listdir(profile_dir):
+            profile_id = name.split('.', 1)[0]
+            if not PROFILE_ID_RE.match(profile_id) or name.endswith('.tmp'):
+                continue
+            path = os.path.join(profile_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            group = groups.setdefault(profile_id, {'paths': [], 'size': 0, 'mtime': 0.0})
+            group['paths'].append(path)
+            group['size'] += stat.st_size
+            group['mtime'] = max(group['mtime'], stat.st_mtime)
+
+        max_count = app.config.get('PROFILE_MAX_COUNT', 200)
+        max_bytes = app.config.get('PROFILE_MAX_BYTES', 100 * 1024 * 1024)
+        newest_first = sorted(groups.values(), key=lambda group: group['mtime'], reverse=True)
+        total = 0
+        for position, group in enumerate(newest_first):
+            total += group['size']
+            if position >= max_count or total > max_bytes:
+                for path in group['paths']:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+    @app.before_request
+    def start_profiling():
+        mode = _requested_mode()
+        if mode is None or not admin_allowed():
+            return
+
+        g._profile_mode = mode
+        g._profile_started = time.perf_counter()
+        if mode == 'cprofile':
+            g._profiler = cProfile.Profile()
+            g._profiler.enable()
+        else:
+            g._profiler = StackSampler(threading.get_ident(), app.config.get('PROFILE_SAMPLE_INTERVAL', 0.001))
+            g._profiler.start()
+
+    @app.after_request
+    def finish_profiling(response):
+        profiler = g.pop('_profiler', None)
+        if profiler is None:
+            return response
+
+        mode = g.pop('_profile_mode')
+        duration = time.perf_counter() - g.pop('_profile_started')
+        if mode == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+
+        profile_id = uuid.uuid4().hex[:16]
+        os.makedirs(profile_dir, exist_ok=True)
+        if mode == 'cprofile':
+            profiler.dump_stats(os.path.join(profile_dir, f'{profile_id}.pstats'))
+        else:
+            with open(os.path.join(profile_dir, f'{profile_id}.collapsed'), 'w', encoding='utf-8') as f:
+                f.write(profiler.collapsed())
+
+        meta = {
+            'id': profile_id,
+            'mode': mode,
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'created_at': datetime.utcnow().isoformat()
+        }
+        with open(os.path.join(profile_dir, f'{profile_id}.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        prune_profiles()
+
+        response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    @app.route('/admin/profiles')
+    def list_profiles():
+        if not admin_allowed():
+            return jsonify({'error': 'Профилирование отключено'}), 403
+
+        profiles = []
+        if os.path.isdir(profile_dir):
+            for name in os.listdir(profile_dir):
+                if name.endswith('.json'):
+                    with open(os.path.join(profile_dir, name), encoding='utf-8') as f:
+                        profiles.append(json.load(f))
+        profiles.sort(key=lambda p: p['created_at'], reverse=True)
+        return jsonify({'count': len(profiles), 'profiles': profiles})
+
+    @app.route('/admin/profiles/<profile_id>')
+    def get_profile(profile_id):
+        """Профиль: текстовая сводка, ?format=pstats или ?format=collapsed"""
+        if not admin_allowed():
+            return jsonify({'error': 'Профилирование отключено'}), 403
+        if not PROFILE_ID_RE.match(profile_id):
+            return jsonify({'error': 'Некорректный id профиля'}), 400
+
+        pstats_path = os.path.join(profile_dir, f'{profile_id}.pstats')
+        collapsed_path = os.path.join(profile_dir, f'{profile_id}.collapsed')
+        fmt = request.args.get('format', 'text')
+
+        if os.path.exists(pstats_path):
+            if fmt == 'pstats':
+                return send_file(pstats_path, mimetype='application/octet-stream',
+                                 as_attachment=True, download_name=f'{profile_id}.pstats')
+            out = io.StringIO()
+            stats = pstats.Stats(pstats_path, stream=out)
+            stats.sort_stats(request.args.get('sort', 'cumulative')).print_stats(int(request.args.get('limit', 60)))
+            return app.response_class(out.getvalue(), mimetype='text/plain')
+
+        if os.path.exists(collapsed_path):
+            return send_file(collapsed_path, mimetype='text/plain')
+
+        return jsonify({'error': 'Профиль не найден'}), 404
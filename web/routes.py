@@ -2,12 +2,17 @@
 Веб-маршруты WITG с обновленными моделями
 """
 
-from flask import render_template, jsonify, request, send_file
+from flask import render_template, jsonify, request, send_file, Response, stream_with_context
 from io import BytesIO
 import json
 from datetime import datetime
 import sys
 import os
+import uuid
+import queue
+import time
+import multiprocessing
+import numpy as np
 
 # Добавляем путь к корню проекта для корректных импортов
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -17,7 +22,15 @@ if parent_dir not in sys.path:
 
 # Импорты из нашей структуры
 try:
-    from database.models import db, Mouthpiece, Tube, Bell, Flute, Hole, CalibrationData
+    from database.models import db, Mouthpiece, Tube, Bell, Flute, Hole, CalibrationData, Job, StandardDesign
+    from database import flute_store
+    from database.calibration_store import recalibrate
+    from web.serializers import (
+        json_response, dumps, parse_fields, serialize_flutes, serialize_flutes_normalized,
+        serialize_mouthpieces,
+        serialize_tubes, serialize_bells, serialize_calibrations, serialize_holes,
+        fetch_dicts, fetch_by_ids, array_response, negotiate_array, array_dtype, CALIBRATION_FIELDS
+    )
     MODELS_LOADED = True
     print("✅ Модели загружены успешно")
 except ImportError as e:
@@ -53,16 +66,90 @@ except ImportError as e:
 
 # Пытаемся импортировать калькулятор
 try:
-    from calculator import calculate_positions_api
+    from calculator import calculate_positions_api, get_calculator
     CALCULATOR_LOADED = True
     print("✅ Калькулятор загружен успешно")
 except ImportError as e:
     print(f"⚠️  Ошибка импорта калькулятора: {e}")
     CALCULATOR_LOADED = False
 
+# Метрики (без SQLAlchemy - замер времени отключен)
+try:
+    from web.metrics import measure
+except ImportError:
+    from contextlib import nullcontext as measure
+
+# Генератор шаблонов (нужен svgwrite)
+try:
+    from core.template_gen import flute_geometry, geometry_hash, render_svg_chunks
+    from core.template_pdf import render_tiled_pdf, PAPER_SIZES
+    TEMPLATES_LOADED = True
+except ImportError as e:
+    print(f"⚠️  Ошибка импорта генератора шаблонов: {e}")
+    TEMPLATES_LOADED = False
+
+# Файловый кэш по хэшу содержимого
+from utils.cache import ContentCache, content_hash
+
+# Акустические формулы (без зависимостей)
+from core.acoustics import DEFAULT_SOUND_SPEED, effective_length, base_frequency, frequency_grid
+
+# Скорость звука при температуре, влажности и давлении
+from core.atmosphere import condition_grid, speed_ratio
+
+# Основной тон записей (WAV)
+from core.audio import MIN_FREQUENCY, MAX_FREQUENCY, analyze as analyze_recording
+from core.thermal import (
+    DEFAULT_MIN_TEMPERATURE, DEFAULT_MAX_TEMPERATURE, expansion_coefficient, temperature_range,
+    drift_ratio, cents
+)
+
+# Звуковое превью строя
+from core.synth import NOTE_SECONDS, SAMPLE_RATE, timbre_for, render as render_preview, wav_bytes
+
+# Поиск похожих калибровок
+from core.similarity import FEATURE_NAMES, CalibrationIndex, parse_weights
+
+# Живой пересчет для редактора отверстий
+from core.live import SessionStore
+from core.scales import SCALES, NOTE_NAMES, MAX_HOLES, normalize_key, scale_entry, scale_notes, note_frequency
+
+# Профили раструбов
+from core.bore import DEFAULT_STEP, profile_cache, describe as describe_profile
+
+# Фоновые задачи
+try:
+    from core.jobs import JobQueue, JOB_KINDS, JOB_ARRAYS, recover_interrupted, validate_params
+    JOBS_LOADED = True
+except ImportError as e:
+    print(f"⚠️  Ошибка импорта очереди задач: {e}")
+    JOBS_LOADED = False
+
 def register_routes(app):
     """Зарегистрировать все маршруты"""
     
+    if TEMPLATES_LOADED:
+        template_cache = ContentCache(app.config['TEMPLATE_CACHE_DIR'], '.svg')
+        pdf_cache = ContentCache(app.config['TEMPLATE_CACHE_DIR'], '.pdf')
+    preview_cache = ContentCache(app.config['AUDIO_CACHE_DIR'], '.wav')
+    
+    live_sessions = SessionStore()
+    
+    # Матрица признаков калибровок: (подпись таблицы, индекс)
+    similarity_state = {'signature': None, 'index': None}
+    
+    job_queue = None
+    if MODELS_LOADED and JOBS_LOADED:
+        with app.app_context():
+            db_path = db.engine.url.database
+        # Рабочие процессы (spawn) тоже импортируют приложение - чистим
+        # зависшие задачи только в основном процессе
+        if multiprocessing.parent_process() is None:
+            interrupted = recover_interrupted(db_path)
+            if interrupted:
+                print(f"⚠️  Прервано задач после перезапуска: {interrupted}")
+        job_queue = JobQueue(db_path, app.config['JOB_WORKERS'])
+    
     # ========== HTML СТРАНИЦЫ ==========
     
     @app.route('/')
@@ -79,19 +166,75 @@ def register_routes(app):
     
     # ========== API ДЛЯ ДАННЫХ ==========
     
+    def flute_list_options():
+        """Параметры ?fields= и ?format=normalized для API флейт"""
+        fields = parse_fields(request.args.get('fields'))
+        normalized = request.args.get('format') == 'normalized'
+        return fields, normalized
+    
+    def flute_filters():
+        """Условия выборки флейт: ?key=, ?verified=, ?min_frequency=, ?max_frequency= (Гц)"""
+        criteria = []
+        if request.args.get('key'):
+            criteria.append(Flute.key == request.args['key'])
+        if request.args.get('verified'):
+            criteria.append(Flute.is_verified == (request.args['verified'].lower() in ('1', 'true', 'yes')))
+        if request.args.get('min_frequency'):
+            criteria.append(Flute.base_frequency >= float(request.args['min_frequency']))
+        if request.args.get('max_frequency'):
+            criteria.append(Flute.base_frequency <= float(request.args['max_frequency']))
+        return criteria
+    
+    def page_options():
+        """Параметры ?page= и ?per_page= (страницы с 1); None - без пагинации"""
+        if 'page' not in request.args and 'per_page' not in request.args:
+            return None
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 50))
+        if page < 1 or not 1 <= per_page <= 500:
+            raise ValueError('page >= 1, per_page от 1 до 500')
+        return page, per_page
+    
+    def atmosphere_conditions(source):
+        """temperature (°C), humidity (%), pressure (гПа) из тела или ?параметров; нет - None"""
+        return {
+            name: float(source[name]) if source.get(name) is not None else None
+            for name in ('temperature', 'humidity', 'pressure')
+        }
+    
     @app.route('/api/flutes')
     def get_flutes():
         try:
             if not MODELS_LOADED:
                 return jsonify({'count': 0, 'verified_count': 0, 'flutes': []})
             
-            flutes = Flute.query.order_by(Flute.created_at.desc()).all()
+            try:
+                fields, normalized = flute_list_options()
+                page = page_options()
+                criteria = flute_filters()
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            # Отверстия всей страницы загружаются одним запросом
+            order_by = (Flute.created_at.desc(), Flute.id.desc())
+            limit = offset = None
+            if page is not None:
+                limit, offset = page[1], (page[0] - 1) * page[1]
+            serialize = serialize_flutes_normalized if normalized else serialize_flutes
+            payload = serialize(*criteria, order_by=order_by, fields=fields, limit=limit, offset=offset)
+            if not normalized:
+                payload = {'flutes': payload}
             verified_count = Flute.query.filter_by(is_verified=True).count()
             
-            return jsonify({
-                'count': len(flutes),
+            pagination = {}
+            if page is not None:
+                pagination = {'page': page[0], 'per_page': page[1], 'total': Flute.query.filter(*criteria).count()}
+            
+            return json_response({
+                'count': len(payload['flutes']),
                 'verified_count': verified_count,
-                'flutes': [f.to_dict() for f in flutes]
+                **pagination,
+                **payload
             })
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -102,8 +245,21 @@ def register_routes(app):
             if not MODELS_LOADED:
                 return jsonify({'error': 'Модели не загружены'}), 500
             
-            flute = Flute.query.get_or_404(flute_id)
-            return jsonify(flute.to_dict())
+            try:
+                fields, normalized = flute_list_options()
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            if normalized:
+                payload = serialize_flutes_normalized(Flute.id == flute_id, fields=fields)
+                if not payload['flutes']:
+                    return jsonify({'error': 'Дудикс не найден'}), 404
+                return json_response({'flute': payload['flutes'][0], 'components': payload['components']})
+            
+            flutes = serialize_flutes(Flute.id == flute_id, fields=fields)
+            if not flutes:
+                return jsonify({'error': 'Дудикс не найден'}), 404
+            return json_response(flutes[0])
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
@@ -113,48 +269,10 @@ def register_routes(app):
             if not MODELS_LOADED:
                 return jsonify({'error': 'Модели не загружены'}), 500
             
-            data = request.json
-            
-            if 'name' not in data:
-                return jsonify({'error': 'Отсутствует название дудикса'}), 400
-            
-            if 'tube_id' not in data:
-                return jsonify({'error': 'Не выбрана трубка'}), 400
-            
-            flute = Flute(
-                name=data.get('name', 'Новый дудикс'),
-                key=data.get('key', 'D'),
-                scale=data.get('scale', 'minor'),
-                tube_length=float(data.get('tube_length', 450.0)),
-                hole_count=int(data.get('hole_count', 6)),
-                mouthpiece_id=data.get('mouthpiece_id'),
-                tube_id=data.get('tube_id'),
-                bell_id=data.get('bell_id'),
-                custom_notes=data.get('custom_notes', '[]'),
-                holes_data=data.get('holes_data', '[]'),
-                is_verified=data.get('is_verified', False),
-                temperature=data.get('temperature', 20.0)
-            )
-            
-            db.session.add(flute)
-            db.session.commit()
-            
-            if data.get('holes_data') and data['holes_data'] != '[]':
-                holes = json.loads(data['holes_data'])
-                for hole_data in holes:
-                    hole = Hole(
-                        flute_id=flute.id,
-                        note=hole_data.get('note'),
-                        position=hole_data.get('position'),
-                        diameter=hole_data.get('diameter', 8.0),
-                        angle=hole_data.get('angle', 0),
-                        is_calibrated=hole_data.get('is_calibrated', False),
-                        acoustic_length_correction=hole_data.get('acoustic_length_correction'),
-                        is_under_cut=hole_data.get('is_under_cut', False),
-                        chimney_height=hole_data.get('chimney_height')
-                    )
-                    db.session.add(hole)
-                db.session.commit()
+            try:
+                flute = flute_store.create_flute(request.get_json(silent=True))
+            except (ValueError, TypeError) as e:
+                return jsonify({'error': str(e)}), 400
             
             return jsonify({
                 'success': True,
@@ -165,14 +283,42 @@ def register_routes(app):
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
+    @app.route('/api/flutes/bulk', methods=['POST'])
+    def create_flutes_bulk():
+        """Импорт каталога: много флейт в одной транзакции"""
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'error': 'Модели не загружены'}), 500
+            
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({'error': 'Ожидается JSON-объект с полем flutes'}), 400
+            items = data.get('flutes')
+            if not isinstance(items, list) or not items:
+                return jsonify({'error': 'Отсутствует список flutes'}), 400
+            
+            try:
+                flutes = flute_store.create_flutes(items)
+            except (ValueError, TypeError) as e:
+                return jsonify({'error': str(e)}), 400
+            
+            return jsonify({
+                'success': True,
+                'message': f'Создано дудиксов: {len(flutes)}',
+                'count': len(flutes),
+                'ids': [f.id for f in flutes]
+            })
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
     @app.route('/api/flutes/<int:flute_id>', methods=['DELETE'])
     def delete_flute(flute_id):
         try:
             if not MODELS_LOADED:
                 return jsonify({'error': 'Модели не загружены'}), 500
             
+            # Отверстия удаляет сама БД (ON DELETE CASCADE)
             flute = Flute.query.get_or_404(flute_id)
-            Hole.query.filter_by(flute_id=flute_id).delete()
             db.session.delete(flute)
             db.session.commit()
             
@@ -187,17 +333,89 @@ def register_routes(app):
                 return jsonify({'error': 'Модели не загружены'}), 500
             
             flute = Flute.query.get_or_404(flute_id)
-            data = request.json
+            holes = flute_store.update_flute(flute, request.get_json(silent=True))
+            return jsonify({
+                'success': True,
+                'message': 'Дудикс обновлен',
+                'flute': flute.to_dict(),
+                'holes': holes
+            })
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    # ========== API ДЛЯ ОТВЕРСТИЙ ==========
+    
+    def hole_filters():
+        """Условия выборки отверстий из параметров запроса"""
+        criteria = []
+        if request.args.get('note'):
+            criteria.append(Hole.note == request.args['note'])
+        if request.args.get('flute_id'):
+            criteria.append(Hole.flute_id == int(request.args['flute_id']))
+        if request.args.get('min_diameter'):
+            criteria.append(Hole.diameter >= float(request.args['min_diameter']))
+        if request.args.get('max_diameter'):
+            criteria.append(Hole.diameter <= float(request.args['max_diameter']))
+        if request.args.get('calibrated'):
+            criteria.append(Hole.is_calibrated == (request.args['calibrated'].lower() in ('1', 'true', 'yes')))
+        return criteria
+    
+    @app.route('/api/holes')
+    def get_holes():
+        """Отверстия всех флейт: ?note=E4&min_diameter=9&max_diameter=&flute_id=&calibrated="""
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'count': 0, 'holes': []})
             
-            if 'name' in data:
-                flute.name = data['name']
-            if 'is_verified' in data:
-                flute.is_verified = data['is_verified']
-            if 'holes_data' in data:
-                flute.holes_data = data['holes_data']
+            try:
+                criteria = hole_filters()
+                limit = min(int(request.args.get('limit', 1000)), 10000)
+            except ValueError as e:
+                return jsonify({'error': f'Некорректный параметр: {e}'}), 400
             
-            db.session.commit()
-            return jsonify({'success': True, 'message': 'Дудикс обновлен', 'flute': flute.to_dict()})
+            holes = serialize_holes(*criteria, order_by=(Hole.note, Hole.diameter), limit=limit)
+            return json_response({'count': len(holes), 'holes': holes})
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/holes/stats')
+    def get_hole_stats():
+        """Сводка по нотам: число отверстий, средние позиция и диаметр (те же фильтры)"""
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'notes': []})
+            
+            try:
+                criteria = hole_filters()
+            except ValueError as e:
+                return jsonify({'error': f'Некорректный параметр: {e}'}), 400
+            
+            stmt = db.select(
+                Hole.note,
+                db.func.count(Hole.id),
+                db.func.count(db.distinct(Hole.flute_id)),
+                db.func.avg(Hole.position),
+                db.func.avg(Hole.diameter),
+                db.func.min(Hole.diameter),
+                db.func.max(Hole.diameter)
+            ).where(*criteria).group_by(Hole.note).order_by(Hole.note)
+            
+            notes = [
+                {
+                    'note': note,
+                    'count': count,
+                    'flutes': flutes,
+                    'avg_position': round(avg_position, 2) if avg_position is not None else None,
+                    'avg_diameter': round(avg_diameter, 2) if avg_diameter is not None else None,
+                    'min_diameter': min_diameter,
+                    'max_diameter': max_diameter
+                }
+                for note, count, flutes, avg_position, avg_diameter, min_diameter, max_diameter
+                in db.session.execute(stmt)
+            ]
+            return json_response({'notes': notes})
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
@@ -209,10 +427,10 @@ def register_routes(app):
             if not MODELS_LOADED:
                 return jsonify({'count': 0, 'mouthpieces': []})
             
-            mouthpieces = Mouthpiece.query.order_by(Mouthpiece.name).all()
-            return jsonify({
+            mouthpieces = serialize_mouthpieces(order_by=Mouthpiece.name)
+            return json_response({
                 'count': len(mouthpieces),
-                'mouthpieces': [mp.to_dict() for mp in mouthpieces]
+                'mouthpieces': mouthpieces
             })
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -223,10 +441,10 @@ def register_routes(app):
             if not MODELS_LOADED:
                 return jsonify({'count': 0, 'tubes': []})
             
-            tubes = Tube.query.order_by(Tube.name).all()
-            return jsonify({
+            tubes = serialize_tubes(order_by=Tube.name)
+            return json_response({
                 'count': len(tubes),
-                'tubes': [t.to_dict() for t in tubes]
+                'tubes': tubes
             })
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -237,10 +455,10 @@ def register_routes(app):
             if not MODELS_LOADED:
                 return jsonify({'count': 0, 'bells': []})
             
-            bells = Bell.query.order_by(Bell.name).all()
-            return jsonify({
+            bells = serialize_bells(order_by=Bell.name)
+            return json_response({
                 'count': len(bells),
-                'bells': [b.to_dict() for b in bells]
+                'bells': bells
             })
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -293,9 +511,27 @@ def register_routes(app):
                 return jsonify({'error': 'Модели не загружены'}), 500
             
             mouthpiece = Mouthpiece.query.get_or_404(mp_id)
-            db.session.delete(mouthpiece)
-            db.session.commit()
-            return jsonify({'success': True, 'message': 'Мундштук удален'})
+            recomputed = flute_store.delete_component(mouthpiece)
+            return jsonify({'success': True, 'message': 'Мундштук удален', 'flutes_recomputed': recomputed})
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/mouthpieces/<int:mp_id>', methods=['PUT'])
+    def update_mouthpiece(mp_id):
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'error': 'Модели не загружены'}), 500
+            
+            mouthpiece = Mouthpiece.query.get_or_404(mp_id)
+            recomputed = flute_store.update_component(mouthpiece, request.get_json(silent=True))
+            return jsonify({
+                'success': True,
+                'message': 'Мундштук обновлен',
+                'mouthpiece': mouthpiece.to_dict(),
+                'flutes_recomputed': recomputed
+            })
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
@@ -347,9 +583,27 @@ def register_routes(app):
                 return jsonify({'error': 'Модели не загружены'}), 500
             
             tube = Tube.query.get_or_404(tube_id)
-            db.session.delete(tube)
-            db.session.commit()
-            return jsonify({'success': True, 'message': 'Трубка удалена'})
+            recomputed = flute_store.delete_component(tube)
+            return jsonify({'success': True, 'message': 'Трубка удалена', 'flutes_recomputed': recomputed})
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/tubes/<int:tube_id>', methods=['PUT'])
+    def update_tube(tube_id):
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'error': 'Модели не загружены'}), 500
+            
+            tube = Tube.query.get_or_404(tube_id)
+            recomputed = flute_store.update_component(tube, request.get_json(silent=True))
+            return jsonify({
+                'success': True,
+                'message': 'Трубка обновлена',
+                'tube': tube.to_dict(),
+                'flutes_recomputed': recomputed
+            })
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
@@ -398,9 +652,69 @@ def register_routes(app):
                 return jsonify({'error': 'Модели не загружены'}), 500
             
             bell = Bell.query.get_or_404(bell_id)
-            db.session.delete(bell)
-            db.session.commit()
-            return jsonify({'success': True, 'message': 'Раструб удален'})
+            recomputed = flute_store.delete_component(bell)
+            return jsonify({'success': True, 'message': 'Раструб удален', 'flutes_recomputed': recomputed})
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/bells/<int:bell_id>', methods=['PUT'])
+    def update_bell(bell_id):
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'error': 'Модели не загружены'}), 500
+            
+            bell = Bell.query.get_or_404(bell_id)
+            recomputed = flute_store.update_component(bell, request.get_json(silent=True))
+            return jsonify({
+                'success': True,
+                'message': 'Раструб обновлен',
+                'bell': bell.to_dict(),
+                'flutes_recomputed': recomputed
+            })
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/bells/<int:bell_id>/profile')
+    def get_bell_profile(bell_id):
+        """
+        Разобранный профиль раструба на равномерной сетке (?step=1.0 мм)
+
+        Бинарно (Accept: application/octet-stream | application/x-npy) - массив
+        узлов сетки формы (n, 2): x, d.
+        """
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'error': 'Модели не загружены'}), 500
+            
+            bell = db.session.execute(
+                db.select(Bell.id, Bell.version, Bell.profile, Bell.length).where(Bell.id == bell_id)
+            ).first()
+            if bell is None:
+                return jsonify({'error': 'Раструб не найден'}), 404
+            if not bell.profile:
+                return jsonify({'error': 'У раструба нет профиля'}), 404
+            
+            try:
+                step = float(request.args.get('step', DEFAULT_STEP))
+                profile = profile_cache.get(bell.id, bell.version, bell.profile, bell.length, step)
+                fmt = negotiate_array()
+                dtype = array_dtype('float64') if fmt else None
+            except ValueError as e:
+                return jsonify({'error': f'Профиль не разобран: {e}'}), 400
+            
+            if fmt:
+                return array_response(np.column_stack([profile.x, profile.d]), fmt, dtype)
+            return json_response({
+                'bell_id': bell.id,
+                'version': bell.version,
+                'step': step,
+                'summary': describe_profile(profile),
+                'points': profile.points.tolist(),
+                'x': profile.x.tolist(),
+                'd': profile.d.tolist()
+            })
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
@@ -448,16 +762,201 @@ def register_routes(app):
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
+    @app.route('/api/calibration/recordings', methods=['POST'])
+    def upload_recordings():
+        """
+        Калибровки из записей аппликатур (multipart/form-data)
+
+        recordings - один или несколько WAV-файлов; position, note, diameter -
+        по значению на файл в том же порядке (или одно на все); нота по
+        умолчанию - ближайшая к найденной частоте. Общие поля как у
+        /api/calibration, а также min_frequency, max_frequency, dry_run.
+        Файлы читаются кусками, без загрузки в память целиком.
+        """
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'error': 'Модели не загружены'}), 500
+            
+            files = [f for f in request.files.getlist('recordings') if f.filename]
+            if not files:
+                return jsonify({'error': 'Нет файлов recordings'}), 400
+            form = request.form
+            dry_run = form.get('dry_run', '').lower() in ('1', 'true', 'yes')
+            
+            def per_file(name, convert=str):
+                values = form.getlist(name)
+                if not values:
+                    return [None] * len(files)
+                if len(values) == 1:
+                    values = values * len(files)
+                if len(values) != len(files):
+                    raise ValueError(f'{name}: нужно одно значение или по одному на файл')
+                return [convert(v) if v != '' else None for v in values]
+            
+            def number(name, default=None):
+                return float(form[name]) if form.get(name) not in (None, '') else default
+            
+            try:
+                positions = per_file('position', float)
+                notes = per_file('note')
+                diameters = per_file('diameter', float)
+                min_frequency = number('min_frequency', MIN_FREQUENCY)
+                max_frequency = number('max_frequency', MAX_FREQUENCY)
+                shared = {
+                    'tube_diameter': number('tube_diameter'),
+                    'tube_length': number('tube_length'),
+                    'tube_material': form.get('tube_material'),
+                    'mouthpiece_delta_m': number('mouthpiece_delta_m'),
+                    'mouthpiece_type': form.get('mouthpiece_type'),
+                    'bell_delta_L': number('bell_delta_L'),
+                    'temperature': number('temperature', 20.0),
+                    'humidity': number('humidity'),
+                    'pressure': number('pressure'),
+                    'source': form.get('source', 'recording'),
+                }
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            if not dry_run and None in positions:
+                return jsonify({'error': 'Отсутствует позиция (position) для записи'}), 400
+            
+            results, errors, calibrations = [], [], []
+            for i, storage in enumerate(files):
+                try:
+                    with measure('calculator'):
+                        analysis = analyze_recording(storage.stream, min_frequency, max_frequency)
+                except ValueError as e:
+                    errors.append({'file': storage.filename, 'error': str(e)})
+                    continue
+                
+                result = {'file': storage.filename, 'analysis': analysis}
+                if not dry_run:
+                    calibration = CalibrationData(
+                        note=notes[i] or analysis['note'],
+                        frequency=analysis['frequency'],
+                        position=positions[i],
+                        diameter=diameters[i] if diameters[i] is not None else 8.0,
+                        confidence=analysis['confidence'],
+                        notes=f"Запись {storage.filename}: {analysis['voiced_frames']} из {analysis['frames']} окон со звуком",
+                        **shared
+                    )
+                    calibrations.append((result, calibration))
+                results.append(result)
+            
+            if calibrations:
+                db.session.add_all([c for _, c in calibrations])
+                db.session.commit()
+                for result, calibration in calibrations:
+                    result['calibration'] = calibration.to_dict()
+            
+            status = 201 if calibrations else (200 if results else 400)
+            return jsonify({
+                'success': bool(results),
+                'dry_run': dry_run,
+                'created': len(calibrations),
+                'recordings': results,
+                'errors': errors
+            }), status
+            
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/calibration/recalibrate', methods=['POST'])
+    def recalibrate_components():
+        """Подобрать v_eff, delta_m, delta_L по измерениям всех компонентов"""
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'error': 'Модели не загружены'}), 500
+            
+            data = request.get_json(silent=True) or {}
+            report = recalibrate(
+                dry_run=bool(data.get('dry_run', False)),
+                overwrite=bool(data.get('overwrite', False))
+            )
+            
+            return jsonify({'success': True, 'dry_run': bool(data.get('dry_run', False)), **report})
+            
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    def calibration_index():
+        """
+        Индекс похожести калибровок в памяти
+
+        Перестраивается, когда меняется подпись таблицы: число строк,
+        наибольший id и сумма версий строк (CalibrationData.version растет
+        при каждом изменении). Так видны и вставки из других процессов, и
+        удаления, и правки на месте.
+        """
+        signature = tuple(db.session.execute(db.select(
+            db.func.count(CalibrationData.id),
+            db.func.max(CalibrationData.id),
+            db.func.sum(CalibrationData.version)
+        )).one())
+        if similarity_state['signature'] != signature:
+            rows = fetch_dicts(CalibrationData, ('id', 'note', 'position', 'frequency', 'humidity', 'pressure')
+                               + FEATURE_NAMES)
+            similarity_state['index'] = CalibrationIndex(rows)
+            similarity_state['signature'] = signature
+        return similarity_state['index']
+    
+    def similarity_query(source, tube_diameter, tube_length):
+        """Признаки запроса: трубка + необязательные параметры мундштука, раструба и отверстия"""
+        return {
+            'tube_diameter': tube_diameter,
+            'tube_length': tube_length,
+            'mouthpiece_delta_m': source.get('mouthpiece_delta_m'),
+            'mouthpiece_type': source.get('mouthpiece_type'),
+            'bell_delta_L': source.get('bell_delta_L'),
+            'diameter': source.get('hole_diameter'),
+            'temperature': source.get('temperature'),
+        }
+    
+    def similarity_weights(source):
+        """Веса признаков: SIMILARITY_WEIGHTS из конфига, поверх - weights запроса"""
+        weights = dict(app.config.get('SIMILARITY_WEIGHTS') or {})
+        weights.update(parse_weights(source.get('weights')))
+        return weights
+    
+    def similar_calibrations(note, query, conditions, weights=None, limit=None, min_similarity=None):
+        """
+        Похожие калибровки ноты по убыванию похожести - общий поиск для всех маршрутов
+
+        Позиции и частоты приведены к условиям запроса; измеренные значения -
+        в measured_position и measured_frequency.
+        """
+        index = calibration_index()
+        if min_similarity is None:
+            min_similarity = app.config['SIMILARITY_MIN']
+        found = index.nearest(query, note, limit, min_similarity, weights,
+                              app.config.get('SIMILARITY_MAX_DIFFERENCE'))
+        if not found:
+            return []
+        
+        rows = [row for row, _ in found]
+        positions, frequencies = index.normalized(rows, conditions)
+        calibrations = fetch_by_ids(CalibrationData, CALIBRATION_FIELDS, [int(index.ids[row]) for row in rows])
+        similar = []
+        for (row, similarity), position, frequency in zip(found, positions, frequencies):
+            cal = dict(calibrations[int(index.ids[row])])
+            cal['measured_position'] = cal['position']
+            cal['measured_frequency'] = cal['frequency']
+            cal['position'] = round(float(position), 1) if not np.isnan(position) else None
+            cal['frequency'] = round(float(frequency), 2) if not np.isnan(frequency) else None
+            cal['similarity'] = round(similarity, 3)
+            similar.append(cal)
+        return similar
+    
     @app.route('/api/calibration/<note>')
     def get_calibrations(note):
         try:
             if not MODELS_LOADED:
                 return jsonify({'calibrations': [], 'count': 0})
             
-            calibrations = CalibrationData.query.filter_by(note=note).all()
-            return jsonify({
+            calibrations = serialize_calibrations(CalibrationData.note == note)
+            return json_response({
                 'note': note,
-                'calibrations': [c.to_dict() for c in calibrations],
+                'calibrations': calibrations,
                 'count': len(calibrations)
             })
         except Exception as e:
@@ -465,38 +964,37 @@ def register_routes(app):
     
     @app.route('/api/calibration/similar')
     def get_similar_calibrations():
+        """
+        Калибровки ноты, похожие на конструкцию
+
+        ?note=, ?diameter= и ?length= трубки, необязательно mouthpiece_delta_m,
+        mouthpiece_type, bell_delta_L, hole_diameter, temperature; ?weights=
+        'признак:вес,...', ?tolerance= (похожесть не ниже 1 - tolerance), ?limit=.
+        """
         try:
             if not MODELS_LOADED:
                 return jsonify({'calibrations': [], 'count': 0})
             
-            tube_diameter = float(request.args.get('diameter', 20.0))
-            tube_length = float(request.args.get('length', 450.0))
-            note = request.args.get('note', '')
-            tolerance = float(request.args.get('tolerance', 0.1))  # 10%
-            
-            # Получаем все калибровки для данной ноты
-            calibrations = CalibrationData.query.filter_by(note=note).all()
-            
-            # Фильтруем по схожести параметров
-            similar = []
-            for cal in calibrations:
-                if cal.tube_diameter and cal.tube_length:
-                    diameter_diff = abs(cal.tube_diameter - tube_diameter) / tube_diameter
-                    length_diff = abs(cal.tube_length - tube_length) / tube_length
-                    
-                    if diameter_diff <= tolerance and length_diff <= tolerance:
-                        similarity = 1.0 - max(diameter_diff, length_diff) / tolerance
-                        cal_dict = cal.to_dict()
-                        cal_dict['similarity'] = round(similarity, 2)
-                        similar.append(cal_dict)
-            
-            # Сортируем по схожести
-            similar.sort(key=lambda x: x['similarity'], reverse=True)
+            try:
+                tube_diameter = float(request.args.get('diameter', 20.0))
+                tube_length = float(request.args.get('length', 450.0))
+                note = request.args.get('note', '')
+                tolerance = request.args.get('tolerance')
+                limit = request.args.get('limit', type=int)
+                conditions = atmosphere_conditions(request.args)
+                similar = similar_calibrations(
+                    note, similarity_query(request.args, tube_diameter, tube_length), conditions,
+                    similarity_weights(request.args), limit,
+                    1.0 - float(tolerance) if tolerance is not None else None
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
-            return jsonify({
+            return json_response({
                 'note': note,
                 'tube_diameter': tube_diameter,
                 'tube_length': tube_length,
+                'conditions': conditions,
                 'calibrations': similar,
                 'count': len(similar)
             })
@@ -506,53 +1004,170 @@ def register_routes(app):
     
     # ========== РАСЧЕТ ОТВЕРСТИЙ (СТАРЫЙ) ==========
     
+    @app.route('/api/scales')
+    def get_scales():
+        """Доступные тональности и лады"""
+        return jsonify({
+            'keys': list(NOTE_NAMES),
+            'scales': {name: list(intervals) for name, intervals in SCALES.items()},
+            'max_holes': MAX_HOLES
+        })
+    
+    @app.route('/api/scales/<key>/<scale>')
+    def get_scale(key, scale):
+        """Ноты и частоты строя: ?hole_count=6"""
+        try:
+            entry = scale_entry(key, scale, int(request.args.get('hole_count', 6)))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({
+            'key': normalize_key(key),
+            'scale': scale,
+            'notes': list(entry.notes),
+            'frequencies': list(entry.frequencies)
+        })
+    
     @app.route('/api/calculate', methods=['POST'])
     def calculate_holes():
+        """
+        Позиции отверстий стандартной конструкции
+
+        Тело: key, scale (major), hole_count, tube_length, tube_id, mouthpiece_id,
+        temperature, humidity, pressure, tube_diameter, tube_material,
+        mouthpiece_end_correction. Для трубки каталога стандартной длины в
+        опорных условиях и без переопределения параметров компонентов ответ -
+        готовый расчет из standard_designs (одна выборка по индексу), иначе -
+        расчет калькулятором.
+        """
         try:
-            data = request.json
-            tube_length = float(data.get('tube_length', 450.0))
+            data = request.json or {}
             key = data.get('key', 'D')
-            hole_count = int(data.get('hole_count', 6))
-            
-            base_ratios = {
-                'C': [0.65, 0.58, 0.51, 0.44, 0.37, 0.30],
-                'D': [0.60, 0.54, 0.48, 0.42, 0.36, 0.30],
-                'E': [0.56, 0.50, 0.44, 0.38, 0.32, 0.26],
-                'F': [0.53, 0.47, 0.41, 0.35, 0.29, 0.23],
-                'G': [0.50, 0.44, 0.38, 0.32, 0.26, 0.20],
-                'A': [0.47, 0.41, 0.35, 0.29, 0.23, 0.17],
-                'B': [0.44, 0.38, 0.32, 0.26, 0.20, 0.14]
+            scale = data.get('scale', 'major')
+            tube_id = data.get('tube_id')
+            mouthpiece_id = data.get('mouthpiece_id')
+            tube_material = data.get('tube_material')
+            
+            def optional_float(name):
+                return float(data[name]) if data.get(name) is not None else None
+            
+            try:
+                hole_count = int(data.get('hole_count', 6))
+                tube_length = optional_float('tube_length')
+                tube_diameter = optional_float('tube_diameter')
+                end_correction = optional_float('mouthpiece_end_correction')
+                key = normalize_key(key)
+                notes = scale_notes(key, scale, hole_count)
+                conditions = atmosphere_conditions(data)
+            except (ValueError, TypeError) as e:
+                return jsonify({'error': str(e)}), 400
+            
+            if not CALCULATOR_LOADED:
+                return calculate_holes_legacy(tube_length or 450.0, key, hole_count)
+            
+            # Каталог посчитан для опорных условий и параметров самих компонентов
+            overridden = tube_diameter is not None or tube_material or end_correction is not None
+            if MODELS_LOADED and tube_id is not None and not overridden \
+                    and all(v is None for v in conditions.values()):
+                design = db.session.execute(
+                    db.select(StandardDesign.tube_length, StandardDesign.holes).where(
+                        StandardDesign.tube_id == tube_id,
+                        StandardDesign.mouthpiece_id.is_(None) if mouthpiece_id is None
+                        else StandardDesign.mouthpiece_id == mouthpiece_id,
+                        StandardDesign.key == key,
+                        StandardDesign.scale == scale,
+                        StandardDesign.hole_count == hole_count
+                    )
+                ).first()
+                if design is not None and (tube_length is None or abs(tube_length - design.tube_length) < 0.05):
+                    return jsonify({'success': True, 'source': 'catalog', 'holes': numbered_holes(json.loads(design.holes))})
+            
+            # Нестандартная конструкция - живой расчет
+            if MODELS_LOADED and tube_id is not None:
+                tube = db.session.get(Tube, tube_id)
+                if tube is None:
+                    return jsonify({'error': 'Трубка не найдена'}), 404
+                tube_length = tube_length if tube_length is not None else tube.length
+                tube_diameter = tube_diameter if tube_diameter is not None else tube.d_in
+                tube_material = tube_material or tube.material
+            if MODELS_LOADED and mouthpiece_id is not None and end_correction is None:
+                mouthpiece = db.session.get(Mouthpiece, mouthpiece_id)
+                if mouthpiece is None:
+                    return jsonify({'error': 'Мундштук не найден'}), 404
+                end_correction = mouthpiece.delta_m
+            
+            with measure('calculator'):
+                results = calculate_positions_api(
+                    notes=notes,
+                    tube_length=float(tube_length or 450.0),
+                    tube_diameter=float(tube_diameter or 20.0),
+                    tube_material=tube_material or 'pvc',
+                    mouthpiece_end_correction=float(end_correction) if end_correction is not None else 15.0,
+                    temperature=conditions['temperature'] if conditions['temperature'] is not None else 20.0,
+                    humidity=conditions['humidity'],
+                    pressure=conditions['pressure']
+                )
+            holes = [
+                {'note': note, 'position': results[note]['position'], 'diameter': results[note].get('diameter', 8.0),
+                 'source': results[note]['source']}
+                for note in notes if note in results
+            ]
+            return jsonify({'success': True, 'source': 'calculator', 'holes': numbered_holes(holes)})
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    def numbered_holes(holes):
+        """Отверстия в формате ответа /api/calculate"""
+        return [
+            {
+                'id': i + 1,
+                'note': hole['note'],
+                'position': hole['position'],
+                'diameter': hole.get('diameter', 8.0),
+                'angle': (i * 60) % 360,
+                'is_calibrated': hole.get('source') == 'calibrated'
+            }
+            for i, hole in enumerate(holes)
+        ]
+    
+    def calculate_holes_legacy(tube_length, key, hole_count):
+        """Таблица коэффициентов (без калькулятора)"""
+        base_ratios = {
+            'C': [0.65, 0.58, 0.51, 0.44, 0.37, 0.30],
+            'D': [0.60, 0.54, 0.48, 0.42, 0.36, 0.30],
+            'E': [0.56, 0.50, 0.44, 0.38, 0.32, 0.26],
+            'F': [0.53, 0.47, 0.41, 0.35, 0.29, 0.23],
+            'G': [0.50, 0.44, 0.38, 0.32, 0.26, 0.20],
+            'A': [0.47, 0.41, 0.35, 0.29, 0.23, 0.17],
+            'B': [0.44, 0.38, 0.32, 0.26, 0.20, 0.14]
+        }
+        
+        ratios = base_ratios.get(key, base_ratios['D'])
+        
+        holes = []
+        for i in range(min(hole_count, 6)):
+            position = tube_length * ratios[i]
+            notes = {
+                'C': ['C4', 'D4', 'E4', 'F4', 'G4', 'A4'],
+                'D': ['D4', 'E4', 'F#4', 'G4', 'A4', 'B4'],
+                'E': ['E4', 'F#4', 'G#4', 'A4', 'B4', 'C#5'],
+                'F': ['F4', 'G4', 'A4', 'A#4', 'C5', 'D5'],
+                'G': ['G4', 'A4', 'B4', 'C5', 'D5', 'E5'],
+                'A': ['A4', 'B4', 'C#5', 'D5', 'E5', 'F#5'],
+                'B': ['B4', 'C#5', 'D#5', 'E5', 'F#5', 'G#5']
             }
             
-            ratios = base_ratios.get(key, base_ratios['D'])
-            
-            holes = []
-            for i in range(min(hole_count, 6)):
-                position = tube_length * ratios[i]
-                notes = {
-                    'C': ['C4', 'D4', 'E4', 'F4', 'G4', 'A4'],
-                    'D': ['D4', 'E4', 'F#4', 'G4', 'A4', 'B4'],
-                    'E': ['E4', 'F#4', 'G#4', 'A4', 'B4', 'C#5'],
-                    'F': ['F4', 'G4', 'A4', 'A#4', 'C5', 'D5'],
-                    'G': ['G4', 'A4', 'B4', 'C5', 'D5', 'E5'],
-                    'A': ['A4', 'B4', 'C#5', 'D5', 'E5', 'F#5'],
-                    'B': ['B4', 'C#5', 'D#5', 'E5', 'F#5', 'G#5']
-                }
-                
-                note = notes.get(key, notes['D'])[i] if i < len(notes.get(key, [])) else f'Note{i+1}'
-                
-                holes.append({
-                    'id': i + 1,
-                    'note': note,
-                    'position': round(position, 1),
-                    'diameter': 8.0,
-                    'angle': (i * 60) % 360,
-                    'is_calibrated': False
-                })
+            note = notes.get(key, notes['D'])[i] if i < len(notes.get(key, [])) else f'Note{i+1}'
             
-            return jsonify({'success': True, 'holes': holes})
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
+            holes.append({
+                'id': i + 1,
+                'note': note,
+                'position': round(position, 1),
+                'diameter': 8.0,
+                'angle': (i * 60) % 360,
+                'is_calibrated': False
+            })
+        
+        return jsonify({'success': True, 'source': 'ratios', 'holes': holes})
     
     # ========== НОВЫЕ МАРШРУТЫ ДЛЯ КАЛЬКУЛЯТОРА ==========
     
@@ -562,6 +1177,13 @@ def register_routes(app):
         try:
             data = request.json
             
+            # Вместо списка нот можно передать key + scale (+ hole_count)
+            if 'notes' not in data and 'key' in data:
+                try:
+                    data['notes'] = list(scale_entry(
+                        data['key'], data.get('scale', 'major'), int(data.get('hole_count', 6))).notes)
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
             if 'notes' not in data:
                 return jsonify({'error': 'Отсутствует список нот'}), 400
             if 'tube_length' not in data:
@@ -573,6 +1195,7 @@ def register_routes(app):
             tube_length = float(data['tube_length'])
             tube_diameter = float(data['tube_diameter'])
             tube_material = data.get('tube_material', 'pvc')
+            conditions = atmosphere_conditions(data)
             
             # Получаем параметры компонентов если они указаны
             mouthpiece_delta_m = data.get('mouthpiece_delta_m')
@@ -582,13 +1205,17 @@ def register_routes(app):
             if CALCULATOR_LOADED:
                 try:
                     # Используем калькулятор
-                    results = calculate_positions_api(
-                        notes=notes,
-                        tube_length=tube_length,
-                        tube_diameter=tube_diameter,
-                        tube_material=tube_material,
-                        mouthpiece_end_correction=float(data.get('mouthpiece_end_correction', 15.0))
-                    )
+                    with measure('calculator'):
+                        results = calculate_positions_api(
+                            notes=notes,
+                            tube_length=tube_length,
+                            tube_diameter=tube_diameter,
+                            tube_material=tube_material,
+                            mouthpiece_end_correction=float(data.get('mouthpiece_end_correction', 15.0)),
+                            temperature=conditions['temperature'] if conditions['temperature'] is not None else 20.0,
+                            humidity=conditions['humidity'],
+                            pressure=conditions['pressure']
+                        )
                     
                     holes = []
                     for note, calculation in results.items():
@@ -615,17 +1242,19 @@ def register_routes(app):
                 except Exception as calc_error:
                     print(f"Ошибка в калькуляторе: {calc_error}")
                     # Если калькулятор не работает, используем простой метод
-                    return calculate_advanced_simple(notes, tube_length, tube_diameter, tube_material)
+                    return calculate_advanced_simple(notes, tube_length, tube_diameter, data, conditions)
             else:
                 # Используем простой расчет
-                return calculate_advanced_simple(notes, tube_length, tube_diameter, tube_material)
+                return calculate_advanced_simple(notes, tube_length, tube_diameter, data, conditions)
                 
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
-    def calculate_advanced_simple(notes, tube_length, tube_diameter, tube_material):
+    def calculate_advanced_simple(notes, tube_length, tube_diameter, data, conditions):
         """Простой расчет позиций без калькулятора"""
         try:
+            query = similarity_query(data, tube_diameter, tube_length)
+            weights = similarity_weights(data)
             holes = []
             for i, note in enumerate(notes[:12]):
                 base_ratios = {
@@ -651,14 +1280,13 @@ def register_routes(app):
                 source = 'calculated'
                 
                 if MODELS_LOADED:
-                    # Ищем в калибровочных данных
-                    similar_calibrations = CalibrationData.query.filter_by(note=note).all()
-                    for cal in similar_calibrations:
-                        if cal.tube_diameter and abs(cal.tube_diameter - tube_diameter) < 2.0:
-                            position = cal.position
-                            is_verified = True
-                            source = 'calibrated'
-                            break
+                    # Самая похожая калибровка ноты
+                    best = similar_calibrations(note, query, conditions, weights, limit=1,
+                                                min_similarity=app.config['SIMILARITY_MATCH'])
+                    if best and best[0]['position'] is not None:
+                        position = best[0]['position']
+                        is_verified = True
+                        source = 'calibrated'
                 
                 holes.append({
                     'note': note,
@@ -694,6 +1322,7 @@ def register_routes(app):
             note = data['note']
             tube_length = float(data['tube_length'])
             tube_diameter = float(data['tube_diameter'])
+            conditions = atmosphere_conditions(data)
             
             base_ratios = {
                 'C': 0.65, 'C#': 0.62, 'D': 0.60, 'D#': 0.57,
@@ -714,34 +1343,25 @@ def register_routes(app):
             position = tube_length * base_ratio
             
             # Ищем похожие калибровки
-            similar_calibrations = []
+            similar = []
             if MODELS_LOADED:
-                calibrations = CalibrationData.query.filter_by(note=note).all()
-                for cal in calibrations:
-                    if cal.tube_diameter and cal.tube_length:
-                        diameter_diff = abs(cal.tube_diameter - tube_diameter) / tube_diameter
-                        length_diff = abs(cal.tube_length - tube_length) / tube_length
-                        similarity = 1.0 - max(diameter_diff, length_diff)
-                        
-                        similar_calibrations.append({
-                            'position': cal.position,
-                            'tube_diameter': cal.tube_diameter,
-                            'tube_length': cal.tube_length,
-                            'similarity': round(similarity, 2),
-                            'source': cal.source
-                        })
+                try:
+                    similar = similar_calibrations(
+                        note, similarity_query(data, tube_diameter, tube_length), conditions,
+                        similarity_weights(data), app.config['SIMILARITY_LIMIT'])
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
             
             # Определяем источник
             is_verified = False
             source = 'calculated'
-            if similar_calibrations:
-                best_match = max(similar_calibrations, key=lambda x: x['similarity'])
-                if best_match['similarity'] > 0.8:
-                    position = best_match['position']
-                    is_verified = True
-                    source = 'calibrated'
+            if similar and similar[0]['similarity'] >= app.config['SIMILARITY_MATCH'] \
+                    and similar[0]['position'] is not None:
+                position = similar[0]['position']
+                is_verified = True
+                source = 'calibrated'
             
-            return jsonify({
+            return json_response({
                 'success': True,
                 'calculation': {
                     'note': note,
@@ -750,7 +1370,7 @@ def register_routes(app):
                     'is_verified': is_verified,
                     'confidence': 1.0 if is_verified else 0.7
                 },
-                'similar_calibrations': similar_calibrations
+                'similar_calibrations': similar
             })
             
         except Exception as e:
@@ -758,41 +1378,116 @@ def register_routes(app):
     
     @app.route('/api/similar/<note>')
     def get_similar(note):
-        """Поиск похожих калибровок"""
+        """Поиск похожих калибровок (параметры - как у /api/calibration/similar)"""
         try:
             if not MODELS_LOADED:
                 return jsonify({'note': note, 'similar_calibrations': [], 'count': 0})
             
-            tube_diameter = float(request.args.get('diameter', 20.0))
-            tube_length = float(request.args.get('length', 450.0))
-            
-            similar_calibrations = []
-            calibrations = CalibrationData.query.filter_by(note=note).all()
-            
-            for cal in calibrations:
-                if cal.tube_diameter and cal.tube_length:
-                    diameter_diff = abs(cal.tube_diameter - tube_diameter) / tube_diameter
-                    length_diff = abs(cal.tube_length - tube_length) / tube_length
-                    similarity = 1.0 - max(diameter_diff, length_diff)
-                    
-                    if similarity > 0.7:
-                        similar_calibrations.append({
-                            'position': cal.position,
-                            'tube_diameter': cal.tube_diameter,
-                            'tube_length': cal.tube_length,
-                            'similarity': round(similarity, 2),
-                            'source': cal.source
-                        })
-            
-            return jsonify({
+            try:
+                tube_diameter = float(request.args.get('diameter', 20.0))
+                tube_length = float(request.args.get('length', 450.0))
+                conditions = atmosphere_conditions(request.args)
+                similar = similar_calibrations(
+                    note, similarity_query(request.args, tube_diameter, tube_length), conditions,
+                    similarity_weights(request.args), request.args.get('limit', type=int))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            return json_response({
                 'note': note,
-                'similar_calibrations': similar_calibrations,
-                'count': len(similar_calibrations)
+                'similar_calibrations': similar,
+                'count': len(similar)
             })
             
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
+    # ========== ЖИВОЙ ПЕРЕСЧЕТ (SSE) ==========
+    
+    @app.route('/api/live/sessions', methods=['POST'])
+    def create_live_session():
+        """
+        Открыть сессию редактора
+
+        Тело: tube_length, tube_diameter, tube_material, mouthpiece_end_correction,
+        temperature, holes: [{note, position, diameter}]. Ответ - прогнозы всех отверстий.
+        """
+        try:
+            if not CALCULATOR_LOADED:
+                return jsonify({'error': 'Калькулятор не загружен'}), 500
+            
+            data = dict(request.json or {})
+            holes = data.pop('holes', [])
+            try:
+                session = live_sessions.create(get_calculator(), data, holes)
+            except (ValueError, TypeError, KeyError) as e:
+                return jsonify({'error': str(e)}), 400
+            return json_response(session.snapshot(), 201)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/live/sessions/<session_id>', methods=['GET', 'DELETE'])
+    def live_session(session_id):
+        if request.method == 'DELETE':
+            if not live_sessions.remove(session_id):
+                return jsonify({'error': 'Сессия не найдена'}), 404
+            return jsonify({'success': True})
+        
+        session = live_sessions.get(session_id)
+        if session is None:
+            return jsonify({'error': 'Сессия не найдена'}), 404
+        return json_response(session.snapshot())
+    
+    @app.route('/api/live/sessions/<session_id>/delta', methods=['POST'])
+    def apply_live_delta(session_id):
+        """Изменение от редактора, например {"hole": 3, "position": 187.5}"""
+        try:
+            session = live_sessions.get(session_id)
+            if session is None:
+                return jsonify({'error': 'Сессия не найдена'}), 404
+            
+            try:
+                with measure('calculator'):
+                    event = session.apply(request.json or {})
+            except (ValueError, TypeError, KeyError) as e:
+                return jsonify({'error': str(e)}), 400
+            # Изменения уходят и в поток, и в ответ (для клиентов без SSE)
+            return json_response(event)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/live/sessions/<session_id>/stream')
+    def live_stream(session_id):
+        """Поток Server-Sent Events: snapshot, затем predictions с изменениями"""
+        session = live_sessions.get(session_id)
+        if session is None:
+            return jsonify({'error': 'Сессия не найдена'}), 404
+        
+        def events():
+            subscriber = session.subscribe()
+            try:
+                snapshot = session.snapshot()
+                yield f"event: snapshot\nid: {snapshot['version']}\ndata: {dumps(snapshot).decode()}\n\n"
+                while True:
+                    try:
+                        event = subscriber.get(timeout=15)
+                    except queue.Empty:
+                        # Открытый поток продлевает жизнь сессии
+                        session.touched = time.monotonic()
+                        yield ': keepalive\n\n'
+                        continue
+                    if event is None:
+                        yield 'event: closed\ndata: {}\n\n'
+                        break
+                    yield f"event: predictions\nid: {event['version']}\ndata: {dumps(event).decode()}\n\n"
+            finally:
+                session.unsubscribe(subscriber)
+        
+        return Response(events(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+    
     # ========== РАСЧЕТ АКУСТИЧЕСКИХ ПАРАМЕТРОВ ==========
     
     @app.route('/api/acoustic/effective-length', methods=['POST'])
@@ -804,13 +1499,15 @@ def register_routes(app):
             tube_length = float(data.get('tube_length', 450.0))
             mouthpiece_delta_m = float(data.get('mouthpiece_delta_m', 0.0))
             bell_delta_L = float(data.get('bell_delta_L', 0.0))
-            v_sound = float(data.get('v_sound', 34300.0))
+            # Без явной v_sound - опорная скорость с поправкой на условия
+            v_sound = float(data['v_sound']) if 'v_sound' in data else \
+                DEFAULT_SOUND_SPEED * speed_ratio(**atmosphere_conditions(data))
             
-            # Формула: L_eff_total = L_tube + 2*δ_m + ΔL_bell
-            total_effective_length = tube_length + 2 * mouthpiece_delta_m + bell_delta_L
-            
-            # Базовая частота: f_base = v / (2 * L_eff_total)
-            f_base = v_sound / (2 * total_effective_length)  # в Гц
+            # Те же формулы, что и для колонок flutes.total_effective_length / base_frequency
+            total_effective_length = effective_length(tube_length, mouthpiece_delta_m, bell_delta_L)
+            if total_effective_length <= 0:
+                return jsonify({'error': 'Эффективная длина должна быть положительной'}), 400
+            f_base = base_frequency(total_effective_length, v_sound)
             
             return jsonify({
                 'success': True,
@@ -823,12 +1520,474 @@ def register_routes(app):
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
+    def component_axis(model, ids, fields):
+        """
+        Компоненты одной оси сетки: (ids, строки)
+
+        ids не задан - весь каталог; None в списке - "без компонента".
+        """
+        if ids is None:
+            rows = fetch_dicts(model, fields, order_by=model.id)
+            return ([row['id'] for row in rows] or [None]), (rows or [None])
+        if not isinstance(ids, list) or not ids:
+            raise ValueError(f'Список id для {model.__tablename__} должен быть непустым')
+        found = fetch_by_ids(model, fields, ids)
+        missing = [i for i in ids if i is not None and i not in found]
+        if missing:
+            raise ValueError(f'Не найдены {model.__tablename__}: {missing}')
+        return ids, [found.get(i) for i in ids]
+    
+    @app.route('/api/acoustic/effective-length/batch', methods=['POST'])
+    def calculate_effective_length_batch():
+        """
+        Базовая частота для всех сочетаний мундштук x трубка x раструб
+
+        Тело: mouthpiece_ids, tube_ids, bell_ids (по умолчанию - весь каталог,
+        null - без компонента), tube_length (по умолчанию - длина трубки),
+        conditions: {temperature, humidity, pressure} - числа, списки или
+        {start, stop, step}; тогда добавляется ось условий [M][T][B][E].
+        Accept: application/octet-stream | application/x-npy (или ?format=raw|npy,
+        ?dtype=float32|float64) - матрица частот бинарно, порядок [M][T][B].
+        """
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'error': 'Модели не загружены'}), 500
+            
+            data = request.json or {}
+            try:
+                mp_ids, mouthpieces = component_axis(Mouthpiece, data.get('mouthpiece_ids'), ('id', 'delta_m'))
+                tube_ids, tubes = component_axis(Tube, data.get('tube_ids'), ('id', 'length', 'v_eff', 'v_air'))
+                bell_ids, bells = component_axis(Bell, data.get('bell_ids'), ('id', 'delta_L'))
+                tube_length = float(data['tube_length']) if data.get('tube_length') is not None else None
+                conditions = condition_grid(data['conditions']) if data.get('conditions') else None
+                fmt = negotiate_array()
+                dtype = array_dtype() if fmt else None
+            except (ValueError, TypeError) as e:
+                return jsonify({'error': str(e)}), 400
+            
+            condition_count = len(conditions['temperature']) if conditions else 1
+            if len(mp_ids) * len(tube_ids) * len(bell_ids) * condition_count > 1000000:
+                return jsonify({'error': 'Слишком большая сетка (более 1000000 сочетаний)'}), 400
+            
+            def value(row, *fields, default=0.0):
+                for field in fields:
+                    if row is not None and row.get(field) is not None:
+                        return row[field]
+                return default
+            
+            with measure('calculator'):
+                total, frequency = frequency_grid(
+                    [tube_length if tube_length is not None else value(t, 'length', default=450.0) for t in tubes],
+                    [value(t, 'v_eff', 'v_air', default=DEFAULT_SOUND_SPEED) for t in tubes],
+                    [value(m, 'delta_m') for m in mouthpieces],
+                    [value(b, 'delta_L') for b in bells]
+                )
+                if conditions:
+                    # v_eff трубок задана для опорных условий
+                    frequency = frequency[..., None] * speed_ratio(**conditions)
+            
+            if fmt:
+                headers = {
+                    'X-Mouthpiece-Ids': ','.join('' if i is None else str(i) for i in mp_ids),
+                    'X-Tube-Ids': ','.join('' if i is None else str(i) for i in tube_ids),
+                    'X-Bell-Ids': ','.join('' if i is None else str(i) for i in bell_ids)
+                }
+                if conditions:
+                    headers.update({
+                        f'X-{name.capitalize()}': ','.join(f'{v:g}' for v in values)
+                        for name, values in conditions.items()
+                    })
+                return array_response(frequency, fmt, dtype, headers=headers)
+            
+            return json_response({
+                'success': True,
+                'mouthpiece_ids': mp_ids,
+                'tube_ids': tube_ids,
+                'bell_ids': bell_ids,
+                'conditions': {name: values.tolist() for name, values in conditions.items()} if conditions else None,
+                'shape': list(frequency.shape),
+                'total_effective_length': total.round(2).tolist(),
+                'base_frequency': np.where(np.isnan(frequency), None, frequency.round(2)).tolist()
+            })
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    # ========== УХОД СТРОЯ С ТЕМПЕРАТУРОЙ ==========
+    
+    def thermal_options(source):
+        """Температуры из min_temperature, max_temperature, step (°C) и влажность/давление"""
+        temperatures = temperature_range(
+            float(source.get('min_temperature', DEFAULT_MIN_TEMPERATURE)),
+            float(source.get('max_temperature', DEFAULT_MAX_TEMPERATURE)),
+            float(source.get('step', 1.0))
+        )
+        conditions = atmosphere_conditions(source)
+        return temperatures, conditions['humidity'], conditions['pressure']
+    
+    def thermal_response(design, temperatures, humidity, pressure, fmt=None, dtype=None):
+        """
+        Кривые ухода строя: основной тон трубки и каждое отверстие
+
+        design: tube_length, alpha, delta_m, delta_L, reference_temperature,
+        base_frequency, holes [{id, note, position}].
+        """
+        holes = [h for h in design['holes'] if h.get('position') is not None]
+        # Строка 0 - вся трубка, далее отверстия: растущая часть длины и постоянные поправки
+        expanding = [design['tube_length']] + [h['position'] for h in holes]
+        fixed = [2 * design['delta_m'] + design['delta_L']] + [design['delta_m']] * len(holes)
+        
+        with measure('calculator'):
+            ratio = drift_ratio(temperatures, expanding, fixed, design['alpha'],
+                                design['reference_temperature'], humidity, pressure)
+            drift = cents(ratio)
+        
+        if fmt:
+            return array_response(drift, fmt, dtype, headers={
+                'X-Columns': ','.join(['base'] + [str(h.get('id') or '') for h in holes]),
+                'X-Temperatures': ','.join(f'{t:g}' for t in temperatures)
+            })
+        
+        def curve(column, frequency):
+            return {
+                'frequency': (frequency * ratio[:, column]).round(2).tolist() if frequency else None,
+                'cents': drift[:, column].round(1).tolist()
+            }
+        
+        return json_response({
+            'success': True,
+            'temperatures': temperatures.tolist(),
+            'reference_temperature': design['reference_temperature'],
+            'expansion_coefficient': design['alpha'],
+            'base': curve(0, design.get('base_frequency')),
+            'holes': [
+                {'id': h.get('id'), 'note': h.get('note'), 'position': h['position'],
+                 **curve(i + 1, note_frequency(h.get('note')))}
+                for i, h in enumerate(holes)
+            ],
+            'max_drift_cents': round(float(np.abs(drift).max()), 1)
+        })
+    
+    @app.route('/api/flutes/<int:flute_id>/thermal')
+    def get_flute_thermal(flute_id):
+        """
+        Уход строя флейты в диапазоне температур
+
+        ?min_temperature=5&max_temperature=35&step=1 (°C), ?humidity=, ?pressure=.
+        Отсчет - от Flute.temperature; α трубки - из Tube.thermal_coeff или по
+        материалу. Accept/?format=raw|npy - матрица центов [температура][base + отверстия].
+        """
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'error': 'Модели не загружены'}), 500
+            
+            try:
+                temperatures, humidity, pressure = thermal_options(request.args)
+                fmt = negotiate_array()
+                dtype = array_dtype() if fmt else None
+            except (ValueError, TypeError) as e:
+                return jsonify({'error': str(e)}), 400
+            
+            flute = db.session.get(Flute, flute_id)
+            if flute is None:
+                return jsonify({'error': 'Дудикс не найден'}), 404
+            
+            tube, mouthpiece, bell = flute.tube, flute.mouthpiece, flute.bell
+            tube_length = flute.tube_length or (tube.length if tube else None)
+            if not tube_length:
+                return jsonify({'error': 'У флейты не задана длина трубки'}), 400
+            
+            design = {
+                'tube_length': tube_length,
+                'alpha': expansion_coefficient(
+                    tube.thermal_coeff if tube else None, tube.length if tube else None,
+                    tube.material if tube else None),
+                'delta_m': mouthpiece.delta_m if mouthpiece and mouthpiece.delta_m is not None else 0.0,
+                'delta_L': bell.delta_L if bell and bell.delta_L is not None else 0.0,
+                'reference_temperature': flute.temperature if flute.temperature is not None else 20.0,
+                'base_frequency': flute.base_frequency,
+                'holes': fetch_dicts(Hole, ('id', 'note', 'position'), Hole.flute_id == flute_id,
+                                     order_by=Hole.position)
+            }
+            return thermal_response(design, temperatures, humidity, pressure, fmt, dtype)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/acoustic/thermal', methods=['POST'])
+    def calculate_thermal():
+        """
+        Уход строя для несохраненной конструкции
+
+        Тело: tube_length, holes [{note, position}], thermal_coeff или tube_material,
+        mouthpiece_delta_m, bell_delta_L, temperature (отсчетная, 20),
+        min_temperature, max_temperature, step, humidity, pressure.
+        """
+        try:
+            data = request.json or {}
+            try:
+                temperatures, humidity, pressure = thermal_options(data)
+                tube_length = float(data['tube_length'])
+                delta_m = float(data.get('mouthpiece_delta_m') or 0.0)
+                delta_L = float(data.get('bell_delta_L') or 0.0)
+                reference = float(data.get('temperature', 20.0))
+                thermal_coeff = float(data['thermal_coeff']) if data.get('thermal_coeff') is not None else None
+                holes = [
+                    {'id': i + 1, 'note': h.get('note'), 'position': float(h['position'])}
+                    for i, h in enumerate(data.get('holes', []))
+                ]
+                fmt = negotiate_array()
+                dtype = array_dtype() if fmt else None
+            except (ValueError, TypeError, KeyError) as e:
+                return jsonify({'error': f'Неверные параметры: {e}'}), 400
+            if tube_length <= 0:
+                return jsonify({'error': 'Длина трубки должна быть положительной'}), 400
+            
+            total = effective_length(tube_length, delta_m, delta_L)
+            design = {
+                'tube_length': tube_length,
+                'alpha': expansion_coefficient(thermal_coeff, tube_length, data.get('tube_material')),
+                'delta_m': delta_m,
+                'delta_L': delta_L,
+                'reference_temperature': reference,
+                'base_frequency': base_frequency(total) if total > 0 else None,
+                'holes': holes
+            }
+            return thermal_response(design, temperatures, humidity, pressure, fmt, dtype)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    # ========== ЗВУКОВОЕ ПРЕВЬЮ ==========
+    
+    def preview_frequencies(holes, tube_diameter, end_correction, temperature, humidity=None, pressure=None):
+        """
+        Частоты нот превью: по позициям отверстий через калькулятор,
+        иначе (нет калькулятора или позиции) - частота самой ноты
+        """
+        calculator = get_calculator() if CALCULATOR_LOADED else None
+        frequencies = []
+        for hole in holes:
+            frequency = None
+            if calculator is not None and hole.get('position'):
+                frequency = calculator.predict_frequency(
+                    hole['position'], tube_diameter, end_correction, temperature, humidity, pressure)
+            frequencies.append(frequency or note_frequency(hole.get('note')))
+        return frequencies
+    
+    def preview_response(holes, frequencies, timbre, note_seconds, download_name):
+        """WAV превью из кэша по хэшу частот и тембра (или синтез и запись в кэш)"""
+        frequencies = [round(f, 2) if f else None for f in frequencies]
+        key = content_hash({
+            'frequencies': frequencies,
+            'timbre': timbre,
+            'note_seconds': note_seconds,
+            'sample_rate': SAMPLE_RATE
+        })
+        path = preview_cache.get(key)
+        if path is None:
+            with measure('calculator'):
+                audio = wav_bytes(render_preview(frequencies, timbre, note_seconds))
+            path = preview_cache.put(key, audio)
+        
+        response = send_file(path, mimetype='audio/wav', download_name=download_name, etag=key)
+        response.headers['X-Preview-Notes'] = ','.join(h.get('note') or '' for h in holes)
+        response.headers['X-Preview-Frequencies'] = ','.join(f'{f:g}' if f else '' for f in frequencies)
+        return response
+    
+    @app.route('/api/flutes/<int:flute_id>/preview')
+    def get_flute_preview(flute_id):
+        """
+        WAV превью строя флейты: ноты отверстий от нижней к верхней
+
+        Частоты - предсказанные по позициям отверстий при Flute.temperature,
+        тембр - по типу мундштука. ?note_seconds= (0.6). Повторные запросы
+        отдаются из кэша, ETag - хэш частот.
+        """
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'error': 'Модели не загружены'}), 500
+            
+            try:
+                note_seconds = float(request.args.get('note_seconds', NOTE_SECONDS))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            flute = db.session.get(Flute, flute_id)
+            if flute is None:
+                return jsonify({'error': 'Дудикс не найден'}), 404
+            
+            holes = fetch_dicts(Hole, ('note', 'position'), Hole.flute_id == flute_id,
+                                order_by=Hole.position.desc())
+            if not holes:
+                return jsonify({'error': 'У флейты нет отверстий'}), 400
+            
+            tube, mouthpiece = flute.tube, flute.mouthpiece
+            frequencies = preview_frequencies(
+                holes,
+                tube.d_in if tube and tube.d_in else 20.0,
+                mouthpiece.delta_m if mouthpiece and mouthpiece.delta_m is not None else 15.0,
+                flute.temperature if flute.temperature is not None else 20.0
+            )
+            try:
+                return preview_response(holes, frequencies, timbre_for(mouthpiece.type if mouthpiece else None),
+                                        note_seconds, f'dudex_{flute_id}_preview.wav')
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/preview', methods=['POST'])
+    def calculate_preview():
+        """
+        WAV превью для несохраненной конструкции
+
+        Тело: holes [{note, position}] или notes [..], tube_diameter (20),
+        mouthpiece_end_correction (15), mouthpiece_type или timbre (open|reed),
+        temperature (20), humidity, pressure, note_seconds.
+        """
+        try:
+            data = request.json or {}
+            try:
+                if 'holes' in data:
+                    holes = [
+                        {'note': h.get('note'),
+                         'position': float(h['position']) if h.get('position') is not None else None}
+                        for h in data['holes']
+                    ]
+                else:
+                    holes = [{'note': note, 'position': None} for note in data.get('notes', [])]
+                conditions = atmosphere_conditions(data)
+                frequencies = preview_frequencies(
+                    holes,
+                    float(data.get('tube_diameter', 20.0)),
+                    float(data.get('mouthpiece_end_correction', 15.0)),
+                    conditions['temperature'] if conditions['temperature'] is not None else 20.0,
+                    conditions['humidity'],
+                    conditions['pressure']
+                )
+                timbre = data.get('timbre') or timbre_for(data.get('mouthpiece_type'))
+                return preview_response(holes, frequencies, timbre,
+                                        float(data.get('note_seconds', NOTE_SECONDS)), 'preview.wav')
+            except (ValueError, TypeError, KeyError) as e:
+                return jsonify({'error': f'Неверные параметры: {e}'}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    # ========== ФОНОВЫЕ ЗАДАЧИ ==========
+    
+    @app.route('/api/jobs', methods=['POST'])
+    def submit_job():
+        """Поставить длительный расчет в очередь"""
+        try:
+            if job_queue is None:
+                return jsonify({'error': 'Очередь задач недоступна'}), 500
+            
+            data = request.json or {}
+            kind = data.get('kind')
+            if kind not in JOB_KINDS:
+                return jsonify({'error': f'Неизвестный тип задачи: {kind}', 'kinds': sorted(JOB_KINDS)}), 400
+            params = data.get('params', {})
+            try:
+                validate_params(kind, params)
+            except (ValueError, TypeError) as e:
+                return jsonify({'error': str(e)}), 400
+            
+            job = Job(id=uuid.uuid4().hex, kind=kind, status='queued', progress=0.0,
+                      params=json.dumps(params, ensure_ascii=False))
+            db.session.add(job)
+            db.session.commit()
+            
+            job_queue.submit(job.id, kind, params)
+            return jsonify({'success': True, 'job': job.to_dict()}), 202
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/jobs')
+    def list_jobs():
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'count': 0, 'jobs': []})
+            
+            query = Job.query
+            if request.args.get('status'):
+                query = query.filter_by(status=request.args['status'])
+            limit = min(int(request.args.get('limit', 50)), 500)
+            jobs = query.order_by(Job.created_at.desc()).limit(limit).all()
+            return jsonify({'count': len(jobs), 'jobs': [j.to_dict() for j in jobs]})
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/jobs/<job_id>')
+    def get_job(job_id):
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'error': 'Модели не загружены'}), 500
+            
+            job = db.session.get(Job, job_id)
+            if job is None:
+                return jsonify({'error': 'Задача не найдена'}), 404
+            return jsonify(job.to_dict())
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/jobs/<job_id>/progress')
+    def get_job_progress(job_id):
+        """Легкий запрос для опроса прогресса"""
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'error': 'Модели не загружены'}), 500
+            
+            row = db.session.execute(
+                db.select(Job.status, Job.progress, Job.message).where(Job.id == job_id)
+            ).first()
+            if row is None:
+                return jsonify({'error': 'Задача не найдена'}), 404
+            return jsonify({'id': job_id, 'status': row.status, 'progress': row.progress, 'message': row.message})
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/jobs/<job_id>/result')
+    def get_job_result(job_id):
+        try:
+            if not MODELS_LOADED:
+                return jsonify({'error': 'Модели не загружены'}), 500
+            
+            job = db.session.get(Job, job_id)
+            if job is None:
+                return jsonify({'error': 'Задача не найдена'}), 404
+            if job.status == 'failed':
+                return jsonify({'error': job.error, 'status': job.status}), 409
+            if job.status != 'done':
+                return jsonify({'status': job.status, 'progress': job.progress}), 202
+            
+            # Числовой массив результата (например, сетка позиций sweep) - бинарно
+            try:
+                fmt = negotiate_array()
+                dtype = array_dtype('float64') if fmt else None
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            if fmt:
+                field = JOB_ARRAYS.get(job.kind)
+                result = json.loads(job.result)
+                if field is None or field not in result:
+                    return jsonify({'error': 'У результата задачи нет числового массива'}), 406
+                return array_response(
+                    np.array(result[field], dtype=np.float64), fmt, dtype,
+                    headers={'X-Array-Field': field}
+                )
+            
+            return stored_json_response(job.result)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    def stored_json_response(result_json):
+        """Результат задачи уже хранится как JSON - отдаем без перекодирования"""
+        return app.response_class(result_json, mimetype='application/json')
+    
     # ========== ШАБЛОНЫ ==========
     
     @app.route('/api/flutes/<int:flute_id>/template')
     def get_template(flute_id):
         try:
-            if not MODELS_LOADED:
+            if not MODELS_LOADED or not TEMPLATES_LOADED:
                 svg_content = '''<svg width="1000" height="300"><text x="50" y="50">Шаблон дудикса</text></svg>'''
                 return send_file(
                     BytesIO(svg_content.encode('utf-8')),
@@ -837,17 +1996,99 @@ def register_routes(app):
                     download_name=f'dudex_{flute_id}_template.svg'
                 )
             
-            flute = Flute.query.get_or_404(flute_id)
-            svg_content = f'''<svg width="1000" height="400">
-                <text x="50" y="50">Дудикс: {flute.name}</text>
-                <text x="50" y="80">Тональность: {flute.key}, Длина: {flute.tube_length}мм</text>
-            </svg>'''
+            geometries = load_template_geometries([flute_id])
+            if flute_id not in geometries:
+                return jsonify({'error': 'Дудикс не найден'}), 404
+            
+            if request.args.get('format') == 'pdf':
+                return tiled_pdf_response(
+                    [geometries[flute_id]],
+                    f'dudex_{flute_id}_template.pdf',
+                    request.args.get('paper'),
+                    request.args.get('orientation')
+                )
+            
+            geometry = geometries[flute_id]
+            key = geometry_hash(geometry)
+            download_name = f'dudex_{flute_id}_template.svg'
+            
+            # Повторные скачивания отдаются из кэша по хэшу геометрии
+            cached_path = template_cache.get(key)
+            if cached_path:
+                return send_file(
+                    cached_path,
+                    mimetype='image/svg+xml',
+                    as_attachment=True,
+                    download_name=download_name,
+                    etag=key
+                )
             
-            return send_file(
-                BytesIO(svg_content.encode('utf-8')),
+            response = Response(
+                stream_with_context(template_cache.tee(key, render_svg_chunks(geometry))),
                 mimetype='image/svg+xml',
-                as_attachment=True,
-                download_name=f'dudex_{flute_id}_template.svg'
+                headers={'Content-Disposition': f'attachment; filename={download_name}'}
+            )
+            response.set_etag(key)
+            return response
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    def load_template_geometries(flute_ids):
+        """Геометрия шаблонов для набора флейт: два запроса на весь набор"""
+        flutes = (Flute.query
+                  .options(db.joinedload(Flute.tube))
+                  .filter(Flute.id.in_(flute_ids))
+                  .all())
+        holes_by_flute = {}
+        for hole in Hole.query.filter(Hole.flute_id.in_(flute_ids)).order_by(Hole.position):
+            holes_by_flute.setdefault(hole.flute_id, []).append(hole)
+        return {f.id: flute_geometry(f, holes_by_flute.get(f.id, [])) for f in flutes}
+    
+    def tiled_pdf_response(geometries, download_name, paper, orientation):
+        """PDF с разбивкой на листы (из кэша, если геометрия не менялась)"""
+        paper = (paper or 'a4').lower()
+        orientation = (orientation or 'landscape').lower()
+        if paper not in PAPER_SIZES:
+            return jsonify({'error': f'Неизвестный формат бумаги: {paper}'}), 400
+        if orientation not in ('portrait', 'landscape'):
+            return jsonify({'error': f'Неизвестная ориентация: {orientation}'}), 400
+        
+        key = content_hash({
+            'geometries': [geometry_hash(g) for g in geometries],
+            'paper': paper,
+            'orientation': orientation
+        })
+        path = pdf_cache.get(key) or pdf_cache.put(key, render_tiled_pdf(geometries, paper, orientation))
+        return send_file(
+            path,
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=download_name,
+            etag=key
+        )
+    
+    @app.route('/api/templates/export', methods=['POST'])
+    def export_templates():
+        """Пакетный экспорт шаблонов нескольких флейт в один PDF"""
+        try:
+            if not MODELS_LOADED or not TEMPLATES_LOADED:
+                return jsonify({'error': 'Генератор шаблонов не загружен'}), 500
+            
+            data = request.json or {}
+            flute_ids = [int(i) for i in data.get('flute_ids', [])]
+            if not flute_ids:
+                return jsonify({'error': 'Не выбраны дудиксы'}), 400
+            
+            geometries = load_template_geometries(flute_ids)
+            missing = [i for i in flute_ids if i not in geometries]
+            if missing:
+                return jsonify({'error': f'Дудиксы не найдены: {missing}'}), 404
+            
+            return tiled_pdf_response(
+                [geometries[i] for i in flute_ids],
+                'dudex_templates.pdf',
+                data.get('paper'),
+                data.get('orientation')
             )
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -0,0 +1,319 @@
+"""
+Быстрая сериализация данных WITG в JSON
+
+Списки строятся из колоночных запросов (кортежи строк), без создания
+ORM-объектов, и кодируются через orjson, если он установлен. Числовые
+массивы по запросу отдаются бинарно (array_response).
+"""
+
+import io
+import json
+from flask import current_app, request
+
+try:
+    import orjson
+    ORJSON_LOADED = True
+except ImportError:
+    ORJSON_LOADED = False
+
+from database.models import db, Mouthpiece, Tube, Bell, Flute, Hole, CalibrationData
+
+
+# Поля в том же порядке и с теми же именами, что и в to_dict()
+MOUTHPIECE_FIELDS = (
+    'id', 'name', 'type', 'brand', 'model',
+    'd_tip', 'd_out', 'L_m', 'L_cyl', 'baffle', 'chamber_depth',
+    'delta_m', 'L_calib', 'd_calib', 'f_meas', 'temperature',
+    'material', 'embouchure', 'notes', 'created_at'
+)
+
+TUBE_FIELDS = (
+    'id', 'name', 'material',
+    'length', 'd_in', 'd_out', 'wall_thickness', 'taper', 'form', 'roughness',
+    'v_air', 'v_eff', 'damping',
+    'f_tube', 'L_total',
+    'density', 'thermal_coeff',
+    'created_at'
+)
+
+BELL_FIELDS = (
+    'id', 'name', 'type', 'material',
+    'start_diameter', 'end_diameter', 'length', 'wall_thickness',
+    'expansion_ratio', 'flare_angle',
+    'delta_L', 'acoustic_effect',
+    'profile',
+    'f_no_bell', 'f_with_bell', 'v_sound',
+    'created_at'
+)
+
+CALIBRATION_FIELDS = (
+    'id', 'note', 'frequency', 'position', 'diameter',
+    'tube_diameter', 'tube_length', 'tube_material',
+    'mouthpiece_delta_m', 'mouthpiece_type',
+    'bell_delta_L',
+    'temperature', 'humidity', 'pressure',
+    'source', 'confidence', 'notes', 'created_at'
+)
+
+HOLE_FIELDS = (
+    'id', 'flute_id', 'note', 'position', 'diameter', 'angle',
+    'is_calibrated', 'acoustic_length_correction', 'is_under_cut', 'chimney_height'
+)
+
+def _loads(text):
+    """Разобрать JSON-поле модели"""
+    if not text:
+        return []
+    return orjson.loads(text) if ORJSON_LOADED else json.loads(text)
+
+
+def _default(obj):
+    """Кодирование типов, которые не понимает стандартный json"""
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    raise TypeError(f'Объект типа {type(obj).__name__} не сериализуется в JSON')
+
+
+def dumps(payload) -> bytes:
+    """Закодировать данные в JSON (bytes)"""
+    if ORJSON_LOADED:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        payload, ensure_ascii=False, separators=(',', ':'), default=_default
+    ).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    """Ответ application/json через быстрый кодировщик"""
+    return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
+
+
+# Бинарные форматы массивов: MIME-тип -> формат
+ARRAY_MIMETYPES = {
+    'application/octet-stream': 'raw',
+    'application/x-npy': 'npy',
+}
+ARRAY_DTYPES = {'float32': '<f4', 'float64': '<f8'}
+
+
+def negotiate_array():
+    """
+    Формат ответа для числовых результатов: 'raw', 'npy' или None (JSON)
+
+    Задается ?format=raw|npy|json (float32 - синоним raw) или заголовком Accept.
+    """
+    fmt = request.args.get('format')
+    if fmt in ('raw', 'float32'):
+        return 'raw'
+    if fmt in ('npy', 'json'):
+        return None if fmt == 'json' else fmt
+    best = request.accept_mimetypes.best_match(['application/json', *ARRAY_MIMETYPES])
+    return ARRAY_MIMETYPES.get(best)
+
+
+def array_dtype(default='float32'):
+    """Тип элементов бинарного ответа из ?dtype=float32|float64"""
+    name = request.args.get('dtype', default)
+    if request.args.get('format') == 'float32':
+        name = 'float32'
+    if name not in ARRAY_DTYPES:
+        raise ValueError(f'dtype должен быть одним из: {", ".join(ARRAY_DTYPES)}')
+    return ARRAY_DTYPES[name]
+
+
+def array_response(array, fmt='raw', dtype='<f4', headers=None):
+    """
+    Массив NumPy как бинарный ответ без поэлементного преобразования
+
+    raw - сырой буфер little-endian, форма и тип в заголовках X-Array-Shape
+    ("M,T,B") и X-Array-Dtype; npy - формат .npy (numpy.load).
+    """
+    import numpy as np
+
+    data = np.ascontiguousarray(array, dtype=np.dtype(dtype))
+    body = data.tobytes()
+    mimetype = 'application/octet-stream'
+    if fmt == 'npy':
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(header, np.lib.format.header_data_from_array_1_0(data))
+        body = header.getvalue() + body
+        mimetype = 'application/x-npy'
+
+    response = current_app.response_class(body, mimetype=mimetype)
+    response.headers['X-Array-Shape'] = ','.join(str(n) for n in data.shape)
+    response.headers['X-Array-Dtype'] = data.dtype.str
+    response.headers['Vary'] = 'Accept'
+    for name, value in (headers or {}).items():
+        response.headers[name] = value
+    return response
+
+
+def fetch_dicts(model, fields, *criteria, order_by=None, limit=None, offset=None):
+    """Выбрать строки модели колоночным запросом и вернуть список словарей"""
+    stmt = db.select(*[getattr(model, field) for field in fields])
+    if criteria:
+        stmt = stmt.where(*criteria)
+    if order_by is not None:
+        stmt = stmt.order_by(*order_by) if isinstance(order_by, tuple) else stmt.order_by(order_by)
+    if limit is not None:
+        stmt = stmt.limit(limit).offset(offset or 0)
+    rows = db.session.execute(stmt).all()
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def fetch_by_ids(model, fields, ids):
+    """Словари компонентов по id одним запросом: {id: dict}"""
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+    return {row['id']: row for row in fetch_dicts(model, fields, model.id.in_(ids))}
+
+
+def serialize_mouthpieces(*criteria, order_by=None):
+    return fetch_dicts(Mouthpiece, MOUTHPIECE_FIELDS, *criteria, order_by=order_by)
+
+
+def serialize_tubes(*criteria, order_by=None):
+    return fetch_dicts(Tube, TUBE_FIELDS, *criteria, order_by=order_by)
+
+
+def serialize_bells(*criteria, order_by=None):
+    return fetch_dicts(Bell, BELL_FIELDS, *criteria, order_by=order_by)
+
+
+def serialize_calibrations(*criteria, order_by=None):
+    return fetch_dicts(CalibrationData, CALIBRATION_FIELDS, *criteria, order_by=order_by)
+
+
+def serialize_holes(*criteria, order_by=None, limit=None, offset=None):
+    return fetch_dicts(Hole, HOLE_FIELDS, *criteria, order_by=order_by, limit=limit, offset=offset)
+
+
+def fetch_holes(flute_ids):
+    """Отверстия флейт одним запросом: {flute_id: [отверстия по позиции]}"""
+    holes = {}
+    ids = {i for i in flute_ids if i is not None}
+    if not ids:
+        return holes
+    for hole in serialize_holes(Hole.flute_id.in_(ids), order_by=(Hole.flute_id, Hole.position)):
+        holes.setdefault(hole['flute_id'], []).append(hole)
+    return holes
+
+
+# Поля флейты в ответе API (как в Flute.to_dict())
+FLUTE_FIELDS = (
+    'id', 'name', 'key', 'scale', 'tube_length', 'hole_count',
+    'custom_notes', 'is_verified', 'created_at',
+    'mouthpiece', 'tube', 'bell',
+    'holes',
+    'total_effective_length', 'base_frequency', 'temperature'
+)
+
+# Вложенные компоненты: поле -> (модель, поля, колонка ссылки, имя таблицы)
+FLUTE_COMPONENTS = {
+    'mouthpiece': (Mouthpiece, MOUTHPIECE_FIELDS, 'mouthpiece_id', 'mouthpieces'),
+    'tube': (Tube, TUBE_FIELDS, 'tube_id', 'tubes'),
+    'bell': (Bell, BELL_FIELDS, 'bell_id', 'bells'),
+}
+
+# Поля ответа, которые хранятся в колонках с другим именем
+_FLUTE_SOURCES = {
+    'mouthpiece': 'mouthpiece_id',
+    'tube': 'tube_id',
+    'bell': 'bell_id',
+}
+
+
+def parse_fields(value):
+    """
+    Разобрать параметр ?fields=
+
+    Формат: "id,name,tube.d_in,tube.name,holes". Возвращает словарь
+    {поле: None | [подполя компонента]} или None, если проекция не задана.
+    """
+    if not value:
+        return None
+
+    fields = {}
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+
+        name, _, sub = item.partition('.')
+        if name not in FLUTE_FIELDS:
+            raise ValueError(f'Неизвестное поле: {item}')
+
+        if not sub:
+            fields[name] = None
+            continue
+
+        if name not in FLUTE_COMPONENTS or sub not in FLUTE_COMPONENTS[name][1]:
+            raise ValueError(f'Неизвестное поле: {item}')
+        if name in fields and fields[name] is None:
+            continue  # компонент уже запрошен целиком
+        fields.setdefault(name, ['id'])
+        if sub not in fields[name]:
+            fields[name].append(sub)
+
+    if not fields:
+        raise ValueError('Пустой список полей')
+    return fields
+
+
+def _build_flutes(criteria, order_by, fields, normalized, limit=None, offset=None):
+    """Общая сборка флейт: (список флейт, {таблица: {id: компонент}})"""
+    if fields is None:
+        fields = dict.fromkeys(FLUTE_FIELDS)
+
+    # Отверстия - из таблицы holes, одним запросом на всю страницу флейт
+    columns = tuple(_FLUTE_SOURCES.get(name, name) for name in fields if name != 'holes')
+    drop_id = 'holes' in fields and 'id' not in fields
+    if drop_id:
+        columns = ('id',) + columns
+    flutes = fetch_dicts(Flute, columns, *criteria, order_by=order_by, limit=limit, offset=offset)
+    holes = fetch_holes(f['id'] for f in flutes) if 'holes' in fields else None
+
+    components = {}
+    for name, (model, model_fields, column, table) in FLUTE_COMPONENTS.items():
+        if name not in fields:
+            continue
+        selected = model_fields if fields[name] is None else tuple(fields[name])
+        components[name] = (column, table, fetch_by_ids(model, selected, (f[column] for f in flutes)))
+
+    for flute in flutes:
+        if 'custom_notes' in fields:
+            flute['custom_notes'] = _loads(flute['custom_notes'])
+        for name, (column, table, rows) in components.items():
+            ref = flute.pop(column)
+            if normalized:
+                flute[column] = ref
+            else:
+                flute[name] = rows.get(ref)
+        if holes is not None:
+            flute['holes'] = holes.get(flute.pop('id') if drop_id else flute['id'], [])
+
+    side_table = {table: rows for column, table, rows in components.values()}
+    return flutes, side_table
+
+
+def serialize_flutes(*criteria, order_by=None, fields=None, limit=None, offset=None):
+    """
+    Флейты в формате Flute.to_dict()
+
+    Компоненты и отверстия загружаются одним запросом на тип для всей
+    выборки (вместо ленивой загрузки на каждую флейту). fields - результат
+    parse_fields(); limit/offset - страница выборки.
+    """
+    flutes, _ = _build_flutes(criteria, order_by, fields, normalized=False, limit=limit, offset=offset)
+    return flutes
+
+
+def serialize_flutes_normalized(*criteria, order_by=None, fields=None, limit=None, offset=None):
+    """
+    Нормализованный формат: компоненты один раз в боковой таблице
+
+    Флейты ссылаются на них через mouthpiece_id / tube_id / bell_id.
+    """
+    flutes, components = _build_flutes(criteria, order_by, fields, normalized=True, limit=limit, offset=offset)
+    return {'flutes': flutes, 'components': components}